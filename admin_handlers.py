@@ -1,19 +1,24 @@
 import logging
 import os
 import io
+import time
+import sqlite3
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import numpy as np
+from typing import Dict, List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from telegram.ext import CallbackContext, ConversationHandler, CommandHandler, CallbackQueryHandler, MessageHandler, Filters
 from database import (
     get_db, get_all_cryptos, get_user, add_crypto,
-    update_crypto, validate_crypto_symbol, get_crypto_by_id,
-    get_pending_transactions, update_transaction_status, update_user_balance
+    update_crypto, validate_crypto_symbol, get_crypto_by_id, add_price_history,
+    get_pending_transactions_page, count_pending_transactions,
+    get_users_page, get_transactions_page,
+    settle_transaction, settle_transactions, invalidate_crypto_catalog
 )
 from utils import (
     is_admin, format_money, format_crypto_amount
 )
+from money import to_kopecks, to_units, sell_proceeds
+from cpu_pool import get_cpu_pool
 from config import ADMIN_EMAIL
 
 # Configuration constants
@@ -25,29 +30,30 @@ logger = logging.getLogger(__name__)
 ADD_CRYPTO_NAME, ADD_CRYPTO_SYMBOL, ADD_CRYPTO_RATE, ADD_CRYPTO_SUPPLY = range(4)
 EDIT_CRYPTO_SELECT, EDIT_CRYPTO_ACTION, EDIT_CRYPTO_RATE, EDIT_CRYPTO_SUPPLY = range(4, 8)
 
+# Количество записей на одной странице сводки заявок и списков пользователей и транзакций
+PENDING_PAGE_SIZE = 10
+# Сколько последних сообщений сводки заявок помнить (их заявки используются пакетными действиями)
+PENDING_DIGESTS_KEPT = 20
+USERS_PAGE_SIZE = 20
+TRANSACTIONS_PAGE_SIZE = 10
+
 def check_admin(func):
     """Декоратор для проверки прав администратора"""
     def wrapper(update: Update, context: CallbackContext):
         user_id = update.effective_user.id
-        logger.info(f"Admin check for user {user_id}")
 
         try:
-            # Получаем информацию о пользователе
-            user = get_user(user_id)
-            logger.debug(f"User data: {user}")
-
-            # Проверяем права администратора
+            # Проверяем права администратора (без обращения к базе)
             if not is_admin(user_id):
                 logger.warning(f"Unauthorized admin access attempt from user {user_id}")
-                update.message.reply_text("У вас нет прав администратора.")
+                update.effective_message.reply_text("У вас нет прав администратора.")
                 return
 
-            logger.info(f"Admin access granted for user {user_id}")
             return func(update, context)
 
         except Exception as e:
             logger.error(f"Error in admin check: {str(e)}")
-            update.message.reply_text("Произошла ошибка при проверке прав администратора.")
+            update.effective_message.reply_text("Произошла ошибка при проверке прав администратора.")
             return
     return wrapper
 
@@ -85,27 +91,32 @@ def admin_stats(update: Update, context: CallbackContext):
                     COALESCE(SUM(amount), 0) as total_volume_rub,
                     COUNT(DISTINCT user_id) as unique_traders
                 FROM transactions
-                WHERE created_at >= datetime('now', '-30 days')
+                WHERE created_ts >= ?
             '''
             logger.debug(f"Executing trade query: {trade_query}")
-            cursor.execute(trade_query)
+            cursor.execute(trade_query, (int(time.time()) - 30 * 86400,))
             trade_stats = cursor.fetchone()
             logger.debug(f"Trade stats: {trade_stats}")
 
             logger.info("Getting cryptocurrency distribution")
             # Получаем распределение криптовалют
+            # Количество суммируется в SQL, а стоимость считается один раз на монету в целых числах Python:
+            # произведение amount * rate в SQLite переполняет INTEGER и переходит в REAL
             crypto_query = '''
-                SELECT c.name, c.symbol, COUNT(p.crypto_id) as trade_count, 
-                       COALESCE(SUM(p.amount * c.rate), 0) as volume_rub
+                SELECT c.name, c.symbol, COUNT(p.crypto_id) as trade_count,
+                       COALESCE(SUM(p.amount), 0) as total_units, c.rate
                 FROM cryptocurrencies c
                 LEFT JOIN portfolios p ON c.id = p.crypto_id
                 GROUP BY c.id
-                ORDER BY volume_rub DESC
-                LIMIT 5
             '''
             logger.debug(f"Executing crypto query: {crypto_query}")
             cursor.execute(crypto_query)
-            top_cryptos = cursor.fetchall()
+            top_cryptos = sorted(
+                ((row['name'], row['symbol'], row['trade_count'], sell_proceeds(row['total_units'], row['rate']))
+                 for row in cursor.fetchall()),
+                key=lambda crypto: crypto[3],
+                reverse=True
+            )[:5]
             logger.debug(f"Top cryptos: {top_cryptos}")
 
             logger.info("Getting user growth data")
@@ -122,43 +133,19 @@ def admin_stats(update: Update, context: CallbackContext):
             growth_data = cursor.fetchall()
             logger.debug(f"Growth data: {growth_data}")
 
+            growth_chart_png = None
             try:
                 logger.info("Creating growth chart")
-                # Создаем график
-                plt.figure(figsize=(10, 5))
-
-                if growth_data:
-                    logger.debug("Processing growth data for chart")
-                    dates = [row[0] for row in growth_data]
-                    counts = [row[1] for row in growth_data]
-                    logger.debug(f"Chart data - dates: {dates}, counts: {counts}")
-
-                    plt.plot(dates, counts, marker='o')
-                    plt.title('Рост пользователей за последние 7 дней')
-                    plt.xlabel('Дата')
-                    plt.ylabel('Новые пользователи')
-                    plt.grid(True)
-                    plt.xticks(rotation=45)
-                else:
-                    logger.warning("No growth data available for chart")
-                    plt.text(0.5, 0.5, 'Нет данных о регистрациях', 
-                            horizontalalignment='center',
-                            verticalalignment='center')
-
-                # Создаем директорию для графиков, если её нет
-                os.makedirs('static', exist_ok=True)
-
-                # Сохраняем график
-                growth_chart_path = 'static/user_growth.png'
-                logger.debug(f"Saving chart to {growth_chart_path}")
-                plt.savefig(growth_chart_path, bbox_inches='tight')
-                plt.close()
-                logger.info(f"Chart saved to {growth_chart_path}")
-
+                growth_chart_png = get_cpu_pool().run(
+                    'charts:growth_chart',
+                    [row[0] for row in growth_data],
+                    [row[1] for row in growth_data],
+                    'Рост пользователей за последние 7 дней',
+                    empty_text='Нет данных о регистрациях'
+                )
             except Exception as chart_error:
                 logger.error(f"Error creating chart: {str(chart_error)}")
                 logger.exception("Full chart error details:")
-                plt.close()  # Закрываем график в случае ошибки
 
             logger.info("Formatting statistics message")
             # Форматируем сообщение со статистикой
@@ -206,21 +193,16 @@ def admin_stats(update: Update, context: CallbackContext):
             update.message.reply_text(stats_message, parse_mode='Markdown')
 
             # Отправляем график, если он был создан
-            if os.path.exists(growth_chart_path):
+            if growth_chart_png:
                 logger.info("Sending growth chart")
                 try:
-                    with open(growth_chart_path, 'rb') as photo:
-                        update.message.reply_photo(
-                            photo=photo,
-                            caption="📈 График роста пользователей за последние 7 дней"
-                        )
-                    os.remove(growth_chart_path)
-                    logger.info("Growth chart sent and removed")
+                    update.message.reply_photo(
+                        photo=io.BytesIO(growth_chart_png),
+                        caption="📈 График роста пользователей за последние 7 дней"
+                    )
                 except Exception as photo_error:
                     logger.error(f"Error sending photo: {str(photo_error)}")
                     logger.exception("Full photo error details:")
-            else:
-                logger.warning(f"Growth chart file not found at {growth_chart_path}")
 
     except Exception as e:
         logger.error(f"Error generating admin statistics: {str(e)}")
@@ -229,15 +211,10 @@ def admin_stats(update: Update, context: CallbackContext):
             "Произошла ошибка при формировании статистики. "
             "Попробуйте позже или обратитесь к разработчику."
         )
-    finally:
-        plt.close('all')  # Закрываем все графики
 
 def get_admin_buttons():
     """Returns admin buttons with pending count"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM transactions WHERE status = 'pending'")
-        pending_count = cursor.fetchone()['count']
+    pending_count = count_pending_transactions()
 
     return [
         ["📊 Статистика", "👥 Пользователи"],
@@ -309,161 +286,372 @@ def edit_crypto_command(update: Update, context: CallbackContext):
     logger.debug(f"Edit crypto menu displayed with {len(cryptos)} options")
     return EDIT_CRYPTO_SELECT
 
+def build_keyset_keyboard(prefix: str, page: int, rows: List[Dict], key_columns: Tuple[str, str],
+                          has_prev: bool, has_next: bool) -> Optional[InlineKeyboardMarkup]:
+    """
+    Клавиатура листания ◀️ N ▶️ для постраничного вывода по ключу (см. database._keyset_page),
+    по образцу keyboards.get_pagination_inline_keyboard.
+    В callback_data передается номер страницы и ключ (время создания, id) крайней записи.
+    """
+    if not rows or not (has_prev or has_next):
+        return None
+
+    first, last = rows[0], rows[-1]
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton(
+            "◀️ Назад",
+            callback_data=f"{prefix}_prev_{page - 1}_{first[key_columns[0]]}_{first[key_columns[1]]}"
+        ))
+    buttons.append(InlineKeyboardButton(f"Стр. {page}", callback_data=f"{prefix}_noop"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            "Вперед ▶️",
+            callback_data=f"{prefix}_next_{page + 1}_{last[key_columns[0]]}_{last[key_columns[1]]}"
+        ))
+    return InlineKeyboardMarkup([buttons])
+
+def parse_keyset_callback(data: str, time_type=str):
+    """
+    Разбирает callback_data кнопки листания
+    :param time_type: Тип первого элемента ключа (str для created_at, int для unix-времени)
+    :return: Номер страницы, ключ after, ключ before
+    """
+    _, direction, page, created, key = data.split('_', 4)
+    page_key = (time_type(created), int(key))
+    if direction == 'next':
+        return int(page), page_key, None
+    return int(page), None, page_key
+
+def build_users_page(page: int = 1, after=None, before=None):
+    """
+    Формирует страницу списка пользователей
+    :return: Текст сообщения и клавиатура листания (или None)
+    """
+    users, has_prev, has_next = get_users_page(USERS_PAGE_SIZE, after=after, before=before)
+    if not users:
+        return "Пользователей не найдено.", None
+
+    message = f"👥 Список пользователей (страница {page}):\n\n"
+    for user in users:
+        user_name = f"{user['first_name']} {user['last_name']}"
+        user_link = f"[{user_name}](tg://user?id={user['user_id']})"
+        phone = user['phone'] if user['phone'] else 'Не указан'
+        balance = format_money(user['balance']) if user['balance'] else '0₽'
+        message += f"• {user_link}\n📱 {phone}\n💰 Баланс: {balance}\n\n"
+
+    keyboard = build_keyset_keyboard('users', page, users, ('created_at', 'user_id'), has_prev, has_next)
+    return message, keyboard
+
 @check_admin
 def show_users(update: Update, context: CallbackContext):
-    """Показывает список пользователей"""
+    """Показывает первую страницу списка пользователей"""
     logger.info(f"User list requested by admin {update.effective_user.id}")
 
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM users ORDER BY created_at DESC')
-            users = cursor.fetchall()
-
-        if not users:
-            logger.warning("No users found in database")
-            update.message.reply_text("Пользователей не найдено.")
-            return
-
-        message = "👥 Список пользователей:\n\n"
-        for user in users:
-            user_name = f"{user['first_name']} {user['last_name']}"
-            user_link = f"[{user_name}](tg://user?id={user['user_id']})"
-            phone = user['phone'] if user['phone'] else 'Не указан'
-            balance = format_money(user['balance']) if user['balance'] else '0₽'
-            message += f"• {user_link}\n📱 {phone}\n💰 Баланс: {balance}\n\n"
-
-        update.message.reply_text(message, parse_mode='Markdown')
-        logger.info(f"User list displayed: {len(users)} users")
+        message, keyboard = build_users_page()
+        update.message.reply_text(message, parse_mode='Markdown', reply_markup=keyboard)
 
     except Exception as e:
         logger.error(f"Error showing users: {str(e)}")
         update.message.reply_text("Произошла ошибка при получении списка пользователей.")
 
-
-# Add new function to view transactions
 @check_admin
-def view_transactions(update: Update, context: CallbackContext):
-    """Показывает список транзакций пользователей"""
-    logger.info(f"Transactions view accessed by admin {update.effective_user.id}")
+def process_users_page(update: Update, context: CallbackContext):
+    """Перелистывает список пользователей"""
+    query = update.callback_query
+    query.answer()
+    if query.data == 'users_noop':
+        return
 
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            # Получаем все транзакции с информацией о пользователях
-            cursor.execute('''
-                SELECT t.*, u.first_name, u.last_name, u.email
-                FROM transactions t
-                JOIN users u ON t.user_id = u.user_id
-                ORDER BY t.created_at DESC
-                LIMIT 20
-            ''')
-            transactions = cursor.fetchall()
-
-            logger.info(f"Retrieved {len(transactions) if transactions else 0} transactions from database")
-
-        if not transactions:
-            logger.info("No transactions found in database")
-            update.message.reply_text("Транзакций пока нет.")
-            return
+        page, after, before = parse_keyset_callback(query.data)
+        message, keyboard = build_users_page(page, after=after, before=before)
+        query.edit_message_text(message, parse_mode='Markdown', reply_markup=keyboard)
 
-        message = "💰 Последние транзакции:\n\n"
-        for tx in transactions:
-            try:
-                # Форматируем статус
-                status_emoji = {
-                    'pending': '⏳',
-                    'completed': '✅',
-                    'rejected': '❌'
-                }.get(tx['status'], '❓')
+    except Exception as e:
+        logger.error(f"Error paging users: {str(e)}")
+        query.message.reply_text("Произошла ошибка при получении списка пользователей.")
 
-                # Форматируем тип операции
-                type_text = 'пополнение' if tx['type'] == 'deposit' else 'вывод'
 
-                # Безопасное получение временной метки
-                try:
-                    if isinstance(tx['created_at'], str):
-                        created_at = datetime.strptime(tx['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
-                    else:
-                        created_at = datetime.fromtimestamp(float(tx['created_at'])).strftime('%d.%m.%Y %H:%M')
-                except (TypeError, ValueError) as e:
-                    logger.error(f"Error formatting timestamp for transaction {tx['id']}: {e}")
-                    created_at = tx['created_at'] if tx['created_at'] else "Дата неизвестна"
-
-                # Форматируем сообщение для каждой транзакции
-                message += (
-                    f"{status_emoji} {type_text.capitalize()}\n"
-                    f"ID: #{tx['unique_id']}\n"
-                    f"От: {tx['first_name']} {tx['last_name']} ({tx['email']})\n"
-                    f"Сумма: {format_money(tx['amount'])}\n"
-                    f"Статус: {tx['status']}\n"
-                    f"Создано: {created_at}\n\n"
-                )
+def format_transaction_entry(tx: Dict) -> str:
+    """Форматирует транзакцию для списка транзакций"""
+    # Форматируем статус
+    status_emoji = {
+        'pending': '⏳',
+        'completed': '✅',
+        'rejected': '❌'
+    }.get(tx['status'], '❓')
 
-                # Если сообщение слишком длинное, отправляем часть и начинаем новое
-                if len(message) > 3500:  # Telegram limit is 4096
-                    update.message.reply_text(message)
-                    message = "Продолжение списка транзакций:\n\n"
+    # Форматируем тип операции
+    type_text = 'пополнение' if tx['type'] == 'deposit' else 'вывод'
 
-            except Exception as e:
-                logger.error(f"Error processing transaction {tx['id']}: {e}")
-                continue
+    # Безопасное получение временной метки
+    try:
+        if isinstance(tx['created_at'], str):
+            created_at = datetime.strptime(tx['created_at'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
+        else:
+            created_at = datetime.fromtimestamp(float(tx['created_at'])).strftime('%d.%m.%Y %H:%M')
+    except (TypeError, ValueError) as e:
+        logger.error(f"Error formatting timestamp for transaction {tx['id']}: {e}")
+        created_at = tx['created_at'] if tx['created_at'] else "Дата неизвестна"
+
+    return (
+        f"{status_emoji} {type_text.capitalize()}\n"
+        f"ID: #{tx['unique_id']}\n"
+        f"От: {tx['first_name']} {tx['last_name']} ({tx['email']})\n"
+        f"Сумма: {format_money(tx['amount'])}\n"
+        f"Статус: {tx['status']}\n"
+        f"Создано: {created_at}\n\n"
+    )
 
-        # Отправляем оставшиеся транзакции
-        if message:
-            update.message.reply_text(message)
-            logger.info("Successfully sent transactions list to admin")
+def build_transactions_page(page: int = 1, after=None, before=None):
+    """
+    Формирует страницу списка транзакций
+    :return: Текст сообщения и клавиатура листания (или None)
+    """
+    transactions, has_prev, has_next = get_transactions_page(TRANSACTIONS_PAGE_SIZE, after=after, before=before)
+    logger.info(f"Retrieved {len(transactions)} transactions from database")
+    if not transactions:
+        return "Транзакций пока нет.", None
+
+    message = f"💰 Последние транзакции (страница {page}):\n\n"
+    for tx in transactions:
+        try:
+            message += format_transaction_entry(tx)
+        except Exception as e:
+            logger.error(f"Error processing transaction {tx['id']}: {e}")
+            continue
+
+    keyboard = build_keyset_keyboard('txs', page, transactions, ('created_ts', 'id'), has_prev, has_next)
+    return message, keyboard
+
+@check_admin
+def view_transactions(update: Update, context: CallbackContext):
+    """Показывает первую страницу списка транзакций пользователей"""
+    logger.info(f"Transactions view accessed by admin {update.effective_user.id}")
+
+    try:
+        message, keyboard = build_transactions_page()
+        update.message.reply_text(message, reply_markup=keyboard)
+        logger.info("Successfully sent transactions list to admin")
 
     except Exception as e:
         logger.error(f"Error showing transactions: {str(e)}")
         logger.exception("Full error details:")
         update.message.reply_text("Произошла ошибка при получении списка транзакций.")
 
-# Модифицируем функцию view_pending_transactions для добавления логирования
+@check_admin
+def process_transactions_page(update: Update, context: CallbackContext):
+    """Перелистывает список транзакций"""
+    query = update.callback_query
+    query.answer()
+    if query.data == 'txs_noop':
+        return
+
+    try:
+        page, after, before = parse_keyset_callback(query.data, int)
+        message, keyboard = build_transactions_page(page, after=after, before=before)
+        query.edit_message_text(message, reply_markup=keyboard)
+
+    except Exception as e:
+        logger.error(f"Error paging transactions: {str(e)}")
+        logger.exception("Full error details:")
+        query.message.reply_text("Произошла ошибка при получении списка транзакций.")
+
+def build_pending_digest(context: CallbackContext, page: int = 1, after=None, before=None, notice: str = ''):
+    """
+    Формирует страницу сводки активных заявок с выбором заявок для пакетной обработки.
+    Пакетные действия применяются только к заявкам, показанным на этой странице
+    :param page: Номер страницы
+    :param after: Ключ (created_at, id) последней заявки предыдущей страницы
+    :param before: Ключ (created_at, id) первой заявки следующей страницы
+    :param notice: Текст, добавляемый в начало сообщения (например, итог пакетной операции)
+    :return: Текст сообщения, клавиатура (None, если заявок нет) и состояние страницы
+             (показанные ID заявок и ключи), которое сохраняется по ID сообщения
+    """
+    transactions, has_prev, has_next = get_pending_transactions_page(PENDING_PAGE_SIZE, after=after, before=before)
+    if not transactions and (after is not None or before is not None):
+        # Все заявки страницы обработаны — показываем первую страницу
+        page, after, before = 1, None, None
+        transactions, has_prev, has_next = get_pending_transactions_page(PENDING_PAGE_SIZE)
+    state = {'ids': [tx['id'] for tx in transactions], 'page': page, 'after': after, 'before': before}
+    if not transactions:
+        return notice + "Активных заявок нет.", None, state
+
+    selected = context.user_data.setdefault('pending_selected', set())
+    total = count_pending_transactions()
+
+    message = notice + f"📥 Активные заявки: {total} (страница {page})\n\n"
+    keyboard = []
+    for number, tx in enumerate(transactions, start=(page - 1) * PENDING_PAGE_SIZE + 1):
+        is_deposit = tx['type'] == 'deposit'
+        message += (
+            f"{number}. {'📥 Пополнение' if is_deposit else '📤 Вывод'} #{tx['unique_id']}\n"
+            f"   {tx['first_name']} {tx['last_name']} ({tx['email']})\n"
+            f"   Сумма: {format_money(tx['amount'])}, создано: {tx['created_at']}\n"
+        )
+        mark = '☑️' if tx['id'] in selected else '⬜'
+        keyboard.append([InlineKeyboardButton(
+            f"{mark} {number}. {'📥' if is_deposit else '📤'} {format_money(tx['amount'])}",
+            callback_data=f"pend_sel_{tx['id']}"
+        )])
+
+    selected_on_page = len(selected.intersection(state['ids']))
+    keyboard.append([
+        InlineKeyboardButton(f"✅ Одобрить выбранные ({selected_on_page})", callback_data="pend_bulk_approve"),
+        InlineKeyboardButton(f"❌ Отклонить выбранные ({selected_on_page})", callback_data="pend_bulk_reject")
+    ])
+    keyboard.append([
+        InlineKeyboardButton("✅ Одобрить все на странице", callback_data="pend_all_approve")
+    ])
+
+    navigation = build_keyset_keyboard('pend', page, transactions, ('created_at', 'id'), has_prev, has_next)
+    if navigation is not None:
+        keyboard.extend(navigation.inline_keyboard)
+
+    return message, InlineKeyboardMarkup(keyboard), state
+
+def save_pending_digest(context: CallbackContext, message_id: int, state: Dict):
+    """Запоминает заявки, показанные в сообщении сводки (хранятся последние PENDING_DIGESTS_KEPT сообщений)"""
+    digests = context.user_data.setdefault('pending_digests', {})
+    digests.pop(message_id, None)
+    digests[message_id] = state
+    while len(digests) > PENDING_DIGESTS_KEPT:
+        digests.pop(next(iter(digests)))
+
 @check_admin
 def view_pending_transactions(update: Update, context: CallbackContext):
-    """Показывает список активных заявок на пополнение/вывод средств"""
+    """Показывает постраничную сводку активных заявок на пополнение/вывод средств"""
     logger.info(f"Pending transactions view accessed by admin {update.effective_user.id}")
 
     try:
-        # Получаем все активные заявки
-        pending_transactions = get_pending_transactions()
-        logger.debug(f"Found {len(pending_transactions)} pending transactions")
+        context.user_data['pending_selected'] = set()
+        message, reply_markup, state = build_pending_digest(context)
+        sent = update.message.reply_text(message, reply_markup=reply_markup)
+        save_pending_digest(context, sent.message_id, state)
 
-        if not pending_transactions:
-            logger.info("No pending transactions found")
-            update.message.reply_text("Активных заявок нет.")
+    except Exception as e:
+        logger.error(f"Error showing pending transactions: {str(e)}")
+        logger.exception("Full error details:")
+        update.message.reply_text("Произошла ошибка при получении списка заявок.")
+
+def notify_settled_transactions(bot, results):
+    """
+    Рассылает пользователям уведомления о результатах обработки заявок.
+    Вызывается после фиксации изменений в БД, вне обработчика админа.
+    """
+    for tx in results:
+        if tx['status'] == 'pending':
+            continue
+
+        operation = 'пополнение' if tx['type'] == 'deposit' else 'вывод'
+        if tx['status'] == 'completed':
+            text = (
+                f"✅ Ваша заявка на {operation} средств на сумму {format_money(tx['amount'])} одобрена.\n"
+                f"Ваш новый баланс: {format_money(tx['balance'])}"
+            )
+        else:
+            text = (
+                f"❌ Ваша заявка на {operation} средств на сумму {format_money(tx['amount'])} отклонена.\n"
+                f"Для получения дополнительной информации свяжитесь с администратором."
+            )
+
+        try:
+            bot.send_message(tx['user_id'], text)
+        except Exception as e:
+            logger.error(f"Error notifying user {tx['user_id']} about transaction {tx['id']}: {e}")
+
+        # Не превышаем лимит Telegram на количество сообщений в секунду
+        time.sleep(0.05)
+
+@check_admin
+def process_pending_digest(update: Update, context: CallbackContext):
+    """Обрабатывает выбор, пакетное подтверждение/отклонение и перелистывание сводки заявок"""
+    query = update.callback_query
+    query.answer()
+
+    logger.info(f"Processing pending digest callback: {query.data}")
+
+    try:
+        parts = query.data.split('_')
+        action = parts[1]
+        if action == 'noop':
+            return
+
+        selected = context.user_data.setdefault('pending_selected', set())
+        digests = context.user_data.setdefault('pending_digests', {})
+        # Действия относятся к заявкам, показанным именно в этом сообщении
+        state = digests.get(query.message.message_id)
+        notice = ''
+
+        if action in ('next', 'prev'):
+            page, after, before = parse_keyset_callback(query.data)
+            message, reply_markup, state = build_pending_digest(context, page, after, before)
+            query.edit_message_text(message, reply_markup=reply_markup)
+            save_pending_digest(context, query.message.message_id, state)
+            return
+
+        if action not in ('sel', 'bulk', 'all'):
+            logger.warning(f"Unknown pending digest action: {query.data}")
             return
 
-        for tx in pending_transactions:
-            logger.debug(f"Processing transaction {tx['id']}: {tx['type']} for {tx['amount']}")
-            # Форматируем сообщение для каждой заявки
-            message = (
-                f"{'📥' if tx['type'] == 'deposit' else '📤'} "
-                f"{'Пополнение' if tx['type'] == 'deposit' else 'Вывод'}\n"
-                f"От: {tx['first_name']} {tx['last_name']}\n"
-                f"Email: {tx['email']}\n"
-                f"Сумма: {format_money(tx['amount'])}\n"
-                f"Создано: {tx['created_at']}\n"
+        if state is None:
+            # Сообщение показано до перезапуска бота или вытеснено более новыми сводками
+            message, reply_markup, state = build_pending_digest(
+                context, notice="⚠️ Сводка устарела, проверьте заявки еще раз.\n\n"
             )
+            query.edit_message_text(message, reply_markup=reply_markup)
+            save_pending_digest(context, query.message.message_id, state)
+            return
+
+        page_ids = state['ids']
+
+        if action == 'sel':
+            tx_id = int(parts[2])
+            if tx_id in selected:
+                selected.discard(tx_id)
+            elif tx_id in page_ids:
+                selected.add(tx_id)
+
+        else:
+            approve = parts[2] == 'approve'
+            if action == 'all':
+                tx_ids = list(page_ids)
+            else:
+                tx_ids = [tx_id for tx_id in page_ids if tx_id in selected]
 
-            # Создаем клавиатуру с кнопками подтверждения/отклонения
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Подтвердить", callback_data=f"approve_{tx['id']}"),
-                    InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{tx['id']}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            if not tx_ids:
+                notice = "⚠️ Не выбрано ни одной заявки.\n\n"
+            else:
+                logger.info(f"Admin {update.effective_user.id} {'approves' if approve else 'rejects'} transactions {tx_ids}")
+                results = settle_transactions(tx_ids, approve)
+                selected.difference_update(tx_ids)
+
+                done = sum(1 for tx in results if tx['status'] != 'pending')
+                skipped = len(results) - done
+                notice = f"{'✅ Одобрено' if approve else '❌ Отклонено'}: {done}"
+                if skipped:
+                    notice += f", недостаточно средств для вывода: {skipped}"
+                notice += "\n\n"
+
+                # Уведомления рассылаются после фиксации, не задерживая ответ админу
+                context.dispatcher.run_async(notify_settled_transactions, context.bot, results)
+
+        message, reply_markup, state = build_pending_digest(
+            context, state['page'], state['after'], state['before'], notice
+        )
+        query.edit_message_text(message, reply_markup=reply_markup)
+        save_pending_digest(context, query.message.message_id, state)
 
-            # Отправляем сообщение с кнопками
-            update.message.reply_text(message, reply_markup=reply_markup)
-            logger.debug(f"Sent message for transaction {tx['id']}")
+    except sqlite3.Error as e:
+        logger.error(f"Database error processing pending digest: {str(e)}")
+        query.edit_message_text("❌ Не удалось сохранить решение по заявкам. Попробуйте еще раз.")
 
     except Exception as e:
-        logger.error(f"Error showing pending transactions: {str(e)}")
+        logger.error(f"Error processing pending digest: {str(e)}")
         logger.exception("Full error details:")
-        update.message.reply_text("Произошла ошибка при получении списка заявок.")
+        query.edit_message_text("❌ Произошла ошибка при обработке заявок.")
 
 @check_admin
 def process_transaction(update: Update, context: CallbackContext):
@@ -479,79 +667,64 @@ def process_transaction(update: Update, context: CallbackContext):
         tx_id = int(tx_id)
         logger.info(f"Processing transaction {tx_id} with action {action}")
 
-        # Получаем информацию о транзакции
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT t.*, u.user_id, u.balance, u.first_name, u.last_name 
-                FROM transactions t
-                JOIN users u ON t.user_id = u.user_id
-                WHERE t.id = ? AND t.status = ?
-            """, (tx_id, 'pending'))
-            tx = cursor.fetchone()
+        # Статус и баланс меняются атомарно в одной транзакции БД
+        tx = settle_transaction(tx_id, approve=(action == 'approve'))
 
         if not tx:
             logger.warning(f"Transaction {tx_id} not found or already processed")
             query.edit_message_text("Заявка не найдена или уже обработана.")
             return
 
-        logger.debug(f"Found transaction: {dict(tx)}")
+        logger.debug(f"Settled transaction: {tx}")
         user_id = tx['user_id']
         amount = tx['amount']
         tx_type = tx['type']
 
-        if action == 'approve':
-            # Process approval
-            logger.info(f"Approving transaction {tx_id}")
-            success = update_transaction_status(tx_id, 'completed')
-
-            if success:
-                new_balance = tx['balance'] + amount if tx_type == 'deposit' else tx['balance'] - amount
-                if update_user_balance(user_id, new_balance):
-                    logger.info(f"Successfully processed {tx_type} for user {user_id}, new balance: {new_balance}")
-
-                    # Notify user
-                    context.bot.send_message(
-                        user_id,
-                        f"✅ Ваша заявка на {'пополнение' if tx_type == 'deposit' else 'вывод'} "
-                        f"средств на сумму {format_money(amount)} одобрена.\n"
-                        f"Ваш новый баланс: {format_money(new_balance)}"
-                    )
+        if tx['status'] == 'pending':
+            logger.error(f"Failed to update balance for user {user_id}")
+            query.edit_message_text(
+                "❌ Недостаточно средств на балансе пользователя для вывода. Заявка оставлена активной."
+            )
 
-                    query.edit_message_text(
-                        f"✅ Заявка одобрена\n"
-                        f"Пользователь: {tx['first_name']} {tx['last_name']}\n"
-                        f"Сумма: {format_money(amount)}\n"
-                        f"Новый баланс: {format_money(new_balance)}"
-                    )
-                else:
-                    logger.error(f"Failed to update balance for user {user_id}")
-                    query.edit_message_text("❌ Ошибка при обновлении баланса пользователя.")
-            else:
-                logger.error(f"Failed to update transaction status for tx_id {tx_id}")
-                query.edit_message_text("❌ Ошибка при обновлении статуса транзакции.")
-
-        elif action == 'reject':
-            logger.info(f"Rejecting transaction {tx_id}")
-            if update_transaction_status(tx_id, 'rejected'):
-                logger.info(f"Successfully rejected transaction {tx_id}")
-
-                # Notify user
-                context.bot.send_message(
-                    user_id,
-                    f"❌ Ваша заявка на {'пополнение' if tx_type == 'deposit' else 'вывод'} "
-                    f"средств на сумму {format_money(amount)} отклонена.\n"
-                    f"Для получения дополнительной информации свяжитесь с администратором."
-                )
+        elif tx['status'] == 'completed':
+            new_balance = tx['balance']
+            logger.info(f"Successfully processed {tx_type} for user {user_id}, new balance: {new_balance}")
 
-                query.edit_message_text(
-                    f"❌ Заявка отклонена\n"
-                    f"Пользователь: {tx['first_name']} {tx['last_name']}\n"
-                    f"Сумма: {format_money(amount)}"
-                )
-            else:
-                logger.error(f"Failed to reject transaction {tx_id}")
-                query.edit_message_text("❌ Ошибка при обновлении статуса транзакции.")
+            # Notify user
+            context.bot.send_message(
+                user_id,
+                f"✅ Ваша заявка на {'пополнение' if tx_type == 'deposit' else 'вывод'} "
+                f"средств на сумму {format_money(amount)} одобрена.\n"
+                f"Ваш новый баланс: {format_money(new_balance)}"
+            )
+
+            query.edit_message_text(
+                f"✅ Заявка одобрена\n"
+                f"Пользователь: {tx['first_name']} {tx['last_name']}\n"
+                f"Сумма: {format_money(amount)}\n"
+                f"Новый баланс: {format_money(new_balance)}"
+            )
+
+        else:
+            logger.info(f"Successfully rejected transaction {tx_id}")
+
+            # Notify user
+            context.bot.send_message(
+                user_id,
+                f"❌ Ваша заявка на {'пополнение' if tx_type == 'deposit' else 'вывод'} "
+                f"средств на сумму {format_money(amount)} отклонена.\n"
+                f"Для получения дополнительной информации свяжитесь с администратором."
+            )
+
+            query.edit_message_text(
+                f"❌ Заявка отклонена\n"
+                f"Пользователь: {tx['first_name']} {tx['last_name']}\n"
+                f"Сумма: {format_money(amount)}"
+            )
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error processing transaction: {str(e)}")
+        query.edit_message_text("❌ Не удалось сохранить решение по заявке. Попробуйте еще раз.")
 
     except Exception as e:
         logger.error(f"Error processing transaction: {str(e)}")
@@ -618,7 +791,7 @@ def add_crypto_symbol(update: Update, context: CallbackContext):
 
 def add_crypto_rate(update: Update, context: CallbackContext):
     try:
-        rate = float(update.message.text.replace(',', '.'))
+        rate = to_kopecks(update.message.text)
         if rate <= 0:
             raise ValueError("Курс должен быть положительным числом")
         context.user_data['crypto_rate'] = rate
@@ -632,7 +805,7 @@ def add_crypto_rate(update: Update, context: CallbackContext):
 
 def add_crypto_supply(update: Update, context: CallbackContext):
     try:
-        supply = float(update.message.text.replace(',', '.'))
+        supply = to_units(update.message.text)
         if supply <= 0:
             raise ValueError("Количество должно быть положительным числом")
         context.user_data['crypto_supply'] = supply
@@ -751,7 +924,7 @@ def edit_crypto_action(update: Update, context: CallbackContext):
 def edit_crypto_rate(update: Update, context: CallbackContext):
     """Обновляет курс криптовалюты"""
     try:
-        rate = float(update.message.text.replace(',', '.'))
+        rate = to_kopecks(update.message.text)
         if rate <= 0:
             update.message.reply_text("Курс должен быть положительным числом.")
             return EDIT_CRYPTO_RATE
@@ -771,12 +944,14 @@ def edit_crypto_rate(update: Update, context: CallbackContext):
         logger.info(f"Updating rate for crypto {crypto_id} to {rate}")
         success = update_crypto(
             crypto_id=crypto_id,
-            rate=rate,  # Pass rate directly as float
+            rate=rate,  # Курс в копейках
             total_supply=crypto.get('total_supply'),  # Preserve existing supply
             available_supply=crypto.get('available_supply', 0)  # Default to 0 if None
         )
 
         if success:
+            # Новая цена попадает в историю; после записи графики перерисовываются в фоне
+            add_price_history(crypto_id, rate)
             update.message.reply_text(
                 f"Курс успешно обновлен!\n"
                 f"Новый курс: {format_money(rate)}"
@@ -797,7 +972,7 @@ def edit_crypto_rate(update: Update, context: CallbackContext):
 def edit_crypto_supply(update: Update, context: CallbackContext):
     """Обновляет количество монет криптовалюты"""
     try:
-        supply = float(update.message.text.replace(',', '.'))
+        supply = to_units(update.message.text)
         if supply <= 0:
             update.message.reply_text("Количество должно быть положительным числом.")
             return EDIT_CRYPTO_SUPPLY
@@ -892,7 +1067,8 @@ def update_crypto_with_history(crypto_id, rate, total_supply=None, available_sup
             ))
 
             conn.commit()
-            return True
+        invalidate_crypto_catalog()
+        return True
 
     except Exception as e:
         logger.error(f"Error updating crypto with history: {str(e)}")
@@ -940,5 +1116,17 @@ process_transaction_handler = CallbackQueryHandler(
     process_transaction,
     pattern=r'^(approve|reject)_\d+$'
 )
+pending_digest_handler = CallbackQueryHandler(
+    process_pending_digest,
+    pattern=r'^pend_'
+)
+users_page_handler = CallbackQueryHandler(
+    process_users_page,
+    pattern=r'^users_(next|prev|noop)'
+)
+transactions_page_handler = CallbackQueryHandler(
+    process_transactions_page,
+    pattern=r'^txs_(next|prev|noop)'
+)
 
 # Добавляем новую кнопку в админ-меню
\ No newline at end of file
@@ -0,0 +1,57 @@
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+
+from config import ADMIN_EMAIL, ADMIN_IDS
+
+logger = logging.getLogger(__name__)
+
+
+class AdminRegistry:
+    """
+    Множество ID администраторов: ID из настроек и пользователи с email администратора.
+    Email сопоставляется с ID один раз при загрузке и при регистрации пользователя,
+    поэтому проверка прав — это поиск в множестве без обращений к базе.
+    """
+
+    def __init__(self, admin_ids: Iterable[int], admin_email: Optional[str]):
+        """
+        :param admin_ids: ID администраторов из настроек
+        :param admin_email: Email, владельцы которого считаются администраторами
+        """
+        self._static_ids = frozenset(int(user_id) for user_id in admin_ids)
+        self.admin_email = admin_email
+        self._lock = threading.Lock()
+        self._ids = self._static_ids
+
+    def load(self, find_user_ids: Callable[[str], Iterable[int]]):
+        """
+        Заново сопоставляет email администратора с ID пользователей
+        :param find_user_ids: Функция, возвращающая ID пользователей с заданным email
+        """
+        email_ids = frozenset(find_user_ids(self.admin_email)) if self.admin_email else frozenset()
+        with self._lock:
+            self._ids = self._static_ids | email_ids
+        logger.info(f"Admin registry loaded: {len(self._static_ids)} by ID, {len(email_ids)} by email")
+
+    def user_saved(self, user_id: int, email: Optional[str]):
+        """Учитывает регистрацию пользователя или изменение его email"""
+        user_id = int(user_id)
+        with self._lock:
+            if self.admin_email and email == self.admin_email:
+                if user_id not in self._ids:
+                    self._ids = self._ids | {user_id}
+                    logger.info(f"User {user_id} registered as admin (by email)")
+            elif user_id in self._ids and user_id not in self._static_ids:
+                self._ids = self._ids - {user_id}
+                logger.info(f"User {user_id} is no longer admin (email changed)")
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self._ids
+
+    @property
+    def ids(self) -> frozenset:
+        return self._ids
+
+
+admin_registry = AdminRegistry(ADMIN_IDS, ADMIN_EMAIL)
@@ -0,0 +1,85 @@
+"""
+Замер времени запуска бота: импортирует модуль в отдельном процессе с -X importtime
+и выводит самые долгие импорты.
+
+Пример:
+    python bench_startup.py            # импорт bot_app.py (приложение бота)
+    python bench_startup.py --module user_handlers --top 30
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Формат строки -X importtime: "import time: self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, int, int, int]], str]:
+    """
+    Импортирует модуль в новом интерпретаторе
+    :return: Общее время процесса в секундах, список (модуль, собственное время в мкс,
+             накопленное время в мкс, глубина вложенности) и текст ошибки импорта
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+
+    entries = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    return elapsed, entries, '\n'.join(errors) if result.returncode else ''
+
+
+def top_level_totals(entries: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """Накопленное время по пакетам верхнего уровня (matplotlib, numpy, telegram, ...)"""
+    totals: Dict[str, int] = {}
+    for name, _, cumulative_us, depth in entries:
+        if depth == 0:
+            package = name.split('.')[0]
+            totals[package] = totals.get(package, 0) + cumulative_us
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='bot_app', help='Импортируемый модуль (по умолчанию bot_app)')
+    parser.add_argument('--top', type=int, default=20, help='Сколько самых долгих импортов показать')
+    parser.add_argument('--runs', type=int, default=3, help='Количество запусков; выводится лучший')
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        run = measure(args.module)
+        if best is None or run[0] < best[0]:
+            best = run
+    elapsed, entries, error = best
+
+    if error:
+        print(f"Импорт {args.module} завершился с ошибкой:\n{error}\n")
+
+    print(f"Запуск процесса и импорт {args.module}: {elapsed * 1000:.0f} мс (лучший из {args.runs})\n")
+
+    print(f"{'накопл., мс':>12} {'собств., мс':>12}  модуль")
+    for name, self_us, cumulative_us, depth in sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>12.1f} {self_us / 1000:>12.1f}  {'  ' * depth}{name}")
+
+    print(f"\n{'накопл., мс':>12}  пакет верхнего уровня")
+    for package, total_us in sorted(top_level_totals(entries).items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{total_us / 1000:>12.1f}  {package}")
+
+
+if __name__ == '__main__':
+    main()
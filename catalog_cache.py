@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class CryptoCatalog:
+    """
+    Кэш справочника криптовалют в памяти процесса.
+
+    Справочник хранится как неизменяемый снимок {id: запись}; читатели берут ссылку
+    на текущий снимок без блокировки. Запись в базу сопровождается либо сбросом кэша
+    (invalidate), либо точечной правкой снимка (patch) — обе операции увеличивают версию.
+    Загрузка, начатая до изменения версии, не сохраняется, поэтому устаревшие данные
+    не могут вытеснить более свежие. TTL защищает от изменений в обход этих функций.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict]], ttl: Optional[float] = None):
+        """
+        :param loader: Функция, возвращающая все записи справочника
+        :param ttl: Время жизни снимка в секундах (None — без ограничения)
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._version = 0
+        self._items: Optional[Dict[int, Dict]] = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.loads = 0
+
+    @property
+    def version(self) -> int:
+        """Версия справочника; увеличивается при каждом изменении"""
+        return self._version
+
+    def _fresh(self, items: Optional[Dict[int, Dict]]) -> bool:
+        if items is None:
+            return False
+        return self.ttl is None or time.monotonic() - self._loaded_at < self.ttl
+
+    def _snapshot(self) -> Dict[int, Dict]:
+        items = self._items
+        if self._fresh(items):
+            self.hits += 1
+            return items
+
+        # Загружает один поток, остальные дожидаются его результата
+        with self._load_lock:
+            items = self._items
+            if self._fresh(items):
+                return items
+            version = self._version
+            loaded = {row['id']: row for row in self._loader()}
+            self.loads += 1
+            with self._lock:
+                if self._version == version:
+                    self._items = loaded
+                    self._loaded_at = time.monotonic()
+            return loaded
+
+    @staticmethod
+    def _copy(row: Dict, fields: Optional[Sequence[str]]) -> Dict:
+        if fields is None:
+            return dict(row)
+        return {field: row[field] for field in fields if field in row}
+
+    def get(self, crypto_id: int, fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """
+        Возвращает копию записи криптовалюты
+        :param fields: Возвращаемые поля (None — все)
+        """
+        row = self._snapshot().get(crypto_id)
+        return self._copy(row, fields) if row is not None else None
+
+    def all(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Возвращает копии всех записей в порядке id"""
+        items = self._snapshot()
+        return [self._copy(items[crypto_id], fields) for crypto_id in sorted(items)]
+
+    def available(self, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Возвращает криптовалюты, доступные для покупки, в порядке названия"""
+        rows = [row for row in self._snapshot().values() if row['available_supply'] > 0]
+        rows.sort(key=lambda row: row['name'])
+        return [self._copy(row, fields) for row in rows]
+
+    def invalidate(self):
+        """Сбрасывает кэш; следующий запрос загрузит справочник заново"""
+        with self._lock:
+            self._version += 1
+            self._items = None
+
+    def patch(self, crypto_id: int, **fields):
+        """
+        Обновляет поля одной записи без перезагрузки справочника.
+        Вызывается после успешного COMMIT изменения в базе, под общей блокировкой
+        с ним, чтобы правки применялись в порядке транзакций
+        """
+        with self._lock:
+            self._version += 1
+            items = self._items
+            if items is None:
+                return
+            row = items.get(crypto_id)
+            if row is None:
+                self._items = None
+                return
+            items = dict(items)
+            items[crypto_id] = {**row, **fields}
+            self._items = items
+
+    def stats(self) -> Dict:
+        return {'version': self._version, 'hits': self.hits, 'loads': self.loads,
+                'size': len(self._items) if self._items is not None else 0}
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from config import CHART_CACHE_MAX_BYTES, CHART_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# Примерный размер служебных данных записи (ключ, подпись, file_id) в байтах
+_ENTRY_OVERHEAD = 512
+
+ChartKey = Tuple[int, int, int]
+
+
+class ChartEntry:
+    """Готовый график: PNG, подпись и file_id, полученный от Telegram после первой отправки"""
+    __slots__ = ('png', 'caption', 'file_id', 'created', 'served')
+
+    def __init__(self, png: Optional[bytes], caption: str, file_id: Optional[str] = None):
+        self.png = png
+        self.caption = caption
+        self.file_id = file_id
+        self.created = time.monotonic()
+        # Был ли график отправлен пользователю (перерисовка заранее нужна только таким)
+        self.served = False
+
+    @property
+    def size(self) -> int:
+        return _ENTRY_OVERHEAD + (len(self.png) if self.png else 0)
+
+
+class ChartCache:
+    """
+    LRU-кэш готовых графиков, ограниченный суммарным размером PNG.
+
+    Ключ — (crypto_id, период в днях, версия истории цен), поэтому новая цена
+    автоматически дает новый ключ; предыдущий график той же криптовалюты и периода
+    при этом удаляется. После первой отправки запоминается file_id Telegram,
+    а PNG освобождается: повторные отправки не требуют ни отрисовки, ни загрузки.
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        """
+        :param max_bytes: Максимальный суммарный размер записей в байтах
+        :param ttl: Время жизни записи в секундах (None — без ограничения)
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[ChartKey, ChartEntry]' = OrderedDict()
+        self._latest: Dict[Hashable, ChartKey] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, key: ChartKey):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            if self._latest.get(key[:2]) == key:
+                del self._latest[key[:2]]
+
+    def get(self, key: ChartKey) -> Optional[ChartEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry.created >= self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.served = True
+            self.hits += 1
+            return entry
+
+    def put(self, key: ChartKey, png: bytes, caption: str) -> ChartEntry:
+        """Сохраняет отрисованный график, вытесняя устаревшие версии и давно не использованные записи"""
+        entry = ChartEntry(png, caption)
+        with self._lock:
+            previous = self._latest.get(key[:2])
+            if previous is not None:
+                self._remove(previous)
+            self._remove(key)
+            self._entries[key] = entry
+            self._latest[key[:2]] = key
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return entry
+
+    def set_file_id(self, key: ChartKey, file_id: str):
+        """Запоминает file_id отправленного графика и освобождает PNG"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            self._bytes -= entry.size
+            entry.file_id = file_id
+            entry.served = True
+            entry.png = None
+            self._bytes += entry.size
+
+    def discard(self, key: ChartKey):
+        """Удаляет запись (например, если Telegram больше не принимает ее file_id)"""
+        with self._lock:
+            self._remove(key)
+
+    def served_expiring(self, min_age: float) -> List[ChartKey]:
+        """
+        Возвращает ключи актуальных графиков, которые отправлялись пользователям
+        и созданы не менее min_age секунд назад
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [key for key in self._latest.values()
+                    if self._entries[key].served and now - self._entries[key].created >= min_age]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+chart_cache = ChartCache(CHART_CACHE_MAX_BYTES, CHART_CACHE_TTL)
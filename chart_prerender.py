@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ChartPrerenderer:
+    """
+    Фоновая перерисовка графиков после изменения цен.
+
+    schedule(crypto_id) откладывает перерисовку на delay секунд; повторные вызовы
+    за это время переносят ее, поэтому серия обновлений курса дает одну отрисовку.
+    Чтобы непрерывный поток цен не откладывал перерисовку бесконечно,
+    она выполняется не позже чем через max_delay секунд после первого вызова.
+    """
+
+    def __init__(self, render: Callable[[int], None], delay: float, max_delay: float):
+        """
+        :param render: Функция, отрисовывающая графики криптовалюты и сохраняющая их в кэш
+        :param delay: Пауза после последнего изменения цены в секундах
+        :param max_delay: Максимальная задержка после первого изменения в секундах
+        """
+        self._render = render
+        self.delay = delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        # crypto_id -> (срок перерисовки, время первого запроса)
+        self._pending: Dict[int, Tuple[float, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.renders = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='chart-prerender', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Останавливает поток; отложенные перерисовки отменяются"""
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def schedule(self, crypto_id: int):
+        """Запрашивает перерисовку графиков криптовалюты"""
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                return
+            pending = self._pending.get(crypto_id)
+            first = now if pending is None else pending[1]
+            self._pending[crypto_id] = (min(now + self.delay, first + self.max_delay), first)
+            self._cond.notify()
+
+    def _next_due(self) -> Optional[int]:
+        """Ждет ближайшую перерисовку и возвращает ID криптовалюты (None — поток остановлен)"""
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                due_id, due_at = None, None
+                for crypto_id, (deadline, _) in self._pending.items():
+                    if due_at is None or deadline < due_at:
+                        due_id, due_at = crypto_id, deadline
+                if due_id is not None and due_at <= now:
+                    del self._pending[due_id]
+                    return due_id
+                self._cond.wait(None if due_at is None else due_at - now)
+            return None
+
+    def _run(self):
+        while True:
+            crypto_id = self._next_due()
+            if crypto_id is None:
+                return
+            start = time.perf_counter()
+            try:
+                self._render(crypto_id)
+                self.renders += 1
+                logger.debug(f"Pre-rendered charts for crypto {crypto_id} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.error(f"Error pre-rendering charts for crypto {crypto_id}: {e}")
+                logger.exception("Full error details:")
@@ -0,0 +1,108 @@
+"""
+Построение графиков без глобального состояния pyplot.
+
+Каждый поток использует собственные заготовки фигур (Figure + холст Agg),
+которые создаются один раз для каждого стиля и очищаются перед новым графиком.
+Поэтому функции модуля можно вызывать одновременно из обработчиков Updater
+и фоновых потоков, а создание фигуры и холста не повторяется на каждый график.
+Все функции возвращают PNG в виде байтов.
+"""
+
+import logging
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Sequence, Tuple
+
+import matplotlib.dates as mdates
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+logger = logging.getLogger(__name__)
+
+# Стили графиков: размер фигуры в дюймах и разрешение PNG
+STYLES: Dict[str, Dict] = {
+    'price': {'figsize': (10, 6), 'dpi': 100},
+    'growth': {'figsize': (10, 5), 'dpi': 100},
+}
+
+LINE_COLOR = '#3273a8'
+RISE_COLOR = 'green'
+FALL_COLOR = 'red'
+
+_local = threading.local()
+
+
+def _template(style: str) -> Tuple[Figure, Axes]:
+    """Возвращает очищенную заготовку фигуры текущего потока для стиля"""
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        templates = _local.templates = {}
+    template = templates.get(style)
+    if template is None:
+        options = STYLES[style]
+        figure = Figure(figsize=options['figsize'], dpi=options['dpi'])
+        FigureCanvasAgg(figure)
+        template = templates[style] = (figure, figure.add_subplot())
+    figure, axes = template
+    axes.clear()
+    return figure, axes
+
+
+def _render(figure: Figure, style: str) -> bytes:
+    figure.tight_layout()
+    buffer = BytesIO()
+    figure.savefig(buffer, format='png', dpi=STYLES[style]['dpi'], bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def price_chart(dates: Sequence, prices: Sequence, title: str) -> Optional[bytes]:
+    """
+    График курса криптовалюты
+    :param dates: Даты (datetime или numpy.datetime64)
+    :param prices: Курсы в рублях
+    :param title: Заголовок графика
+    :return: PNG или None, если точек нет
+    """
+    if len(prices) == 0:
+        return None
+
+    figure, axes = _template('price')
+    change = prices[-1] - prices[0]
+    axes.plot(dates, prices, marker='o', linestyle='-', linewidth=2, markersize=4, color=LINE_COLOR)
+    if len(prices) >= 2:
+        # Заливка под графиком показывает направление изменения курса за период
+        fill_color = RISE_COLOR if change > 0 else FALL_COLOR if change < 0 else LINE_COLOR
+        axes.fill_between(dates, prices, min(prices), alpha=0.2, color=fill_color)
+
+    axes.set_title(title)
+    axes.set_xlabel('Дата')
+    axes.set_ylabel('Курс (₽)')
+    axes.grid(True, linestyle='--', alpha=0.7)
+    axes.xaxis.set_major_locator(mdates.AutoDateLocator())
+    axes.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+    axes.tick_params(axis='x', labelrotation=45)
+    return _render(figure, 'price')
+
+
+def growth_chart(labels: Sequence[str], counts: Sequence[int], title: str,
+                 empty_text: str = 'Нет данных') -> bytes:
+    """
+    График количества по дням (например, регистраций пользователей)
+    :param labels: Подписи точек по оси X
+    :param counts: Значения
+    :param title: Заголовок графика
+    :param empty_text: Текст вместо графика, если данных нет
+    :return: PNG
+    """
+    figure, axes = _template('growth')
+    if counts:
+        axes.plot(list(labels), list(counts), marker='o')
+        axes.set_title(title)
+        axes.set_xlabel('Дата')
+        axes.set_ylabel('Новые пользователи')
+        axes.grid(True)
+        axes.tick_params(axis='x', labelrotation=45)
+    else:
+        axes.text(0.5, 0.5, empty_text, horizontalalignment='center', verticalalignment='center')
+    return _render(figure, 'growth')
@@ -94,9 +94,12 @@ async def view_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("У вас ещё нет кошельков. Используйте /add_wallet чтобы добавить.")
         return
 
+    # Курс каждой криптовалюты запрашивается один раз, сколько бы кошельков с ней ни было
+    prices = crypto_api.get_prices(wallet['crypto'] for wallet in wallets)
+
     wallet_message = "Ваши кошельки:\n\n"
     for wallet in wallets:
-        price = crypto_api.get_price(wallet['crypto'])
+        price = prices.get(wallet['crypto'])
         usd_value = price * wallet['balance'] if price else 0
         wallet_message += (
             f"🔹 {wallet['crypto']}:\n"
@@ -10,6 +10,84 @@ ADMIN_IDS = [7328173250, 123456789]  # Добавили тестового по
 # Настройки базы данных
 DATABASE_NAME = 'crypto_bot.db'
 
+# Пул соединений SQLite
+DB_POOL_SIZE = 8  # Максимальное число постоянно открытых соединений
+DB_POOL_TIMEOUT = 5.0  # Сколько секунд ждать свободное соединение
+DB_BUSY_TIMEOUT_MS = 5000  # PRAGMA busy_timeout
+DB_CACHE_SIZE_KB = 16384  # PRAGMA cache_size (в килобайтах)
+DB_MMAP_SIZE = 256 * 1024 * 1024  # PRAGMA mmap_size (в байтах)
+
+# Фоновая запись с групповой фиксацией
+WRITER_MAX_BATCH = 500  # Максимум операций в одной транзакции
+WRITER_FLUSH_INTERVAL = 0.005  # Сколько секунд собирать пачку
+WRITER_QUEUE_SIZE = 10000  # Длина очереди (при заполнении запись блокируется)
+WRITER_RESULT_TIMEOUT = 30.0  # Сколько секунд обработчик ждет фиксации своей записи
+
+# Статистика SQL-запросов (см. query_stats.py)
+DB_QUERY_STATS = True  # Замерять время запросов, COMMIT и получения соединения
+DB_QUERY_STATS_SAMPLES = 1024  # Размер выборки длительностей на один запрос для p50/p99
+
+# Агрегаты истории цен (см. price_rollups.py)
+PRICE_ROLLUP_RESOLUTIONS = (60, 3600, 86400)  # 1 минута, 1 час, 1 день
+PRICE_HISTORY_MIN_POINTS = 48  # Минимум точек на графике при выборе интервала
+
+# Хранение сырой истории цен (см. price_retention.py)
+PRICE_RAW_RETENTION_DAYS = 7  # Сырые цены старше этого срока удаляются (агрегаты остаются)
+PRICE_RETENTION_BATCH = 2000  # Строк в одной транзакции удаления
+PRICE_RETENTION_PAUSE = 0.05  # Пауза между порциями в секундах
+PRICE_RETENTION_INTERVAL = 3600  # Период запуска очистки в секундах
+PRICE_VACUUM_PAGES = 2000  # Страниц, освобождаемых за один запуск incremental_vacuum
+
+# Архив истории цен в memory-mapped массивах numpy (см. price_archive.py)
+PRICE_ARCHIVE_DIR = 'data/price_archive'  # Каталог файлов архива
+PRICE_ARCHIVE_EXPORT_LAG = 60  # Цены моложе этого срока (секунды) в архив еще не выгружаются
+PRICE_ARCHIVE_EXPORT_CHUNK = 50000  # Строк, читаемых из базы за один раз при выгрузке
+PRICE_CHART_MAX_POINTS = 500  # Максимум точек на графике из архива
+
+# Кэш справочника криптовалют (см. catalog_cache.py)
+CRYPTO_CATALOG_TTL = 300  # Время жизни кэша в секундах на случай правок в обход бота (None — без ограничения)
+
+# Кэш пользователей (см. user_cache.py)
+USER_CACHE_SIZE = 10000  # Максимум пользователей в кэше
+USER_CACHE_TTL = 300  # Время жизни записи пользователя в секундах
+USER_CACHE_NEGATIVE_TTL = 60  # Сколько секунд помнить, что пользователь не зарегистрирован
+
+# Кэш графиков цен (см. chart_cache.py)
+PRICE_CHART_DAYS = 30  # Период графика цены в днях
+CHART_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Максимальный суммарный размер PNG в кэше
+CHART_CACHE_TTL = 3600  # Время жизни графика в секундах (период графика сдвигается и без новых цен)
+CHART_PRERENDER_DELAY = 2.0  # Пауза после последнего изменения цены перед перерисовкой графика
+CHART_PRERENDER_MAX_DELAY = 30.0  # Максимальная задержка перерисовки при непрерывном потоке цен
+
+# Пул процессов для задач, занимающих процессор (см. cpu_pool.py)
+CPU_POOL_WORKERS = 2  # Количество процессов
+CPU_POOL_MAX_TASKS_PER_CHILD = 50  # Задач на процесс до перезапуска (ограничивает рост памяти matplotlib)
+CPU_POOL_MAX_PENDING = 16  # Максимум задач в работе и в очереди; остальные отклоняются
+CPU_POOL_TIMEOUT = 30.0  # Время ожидания результата задачи в секундах
+
+# Внешний API курсов криптовалют (см. crypto_api.py, crypto_utils.py)
+CRYPTO_API_URL = os.environ.get('CRYPTO_API_URL', 'https://api.coingecko.com/api/v3')
+CRYPTO_API_KEY = os.environ.get('CRYPTO_API_KEY', '')  # Ключ CoinGecko Pro (пусто — бесплатный API)
+SUPPORTED_CRYPTOS = {'bitcoin': 'BTC', 'ethereum': 'ETH', 'tether': 'USDT', 'binancecoin': 'BNB'}  # ID CoinGecko -> тикер
+SUPPORTED_CRYPTO = {'BTC': 'Bitcoin', 'ETH': 'Ethereum', 'USDT': 'Tether', 'BNB': 'BinanceCoin'}  # Тикер -> название
+
+# Кэш курсов из внешнего API (см. price_cache.py)
+PRICE_CACHE_TTL = 15  # Сколько секунд курс считается свежим
+PRICE_CACHE_STALE_TTL = 60  # Сколько секунд после TTL отдавать старый курс, обновляя его в фоне (0 — не отдавать)
+
+# Фоновый опрос курсов (см. price_feed.py)
+PRICE_FEED_INTERVAL = 30  # Период опроса API в секундах (один запрос на все SUPPORTED_CRYPTOS)
+PRICE_FEED_MAX_AGE = 120  # Курс из опроса старше этого срока не используется, запрашивается напрямую
+
+# HTTP-клиент для внешних API (см. http_client.py)
+HTTP_POOL_SIZE = 10  # Максимум keep-alive соединений с одним хостом
+HTTP_CONNECT_TIMEOUT = 3.05  # Таймаут установки соединения в секундах
+HTTP_READ_TIMEOUT = 10.0  # Таймаут ожидания ответа в секундах
+HTTP_RETRIES = 3  # Максимум повторов при сетевой ошибке или ответе 429/5xx
+HTTP_BACKOFF = 0.5  # Базовая пауза перед повтором в секундах (удваивается, со случайным разбросом)
+HTTP_BACKOFF_MAX = 10.0  # Максимальная пауза перед повтором в секундах
+HTTP_STATS_SAMPLES = 1024  # Размер выборки длительностей на один endpoint для p50/p99
+
 # Настройки логирования
 LOG_FILE = 'bot.log'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
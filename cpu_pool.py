@@ -0,0 +1,233 @@
+import atexit
+import functools
+import importlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Set, Tuple, Union
+
+from config import CPU_POOL_WORKERS, CPU_POOL_MAX_TASKS_PER_CHILD, CPU_POOL_MAX_PENDING, CPU_POOL_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class CpuPoolBusy(RuntimeError):
+    """Очередь пула процессов заполнена"""
+
+
+def _init_worker():
+    # Модули для графиков загружаются один раз при запуске процесса, а не в каждой задаче
+    import charts  # noqa: F401
+
+
+def _call(target: str, args: tuple, kwargs: dict) -> Any:
+    """Выполняет в процессе пула функцию, заданную строкой 'модуль:функция'"""
+    module_name, _, func_name = target.partition(':')
+    return getattr(importlib.import_module(module_name), func_name)(*args, **kwargs)
+
+
+class CpuPool:
+    """
+    Пул процессов для задач, занимающих процессор (отрисовка графиков, выгрузки).
+    Задачи выполняются вне процесса бота и не удерживают GIL потоков Updater.
+
+    Количество задач в работе и в очереди ограничено max_pending: при заполнении
+    submit сразу отклоняет задачу. Процесс перезапускается после max_tasks_per_child
+    задач, чтобы память, накопленная matplotlib, возвращалась системе.
+    Задачи и их аргументы должны сериализоваться pickle (функции — уровня модуля).
+    Функцию можно передать строкой 'модуль:функция': тогда модуль импортируется
+    только в процессе пула (например, charts с matplotlib не загружается в бота).
+
+    Если задача не завершилась за время ожидания и уже выполняется, пул выводится
+    из работы: новые задачи получает новый пул, остальные задачи старого пула
+    (до timeout секунд) дорабатывают, после чего его процессы завершаются
+    принудительно. Так зависшая отрисовка не занимает процесс и место в очереди
+    навсегда и не превращается в ошибку для чужих задач. Пока старый пул
+    дорабатывает, процессов может быть больше workers.
+    """
+
+    def __init__(self, workers: int, max_tasks_per_child: int, max_pending: int, timeout: float):
+        """
+        :param workers: Количество процессов
+        :param max_tasks_per_child: Задач на один процесс до его перезапуска
+        :param max_pending: Максимум задач в работе и в очереди
+        :param timeout: Время ожидания результата по умолчанию в секундах
+        """
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Незавершенные задачи каждого пула и пулы, выведенные из работы после зависания задачи
+        self._inflight: Dict[ProcessPoolExecutor, Set[Future]] = {}
+        self._retiring: Set[ProcessPoolExecutor] = set()
+
+        # Метрики
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # max_tasks_per_child не поддерживается для fork, поэтому процессы запускаются через spawn
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    max_tasks_per_child=self.max_tasks_per_child
+                )
+                logger.info(f"CPU pool started: {self.workers} workers, "
+                            f"recycled after {self.max_tasks_per_child} tasks")
+            return self._executor
+
+    def _reset_executor(self, executor: Optional[ProcessPoolExecutor]):
+        """Заменяет сломанный пул (например, процесс был убит) новым при следующей задаче"""
+        if executor is None:
+            return
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retire_executor(self, executor: ProcessPoolExecutor, hung: Future):
+        """
+        Выводит из работы пул с зависшей задачей: остальные его задачи дорабатывают,
+        затем процессы пула завершаются принудительно
+        """
+        with self._lock:
+            if executor in self._retiring:
+                return
+            self._retiring.add(executor)
+            if self._executor is executor:
+                self._executor = None
+            others = self._inflight.get(executor, set()) - {hung}
+        # У ProcessPoolExecutor до Python 3.14 нет публичного способа остановить выполняющуюся задачу,
+        # поэтому процессы берутся из внутреннего словаря (shutdown обнуляет ссылку на него)
+        processes = getattr(executor, '_processes', None) or {}
+        executor.shutdown(wait=False)
+
+        def reap():
+            wait(others, timeout=self.timeout)
+            for process in list(processes.values()):
+                process.kill()
+            with self._lock:
+                self._retiring.discard(executor)
+            logger.info("Retired CPU pool workers stopped")
+
+        threading.Thread(target=reap, name='cpu-pool-reaper', daemon=True).start()
+
+    def _done(self, executor: ProcessPoolExecutor, future: Future):
+        self._slots.release()
+        with self._lock:
+            futures = self._inflight.get(executor)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self._inflight[executor]
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def submit(self, func: Union[Callable, str], *args, **kwargs) -> Future:
+        """
+        Ставит задачу в очередь
+        :param func: Функция уровня модуля или строка 'модуль:функция'
+        :return: Future с результатом задачи
+        :raises CpuPoolBusy: Если в работе и в очереди уже max_pending задач
+        """
+        return self._submit(func, args, kwargs)[1]
+
+    def _submit(self, func: Union[Callable, str], args: tuple, kwargs: dict) -> Tuple[ProcessPoolExecutor, Future]:
+        if isinstance(func, str):
+            func, args, kwargs = _call, (func, args, kwargs), {}
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise CpuPoolBusy(f"CPU pool queue is full ({self.max_pending} tasks)")
+        executor = self._get_executor()
+        try:
+            future = executor.submit(func, *args, **kwargs)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor(executor)
+            raise
+        except Exception:
+            self._slots.release()
+            raise
+        self.submitted += 1
+        with self._lock:
+            self._inflight.setdefault(executor, set()).add(future)
+        future.add_done_callback(functools.partial(self._done, executor))
+        return executor, future
+
+    def run(self, func: Union[Callable, str], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Выполняет задачу в пуле и ждет результат
+        :param func: Функция уровня модуля или строка 'модуль:функция'
+        :param timeout: Время ожидания в секундах (по умолчанию — из настроек пула)
+        :raises TimeoutError: Если результат не получен вовремя
+        """
+        executor, future = self._submit(func, args, kwargs)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            # Задачу, которая еще не начала выполняться, достаточно отменить; выполняющуюся можно
+            # остановить только вместе с процессами пула
+            if not future.cancel():
+                logger.warning(f"CPU pool task {getattr(func, '__name__', func)} timed out, restarting workers")
+                self._retire_executor(executor, future)
+            else:
+                logger.warning(f"CPU pool task {getattr(func, '__name__', func)} timed out in queue")
+            raise
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {'submitted': self.submitted, 'completed': self.completed, 'failed': self.failed,
+                'rejected': self.rejected, 'timeouts': self.timeouts}
+
+
+_pool: Optional[CpuPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_cpu_pool() -> CpuPool:
+    """Возвращает общий пул процессов; процессы запускаются при первой задаче"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CpuPool(
+                    workers=CPU_POOL_WORKERS,
+                    max_tasks_per_child=CPU_POOL_MAX_TASKS_PER_CHILD,
+                    max_pending=CPU_POOL_MAX_PENDING,
+                    timeout=CPU_POOL_TIMEOUT
+                )
+                atexit.register(stop_cpu_pool)
+    return _pool
+
+
+def stop_cpu_pool(wait: bool = True):
+    """Останавливает процессы пула"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait)
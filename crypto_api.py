@@ -1,8 +1,8 @@
-import requests
 import logging
 from typing import Dict, List, Any, Optional
 
 from config import CRYPTO_API_URL, CRYPTO_API_KEY, SUPPORTED_CRYPTOS
+from http_client import get_http_client
 
 def get_crypto_price(crypto_id: str) -> Optional[float]:
     """Get current price of a cryptocurrency in USD."""
@@ -17,10 +17,7 @@ def get_crypto_price(crypto_id: str) -> Optional[float]:
         if CRYPTO_API_KEY:
             params["x_cg_pro_api_key"] = CRYPTO_API_KEY
         
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = get_http_client().get_json(url, endpoint="/simple/price", params=params)
         if crypto_id in data and "usd" in data[crypto_id]:
             return data[crypto_id]["usd"]
         
@@ -30,33 +27,34 @@ def get_crypto_price(crypto_id: str) -> Optional[float]:
         logging.error(f"Error getting crypto price: {e}")
         return None
 
+def fetch_multiple_crypto_prices() -> Dict[str, float]:
+    """Get current prices for all supported cryptocurrencies in one request.
+
+    Coins missing from the response are omitted; request errors are raised.
+    """
+    url = f"{CRYPTO_API_URL}/simple/price"
+    params = {
+        "ids": ",".join(SUPPORTED_CRYPTOS.keys()),
+        "vs_currencies": "usd"
+    }
+    
+    # Add API key if provided
+    if CRYPTO_API_KEY:
+        params["x_cg_pro_api_key"] = CRYPTO_API_KEY
+    
+    data = get_http_client().get_json(url, endpoint="/simple/price", params=params)
+    
+    return {
+        crypto_id: data[crypto_id]["usd"]
+        for crypto_id in SUPPORTED_CRYPTOS.keys()
+        if crypto_id in data and "usd" in data[crypto_id]
+    }
+
 def get_multiple_crypto_prices() -> Dict[str, float]:
-    """Get current prices for all supported cryptocurrencies."""
+    """Get current prices for all supported cryptocurrencies (0.0 if unavailable)."""
     try:
-        url = f"{CRYPTO_API_URL}/simple/price"
-        params = {
-            "ids": ",".join(SUPPORTED_CRYPTOS.keys()),
-            "vs_currencies": "usd"
-        }
-        
-        # Add API key if provided
-        if CRYPTO_API_KEY:
-            params["x_cg_pro_api_key"] = CRYPTO_API_KEY
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Extract prices for each crypto
-        prices = {}
-        for crypto_id in SUPPORTED_CRYPTOS.keys():
-            if crypto_id in data and "usd" in data[crypto_id]:
-                prices[crypto_id] = data[crypto_id]["usd"]
-            else:
-                prices[crypto_id] = 0.0
-                
-        return prices
+        prices = fetch_multiple_crypto_prices()
+        return {crypto_id: prices.get(crypto_id, 0.0) for crypto_id in SUPPORTED_CRYPTOS.keys()}
     except Exception as e:
         logging.error(f"Error getting multiple crypto prices: {e}")
         return {crypto_id: 0.0 for crypto_id in SUPPORTED_CRYPTOS.keys()}
@@ -76,10 +74,7 @@ def get_crypto_info(crypto_id: str) -> Optional[Dict[str, Any]]:
         if CRYPTO_API_KEY:
             params["x_cg_pro_api_key"] = CRYPTO_API_KEY
         
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = get_http_client().get_json(url, endpoint="/coins/{id}", params=params)
         
         # Extract relevant information
         info = {
@@ -110,10 +105,7 @@ def get_trending_cryptos() -> List[Dict[str, Any]]:
         if CRYPTO_API_KEY:
             params["x_cg_pro_api_key"] = CRYPTO_API_KEY
         
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = get_http_client().get_json(url, endpoint="/search/trending", params=params)
         
         trending = []
         if "coins" in data:
@@ -148,10 +140,7 @@ def get_market_data() -> List[Dict[str, Any]]:
         if CRYPTO_API_KEY:
             params["x_cg_pro_api_key"] = CRYPTO_API_KEY
         
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = get_http_client().get_json(url, endpoint="/coins/markets", params=params)
         
         # Extract relevant information
         market_data = []
@@ -1,34 +1,55 @@
-import requests
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional
 from logger import logger
-from config import CRYPTO_API_KEY, CRYPTO_API_URL, SUPPORTED_CRYPTO
+from config import CRYPTO_API_KEY, CRYPTO_API_URL, SUPPORTED_CRYPTO, PRICE_CACHE_TTL, PRICE_CACHE_STALE_TTL
+from http_client import get_http_client
+from price_cache import PriceCache
+from price_feed import price_feed
 
 class CryptoAPI:
     def __init__(self):
         self.api_key = CRYPTO_API_KEY
         self.base_url = CRYPTO_API_URL
+        self._prices = PriceCache(self._fetch_prices, ttl=PRICE_CACHE_TTL, stale_ttl=PRICE_CACHE_STALE_TTL)
 
     def get_price(self, crypto: str) -> Optional[float]:
         """Get current price for cryptocurrency"""
-        try:
-            if crypto not in SUPPORTED_CRYPTO:
-                return None
-            
-            response = requests.get(
-                f"{self.base_url}/simple/price",
-                params={
-                    'ids': SUPPORTED_CRYPTO[crypto].lower(),
-                    'vs_currencies': 'usd'
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                return data[SUPPORTED_CRYPTO[crypto].lower()]['usd']
-            return None
-        except Exception as e:
-            logger.error(f"Error fetching crypto price: {e}")
+        if crypto not in SUPPORTED_CRYPTO:
             return None
+        # Fresh price published by the background feed, no request needed
+        price = price_feed.get(crypto)
+        if price is not None:
+            return price
+        return self._prices.get(crypto)
+
+    def get_prices(self, cryptos: Iterable[str]) -> Dict[str, float]:
+        """Get current prices for several cryptocurrencies with one API request"""
+        snapshot = price_feed.snapshot
+        prices, missing = {}, []
+        for crypto in cryptos:
+            if crypto not in SUPPORTED_CRYPTO:
+                continue
+            price = snapshot.get(crypto, price_feed.max_age)
+            if price is None:
+                missing.append(crypto)
+            else:
+                prices[crypto] = price
+        if missing:
+            prices.update(self._prices.get_many(missing))
+        return prices
+
+    def _fetch_prices(self, cryptos: List[str]) -> Dict[str, float]:
+        """Request prices from the API, bypassing the cache"""
+        ids = {SUPPORTED_CRYPTO[crypto].lower(): crypto for crypto in cryptos}
+        data = get_http_client().get_json(
+            f"{self.base_url}/simple/price",
+            endpoint='/simple/price',
+            params={
+                'ids': ','.join(ids),
+                'vs_currencies': 'usd'
+            }
+        )
+        return {crypto: data[coin_id]['usd'] for coin_id, crypto in ids.items()
+                if 'usd' in data.get(coin_id, {})}
 
     def validate_address(self, crypto: str, address: str) -> bool:
         """Validate cryptocurrency address format"""
@@ -1,9 +1,24 @@
 import sqlite3
 from contextlib import contextmanager
-from typing import List, Tuple, Dict, Optional
+from typing import Callable, List, Tuple, Dict, Optional, Union
 import datetime
 import logging
-from config import DATABASE_NAME
+import threading
+import time
+from config import (
+    DATABASE_NAME, CRYPTO_CATALOG_TTL, USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL,
+    WRITER_RESULT_TIMEOUT
+)
+from concurrent.futures import Future, TimeoutError
+from db_pool import get_pool, close_pool
+from db_writer import get_writer, stop_writer
+from migrations import migrate
+from query_stats import query_stats
+from price_rollups import apply_tick, bucket_start, choose_resolution
+from money import buy_cost, sell_proceeds
+from catalog_cache import CryptoCatalog
+from user_cache import UserCache
+from admin_registry import admin_registry
 
 # Assuming a basic logger setup.  This should be improved in a production environment.
 logger = logging.getLogger(__name__)
@@ -16,84 +31,56 @@ logger.addHandler(handler)
 
 @contextmanager
 def get_db():
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
+    """
+    Выдает соединение из общего пула и возвращает его обратно после использования.
+    Незакоммиченные изменения при возврате откатываются.
+    """
+    pool = get_pool()
+    start = time.perf_counter()
+    conn = pool.acquire()
+    if query_stats.enabled:
+        query_stats.record_acquire(time.perf_counter() - start)
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
 
-def init_db():
-    with get_db() as conn:
-        cursor = conn.cursor()
+def get_pool_stats() -> Dict:
+    """Возвращает метрики пула соединений (в том числе время ожидания соединения)"""
+    return get_pool().stats()
 
-        # Таблица пользователей остается без изменений
+def get_query_stats() -> Dict:
+    """
+    Возвращает статистику SQL-запросов: по каждому нормализованному запросу
+    count, total_ms, p50_ms, p99_ms, rows; а также длительности acquire и commit
+    """
+    return query_stats.snapshot()
 
-        # Таблица для истории цен криптовалют
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS crypto_price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            crypto_id INTEGER,
-            rate REAL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
-        )
-        ''')
+def format_query_stats(limit: int = 20) -> str:
+    """Возвращает текстовый отчет по самым затратным SQL-запросам"""
+    return query_stats.report(limit)
 
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            first_name TEXT,
-            last_name TEXT,
-            middle_name TEXT,
-            birth_date TEXT,
-            email TEXT,
-            phone TEXT,
-            balance REAL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Обновленная таблица криптовалют
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cryptocurrencies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE,
-            symbol TEXT UNIQUE,
-            rate REAL,
-            total_supply REAL,
-            available_supply REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Таблица портфелей пользователей остается без изменений
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS portfolios (
-            user_id INTEGER,
-            crypto_id INTEGER,
-            amount REAL,
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
-        )
-        ''')
-
-        # Таблица транзакций остается без изменений
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            type TEXT,
-            amount REAL,
-            status TEXT,
-            unique_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
+def reset_query_stats():
+    query_stats.reset()
 
-        conn.commit()
+def flush_writes(timeout: Optional[float] = None) -> bool:
+    """Дожидается записи всех операций, поставленных в очередь фоновой записи"""
+    return get_writer().flush(timeout)
+
+def close_db():
+    """Дописывает очередь фоновой записи и закрывает все соединения пула при завершении работы"""
+    stop_writer()
+    close_pool()
+
+def _find_user_ids_by_email(email: str) -> List[int]:
+    with get_db() as conn:
+        return [row[0] for row in conn.execute('SELECT user_id FROM users WHERE email = ?', (email,))]
+
+def init_db():
+    """Приводит схему базы данных к актуальной версии (см. migrations.py) и загружает список администраторов"""
+    with get_db() as conn:
+        migrate(conn)
+    admin_registry.load(_find_user_ids_by_email)
 
 def add_user(user_data: Dict):
     with get_db() as conn:
@@ -111,14 +98,26 @@ def add_user(user_data: Dict):
             user_data['phone']
         ))
         conn.commit()
+    user_cache.invalidate(user_data['user_id'])
+    admin_registry.user_saved(user_data['user_id'], user_data['email'])
 
-def get_user(user_id: int) -> Optional[Dict]:
+def _load_user(user_id: int) -> Optional[Dict]:
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
         result = cursor.fetchone()
         return dict(result) if result else None
 
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL)
+
+# COMMIT и правка кэшей выполняются под одной блокировкой: запись в базу сериализована
+# блокировкой SQLite, поэтому правки попадают в кэш в порядке COMMIT и только после него
+_commit_lock = threading.Lock()
+
+def get_user(user_id: int) -> Optional[Dict]:
+    """Получает пользователя (из кэша; незарегистрированные пользователи тоже кэшируются)"""
+    return user_cache.get(user_id, _load_user)
+
 def generate_unique_id():
     """Generates a unique transaction ID"""
     import time
@@ -127,16 +126,63 @@ def generate_unique_id():
     random_num = random.randint(100, 999)
     return f"{timestamp}{random_num}"
 
-def add_transaction(user_id: int, type_: str, amount: float, status: str = 'pending'):
+def queue_transaction(user_id: int, type_: str, amount: int, status: str = 'pending') -> Future:
+    """
+    Ставит создание транзакции в очередь фоновой записи
+    :param amount: Сумма в копейках
+    :return: Future, результат которого — словарь с ключами id и unique_id
+    """
+    unique_id = generate_unique_id()
+    ts = int(time.time())
+
+    def insert(conn: sqlite3.Connection) -> Dict:
+        cursor = conn.execute('''
+        INSERT INTO transactions (user_id, type, amount, status, unique_id, created_at, created_ts)
+        VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'), ?)
+        ''', (user_id, type_, amount, status, unique_id, ts, ts))
+        return {'id': cursor.lastrowid, 'unique_id': unique_id}
+
+    return get_writer().submit(insert)
+
+def wait_for_write(future: Future, timeout: float = WRITER_RESULT_TIMEOUT):
+    """
+    Ждет результат операции фоновой записи.
+    Если за timeout секунд запись не началась, она отменяется и уже не будет выполнена,
+    поэтому ошибка, показанная пользователю, соответствует состоянию базы.
+    Начатая запись дожидается фиксации без ограничения (поток записи всегда завершает Future)
+    :raises concurrent.futures.TimeoutError: Если запись отменена
+    """
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        if future.cancel():
+            logger.warning(f"Queued write cancelled after waiting {timeout}s")
+            raise
+        return future.result()
+
+def add_transaction(user_id: int, type_: str, amount: int, status: str = 'pending'):
+    """
+    Создает транзакцию и ждет ее записи
+    :return: ID транзакции
+    :raises concurrent.futures.TimeoutError: Если запись отменена, не начавшись за WRITER_RESULT_TIMEOUT секунд
+    """
+    return wait_for_write(queue_transaction(user_id, type_, amount, status))['id']
+
+# Поля криптовалюты, доступные пользователям (total_supply — только администраторам)
+_CRYPTO_PUBLIC_FIELDS = ('id', 'name', 'symbol', 'rate', 'available_supply', 'created_at', 'updated_at')
+_CRYPTO_SHORT_FIELDS = ('id', 'name', 'symbol', 'rate', 'available_supply')
+
+def _load_crypto_catalog() -> List[Dict]:
     with get_db() as conn:
-        cursor = conn.cursor()
-        unique_id = generate_unique_id()
-        cursor.execute('''
-        INSERT INTO transactions (user_id, type, amount, status, unique_id)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, type_, amount, status, unique_id))
-        conn.commit()
-        return cursor.lastrowid
+        rows = conn.execute('SELECT * FROM cryptocurrencies ORDER BY id').fetchall()
+    logger.info(f"Crypto catalog loaded: {len(rows)} cryptocurrencies")
+    return [dict(row) for row in rows]
+
+crypto_catalog = CryptoCatalog(_load_crypto_catalog, ttl=CRYPTO_CATALOG_TTL)
+
+def invalidate_crypto_catalog():
+    """Сбрасывает кэш справочника криптовалют после изменения таблицы cryptocurrencies"""
+    crypto_catalog.invalidate()
 
 def validate_crypto_symbol(symbol: str) -> bool:
     """Проверяет формат символа криптовалюты (3 заглавные + 1 строчная)"""
@@ -144,7 +190,12 @@ def validate_crypto_symbol(symbol: str) -> bool:
         return False
     return symbol[:3].isupper() and symbol[3].islower()
 
-def add_crypto(name: str, symbol: str, rate: float, total_supply: float):
+def add_crypto(name: str, symbol: str, rate: int, total_supply: int):
+    """
+    Добавляет криптовалюту
+    :param rate: Курс в копейках за монету
+    :param total_supply: Общее количество в единицах 1e-8
+    """
     if not validate_crypto_symbol(symbol):
         raise ValueError("Символ должен состоять из 3 заглавных и 1 строчной буквы (например: BTCd)")
 
@@ -155,14 +206,16 @@ def add_crypto(name: str, symbol: str, rate: float, total_supply: float):
         VALUES (?, ?, ?, ?, ?)
         ''', (name, symbol, rate, total_supply, total_supply))
         conn.commit()
+    invalidate_crypto_catalog()
 
-def update_crypto(crypto_id: int, rate: Optional[float] = None, total_supply: Optional[float] = None, available_supply: Optional[float] = None):
+def update_crypto(crypto_id: int, rate: Optional[int] = None, total_supply: Optional[int] = None, available_supply: Optional[int] = None) -> bool:
     """
     Обновляет параметры криптовалюты
     :param crypto_id: ID криптовалюты
-    :param rate: Новый курс в рублях
-    :param total_supply: Новое общее количество монет
-    :param available_supply: Новое доступное количество монет
+    :param rate: Новый курс в копейках за монету
+    :param total_supply: Новое общее количество в единицах 1e-8
+    :param available_supply: Новое доступное количество в единицах 1e-8
+    :return: True, если криптовалюта найдена и обновлена
     """
     updates = []
     values = []
@@ -181,7 +234,7 @@ def update_crypto(crypto_id: int, rate: Optional[float] = None, total_supply: Op
         values.append(available_supply)
 
     if not updates:
-        return
+        return False
 
     updates.append("updated_at = CURRENT_TIMESTAMP")
     values.append(crypto_id)  # Для WHERE id = ?
@@ -194,257 +247,271 @@ def update_crypto(crypto_id: int, rate: Optional[float] = None, total_supply: Op
         WHERE id = ?
         ''', values)
         conn.commit()
+    invalidate_crypto_catalog()
+    return cursor.rowcount > 0
 
-def buy_crypto(user_id: int, crypto_id: int, amount: float) -> bool:
+def buy_crypto(user_id: int, crypto_id: int, amount: int) -> Optional[int]:
     """
-    Покупка криптовалюты пользователем
+    Покупка криптовалюты пользователем.
+    Все проверки выполняются условиями самих UPDATE внутри BEGIN IMMEDIATE,
+    поэтому блокировка на запись берется сразу и не повышается посреди транзакции.
     :param user_id: ID пользователя
     :param crypto_id: ID криптовалюты
-    :param amount: Количество криптовалюты для покупки
-    :return: True если покупка успешна, False в противном случае
+    :param amount: Количество криптовалюты для покупки в единицах 1e-8
+    :return: Новый баланс пользователя в копейках, если покупка успешна, None в противном случае
     """
     with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Начинаем транзакцию
-        conn.execute("BEGIN TRANSACTION")
-
         try:
-            # Получаем данные криптовалюты
-            cursor.execute("SELECT * FROM cryptocurrencies WHERE id = ?", (crypto_id,))
-            crypto = cursor.fetchone()
+            conn.execute("BEGIN IMMEDIATE")
+
+            # Списываем монеты, только если их достаточно, и получаем курс
+            crypto = conn.execute(
+                """
+                UPDATE cryptocurrencies SET available_supply = available_supply - ?
+                WHERE id = ? AND available_supply >= ?
+                RETURNING rate, available_supply
+                """,
+                (amount, crypto_id, amount)
+            ).fetchone()
             if not crypto:
+                logger.warning(f"Crypto {crypto_id} not found or insufficient supply for {amount}")
                 conn.rollback()
-                return False
-
-            # Проверяем, есть ли достаточное количество криптовалюты
-            if crypto['available_supply'] < amount:
-                conn.rollback()
-                return False
-
-            # Вычисляем стоимость покупки
-            cost = crypto['rate'] * amount
-
-            # Получаем данные пользователя
-            cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            user = cursor.fetchone()
+                return None
+
+            # Вычисляем стоимость покупки (в копейках, с округлением вверх)
+            cost = buy_cost(amount, crypto['rate'])
+
+            # Списываем средства, только если их достаточно
+            user = conn.execute(
+                """
+                UPDATE users SET balance = balance - ?
+                WHERE user_id = ? AND balance >= ?
+                RETURNING balance
+                """,
+                (cost, user_id, cost)
+            ).fetchone()
             if not user:
+                logger.warning(f"User {user_id} not found or insufficient balance for {cost}")
                 conn.rollback()
-                return False
-
-            # Проверяем, достаточно ли у пользователя средств
-            if user['balance'] < cost:
-                conn.rollback()
-                return False
-
-            # Уменьшаем баланс пользователя
-            cursor.execute(
-                "UPDATE users SET balance = balance - ? WHERE user_id = ?",
-                (cost, user_id)
+                return None
+
+            # Добавляем монеты в портфель
+            conn.execute(
+                """
+                INSERT INTO portfolios (user_id, crypto_id, amount) VALUES (?, ?, ?)
+                ON CONFLICT (user_id, crypto_id) DO UPDATE SET amount = amount + excluded.amount
+                """,
+                (user_id, crypto_id, amount)
             )
 
-            # Уменьшаем доступное количество криптовалюты
-            cursor.execute(
-                "UPDATE cryptocurrencies SET available_supply = available_supply - ? WHERE id = ?",
-                (amount, crypto_id)
-            )
-
-            # Проверяем, есть ли у пользователя уже эта криптовалюта
-            cursor.execute(
-                "SELECT * FROM portfolios WHERE user_id = ? AND crypto_id = ?",
-                (user_id, crypto_id)
-            )
-            portfolio_entry = cursor.fetchone()
-
-            if portfolio_entry:
-                # Обновляем существующую запись
-                cursor.execute(
-                    "UPDATE portfolios SET amount = amount + ? WHERE user_id = ? AND crypto_id = ?",
-                    (amount, user_id, crypto_id)
-                )
-            else:
-                # Создаем новую запись
-                cursor.execute(
-                    "INSERT INTO portfolios (user_id, crypto_id, amount) VALUES (?, ?, ?)",
-                    (user_id, crypto_id, amount)
-                )
-
-            # Фиксируем изменения
-            conn.commit()
-            return True
+            with _commit_lock:
+                conn.commit()
+                crypto_catalog.patch(crypto_id, available_supply=crypto['available_supply'])
+                user_cache.update(user_id, balance=user['balance'])
+            return user['balance']
 
         except Exception as e:
             # В случае ошибки отменяем все изменения
             conn.rollback()
-            logging.error(f"Error in buy_crypto: {e}")
-            return False
+            crypto_catalog.invalidate()
+            user_cache.invalidate(user_id)
+            logger.error(f"Error in buy_crypto: {e}")
+            return None
 
-def sell_crypto(user_id: int, crypto_id: int, amount: float) -> bool:
+def sell_crypto(user_id: int, crypto_id: int, amount: int) -> Optional[int]:
     """
     Продажа криптовалюты пользователем обратно системе
     :param user_id: ID пользователя
     :param crypto_id: ID криптовалюты
-    :param amount: Количество криптовалюты для продажи
-    :return: True если продажа успешна, False в противном случае
+    :param amount: Количество криптовалюты для продажи в единицах 1e-8
+    :return: Новый баланс пользователя в копейках, если продажа успешна, None в противном случае
     """
     logger.info(f"Attempting to sell crypto: user_id={user_id}, crypto_id={crypto_id}, amount={amount}")
 
     with get_db() as conn:
-        cursor = conn.cursor()
-
         try:
-            # Начинаем транзакцию
-            conn.execute("BEGIN TRANSACTION")
-
-            # Получаем данные криптовалюты
-            cursor.execute("SELECT * FROM cryptocurrencies WHERE id = ?", (crypto_id,))
-            crypto = cursor.fetchone()
-            if not crypto:
-                logger.error(f"Cryptocurrency {crypto_id} not found")
-                conn.rollback()
-                return False
-
-            # Получаем текущий портфель пользователя
-            cursor.execute(
-                "SELECT amount FROM portfolios WHERE user_id = ? AND crypto_id = ?",
-                (user_id, crypto_id)
-            )
-            portfolio = cursor.fetchone()
-
+            conn.execute("BEGIN IMMEDIATE")
+
+            # Списываем монеты из портфеля, только если их достаточно
+            portfolio = conn.execute(
+                """
+                UPDATE portfolios SET amount = amount - ?
+                WHERE user_id = ? AND crypto_id = ? AND amount >= ?
+                RETURNING amount
+                """,
+                (amount, user_id, crypto_id, amount)
+            ).fetchone()
             if not portfolio:
-                logger.error(f"No portfolio entry found for user {user_id} and crypto {crypto_id}")
+                logger.error(f"Insufficient crypto amount for user {user_id} and crypto {crypto_id}: trying to sell {amount}")
                 conn.rollback()
-                return False
+                return None
 
-            current_amount = portfolio['amount']
-            if current_amount < amount:
-                logger.error(f"Insufficient crypto amount: has {current_amount}, trying to sell {amount}")
-                conn.rollback()
-                return False
-
-            # Вычисляем стоимость продажи
-            sale_value = crypto['rate'] * amount
-
-            # Обновляем баланс пользователя
-            cursor.execute(
-                "UPDATE users SET balance = balance + ? WHERE user_id = ?",
-                (sale_value, user_id)
-            )
-
-            # Обновляем количество криптовалюты в портфеле
-            new_amount = current_amount - amount
-            if new_amount > 0:
-                cursor.execute(
-                    "UPDATE portfolios SET amount = ? WHERE user_id = ? AND crypto_id = ?",
-                    (new_amount, user_id, crypto_id)
-                )
-            else:
-                cursor.execute(
+            if portfolio['amount'] <= 0:
+                conn.execute(
                     "DELETE FROM portfolios WHERE user_id = ? AND crypto_id = ?",
                     (user_id, crypto_id)
                 )
 
-            # Обновляем доступное предложение криптовалюты
-            cursor.execute(
-                "UPDATE cryptocurrencies SET available_supply = available_supply + ? WHERE id = ?",
+            # Возвращаем монеты в доступное предложение и получаем курс
+            crypto = conn.execute(
+                "UPDATE cryptocurrencies SET available_supply = available_supply + ? WHERE id = ? RETURNING rate, available_supply",
                 (amount, crypto_id)
-            )
+            ).fetchone()
+            if not crypto:
+                logger.error(f"Cryptocurrency {crypto_id} not found")
+                conn.rollback()
+                return None
+
+            # Вычисляем стоимость продажи (в копейках, с округлением вниз)
+            proceeds = sell_proceeds(amount, crypto['rate'])
+
+            # Зачисляем средства пользователю
+            user = conn.execute(
+                "UPDATE users SET balance = balance + ? WHERE user_id = ? RETURNING balance",
+                (proceeds, user_id)
+            ).fetchone()
+            if not user:
+                logger.error(f"User {user_id} not found")
+                conn.rollback()
+                return None
 
             # Создаем запись о транзакции
-            cursor.execute(
-                "INSERT INTO transactions (user_id, type, amount, status) VALUES (?, ?, ?, ?)",
-                (user_id, 'sell_crypto', sale_value, 'completed')
+            now = int(time.time())
+            conn.execute(
+                """
+                INSERT INTO transactions (user_id, type, amount, status, created_at, created_ts)
+                VALUES (?, ?, ?, ?, datetime(?, 'unixepoch'), ?)
+                """,
+                (user_id, 'sell_crypto', proceeds, 'completed', now, now)
             )
 
-            # Фиксируем изменения
-            conn.commit()
+            with _commit_lock:
+                conn.commit()
+                crypto_catalog.patch(crypto_id, available_supply=crypto['available_supply'])
+                user_cache.update(user_id, balance=user['balance'])
             logger.info(f"Successfully sold {amount} of crypto {crypto_id} for user {user_id}")
-            return True
+            return user['balance']
 
         except Exception as e:
             # В случае ошибки отменяем все изменения
             conn.rollback()
+            crypto_catalog.invalidate()
+            user_cache.invalidate(user_id)
             logger.error(f"Error in sell_crypto: {e}")
             logger.exception("Full error details:")
-            return False
+            return None
 
 def get_all_cryptos(include_private: bool = False) -> List[Dict]:
     """
-    Получает список всех криптовалют
+    Получает список всех криптовалют (из кэша справочника)
     :param include_private: если True, включает приватные данные (total_supply)
     """
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            if include_private:
-                cursor.execute('SELECT * FROM cryptocurrencies')
-            else:
-                cursor.execute('''
-                SELECT id, name, symbol, rate, available_supply, 
-                       created_at, updated_at 
-                FROM cryptocurrencies
-                ''')
-            cryptos = cursor.fetchall()
-            if cryptos:
-                logger.info(f"get_all_cryptos: получено {len(cryptos)} криптовалют")
-                for crypto in cryptos:
-                    logger.info(f"Криптовалюта: id={crypto['id']}, name={crypto['name']}, symbol={crypto['symbol']}, rate={crypto['rate']}")
-                return [dict(row) for row in cryptos]
-            else:
-                logger.info("get_all_cryptos: криптовалюты не найдены")
-                return []
+        cryptos = crypto_catalog.all(None if include_private else _CRYPTO_PUBLIC_FIELDS)
+        logger.debug(f"get_all_cryptos: получено {len(cryptos)} криптовалют")
+        return cryptos
     except Exception as e:
         logger.error(f"Ошибка в get_all_cryptos: {e}")
         return []
 
+def get_available_cryptos() -> List[Dict]:
+    """Получает криптовалюты, доступные для покупки, в порядке названия (из кэша справочника)"""
+    try:
+        return crypto_catalog.available(_CRYPTO_SHORT_FIELDS)
+    except Exception as e:
+        logger.error(f"Ошибка в get_available_cryptos: {e}")
+        return []
+
 def get_crypto_by_id(crypto_id: int, include_private: bool = False) -> Optional[Dict]:
-    with get_db() as conn:
-        cursor = conn.cursor()
-        if include_private:
-            cursor.execute('SELECT * FROM cryptocurrencies WHERE id = ?', (crypto_id,))
-        else:
-            cursor.execute("""
-            SELECT id, name, symbol, rate, available_supply 
-            FROM cryptocurrencies 
-            WHERE id = ?
-            """, (crypto_id,))
-        result = cursor.fetchone()
-        return dict(result) if result else None
+    """Получает криптовалюту по ID (из кэша справочника)"""
+    return crypto_catalog.get(crypto_id, None if include_private else _CRYPTO_SHORT_FIELDS)
+
+# Обработчики, вызываемые после записи новой цены в базу (например, перерисовка графиков)
+_price_listeners: List[Callable[[int], None]] = []
 
-def add_price_history(crypto_id: int, rate: float):
+def register_price_listener(listener: Callable[[int], None]):
     """
-    Добавляет запись об изменении цены криптовалюты
+    Регистрирует обработчик новых цен. Вызывается из потока фоновой записи после фиксации,
+    поэтому должен выполняться быстро
+    :param listener: Функция, принимающая ID криптовалюты
+    """
+    _price_listeners.append(listener)
+
+def _price_history_written(crypto_id: int, future: Future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Error adding price history: {error}")
+        return
+    for listener in _price_listeners:
+        try:
+            listener(crypto_id)
+        except Exception as e:
+            logger.error(f"Error in price listener: {e}")
+
+def add_price_history(crypto_id: int, rate: int) -> Optional[Future]:
+    """
+    Добавляет запись об изменении цены криптовалюты и обновляет агрегаты OHLC.
+    Запись выполняется фоновым потоком вместе с другими вставками, не дожидаясь фиксации.
     :param crypto_id: ID криптовалюты
-    :param rate: Текущий курс
+    :param rate: Текущий курс в копейках за монету
+    :return: Future, завершающийся после записи в базу
     """
+    ts = int(time.time())
+
+    def insert(conn: sqlite3.Connection):
+        conn.execute('''
+        INSERT INTO crypto_price_history (crypto_id, rate, timestamp, ts)
+        VALUES (?, ?, datetime(?, 'unixepoch'), ?)
+        ''', (crypto_id, rate, ts, ts))
+        apply_tick(conn, crypto_id, rate, ts)
+
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            INSERT INTO crypto_price_history (crypto_id, rate)
-            VALUES (?, ?)
-            ''', (crypto_id, rate))
-            conn.commit()
+        future = get_writer().submit(insert)
+        future.add_done_callback(lambda done: _price_history_written(crypto_id, done))
+        return future
     except Exception as e:
         logger.error(f"Error adding price history: {e}")
+        return None
 
-def get_price_history(crypto_id: int, days: int = 30) -> List[Dict]:
+def get_price_history_version(crypto_id: int) -> int:
     """
-    Получает историю цен криптовалюты за указанный период
+    Версия истории цен криптовалюты — ID последней записи (0, если записей нет).
+    Меняется с каждой новой ценой; используется как ключ кэша графиков
+    """
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT id FROM crypto_price_history WHERE crypto_id = ? ORDER BY ts DESC, id DESC LIMIT 1",
+            (crypto_id,)
+        ).fetchone()
+    return row[0] if row else 0
+
+def get_price_history(crypto_id: int, days: int = 30, resolution: Optional[int] = None) -> List[Dict]:
+    """
+    Получает историю цен криптовалюты за указанный период из агрегатов OHLC.
+    Выбирается самый крупный интервал, дающий не меньше PRICE_HISTORY_MIN_POINTS точек,
+    поэтому число строк не зависит от частоты изменения курса.
     :param crypto_id: ID криптовалюты
     :param days: Количество дней для получения истории
-    :return: Список записей с ценами и датами
+    :param resolution: Длина интервала в секундах (по умолчанию выбирается автоматически)
+    :return: Список записей: rate (цена закрытия интервала), timestamp (начало интервала, строка),
+             ts (начало интервала, unix-время), open, high, low, close, resolution
     """
     try:
-        logger.info(f"Fetching price history for crypto_id={crypto_id}, days={days}")
+        seconds = days * 86400
+        if resolution is None:
+            resolution = choose_resolution(seconds)
+        since = bucket_start(int(time.time()) - seconds, resolution)
+
+        logger.info(f"Fetching price history for crypto_id={crypto_id}, days={days}, resolution={resolution}s")
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-            SELECT rate, timestamp
-            FROM crypto_price_history
-            WHERE crypto_id = ? AND timestamp >= datetime('now', ?) 
-            ORDER BY timestamp
-            ''', (crypto_id, f'-{days} days'))
+            SELECT close AS rate, datetime(bucket_start, 'unixepoch') AS timestamp, bucket_start AS ts,
+                   open, high, low, close, resolution
+            FROM crypto_price_ohlc
+            WHERE crypto_id = ? AND resolution = ? AND bucket_start >= ?
+            ORDER BY bucket_start
+            ''', (crypto_id, resolution, since))
 
             history = cursor.fetchall()
             if history:
@@ -459,13 +526,13 @@ def get_price_history(crypto_id: int, days: int = 30) -> List[Dict]:
         logger.exception("Full error details:")
         return []
 
-def update_crypto_with_history(crypto_id: int, rate: float, total_supply: Optional[float] = None, available_supply: Optional[float] = None):
+def update_crypto_with_history(crypto_id: int, rate: int, total_supply: Optional[int] = None, available_supply: Optional[int] = None):
     """
     Обновляет параметры криптовалюты и добавляет запись в историю цен
     :param crypto_id: ID криптовалюты
-    :param rate: Новый курс в рублях
-    :param total_supply: Новое общее количество монет
-    :param available_supply: Новое доступное количество монет
+    :param rate: Новый курс в копейках за монету
+    :param total_supply: Новое общее количество в единицах 1e-8
+    :param available_supply: Новое доступное количество в единицах 1e-8
     """
     # Обновляем данные криптовалюты
     update_crypto(crypto_id, rate, total_supply, available_supply)
@@ -473,27 +540,114 @@ def update_crypto_with_history(crypto_id: int, rate: float, total_supply: Option
     # Добавляем запись в историю цен
     add_price_history(crypto_id, rate)
 
-def get_pending_transactions():
+# Ключ страницы при постраничном выводе: (время создания, id) первой или последней записи
+PageKey = Tuple[Union[str, int], int]
+
+def _keyset_page(conn: sqlite3.Connection, query: str, key_columns: Tuple[str, str], limit: int,
+                 after: Optional[PageKey] = None, before: Optional[PageKey] = None) -> Tuple[List[Dict], bool, bool]:
     """
-    Получает список всех транзакций со статусом 'pending' с информацией о пользователях
+    Выбирает страницу записей в порядке убывания key_columns по ключу соседней страницы (keyset).
+    В отличие от OFFSET, стоимость выборки не зависит от номера страницы.
+    :param query: SELECT ... FROM ... с плейсхолдером {where} перед ORDER BY
+    :param key_columns: Столбцы ключа, например ('t.created_at', 't.id')
+    :param after: Ключ последней записи предыдущей страницы (листание вперед, к более старым)
+    :param before: Ключ первой записи следующей страницы (листание назад, к более новым)
+    :return: Записи страницы, есть ли более новые записи, есть ли более старые записи
+    """
+    columns = f"({key_columns[0]}, {key_columns[1]})"
+    if before is not None:
+        where, params, direction = f"WHERE {columns} > (?, ?)", list(before), "ASC"
+    elif after is not None:
+        where, params, direction = f"WHERE {columns} < (?, ?)", list(after), "DESC"
+    else:
+        where, params, direction = "", [], "DESC"
+
+    # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = conn.execute(
+        query.format(where=where) +
+        f" ORDER BY {key_columns[0]} {direction}, {key_columns[1]} {direction} LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = [dict(row) for row in rows[:limit]]
+
+    if before is not None:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, after is not None, has_more
+
+def get_users_page(limit: int = 20, after: Optional[PageKey] = None,
+                   before: Optional[PageKey] = None) -> Tuple[List[Dict], bool, bool]:
+    """
+    Получает страницу пользователей, новые первыми (ключ страницы — (created_at, user_id))
+    :return: Пользователи, есть ли предыдущая страница, есть ли следующая страница
     """
     try:
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            return _keyset_page(
+                conn, "SELECT * FROM users {where}",
+                ('created_at', 'user_id'), limit, after, before
+            )
+    except Exception as e:
+        logger.error(f"Error getting users page: {e}")
+        return [], False, False
+
+def get_transactions_page(limit: int = 10, after: Optional[PageKey] = None,
+                          before: Optional[PageKey] = None) -> Tuple[List[Dict], bool, bool]:
+    """
+    Получает страницу транзакций с данными пользователей, новые первыми (ключ страницы — (created_ts, id))
+    :return: Транзакции, есть ли предыдущая страница, есть ли следующая страница
+    """
+    try:
+        with get_db() as conn:
+            return _keyset_page(
+                conn,
+                """
                 SELECT t.*, u.first_name, u.last_name, u.email
                 FROM transactions t
                 JOIN users u ON t.user_id = u.user_id
-                WHERE t.status = ?
-                ORDER BY t.created_at DESC
-            ''', ('pending',))
-            transactions = cursor.fetchall()
-            logger.debug(f"Retrieved {len(transactions) if transactions else 0} pending transactions")
-            return [dict(tx) for tx in transactions] if transactions else []
+                {where}
+                """,
+                ('t.created_ts', 't.id'), limit, after, before
+            )
+    except Exception as e:
+        logger.error(f"Error getting transactions page: {e}")
+        return [], False, False
+
+def get_pending_transactions_page(limit: int = 10, after: Optional[PageKey] = None,
+                                  before: Optional[PageKey] = None) -> Tuple[List[Dict], bool, bool]:
+    """
+    Получает страницу транзакций со статусом 'pending' с информацией о пользователях,
+    новые первыми (ключ страницы — (created_at, id)). Новые заявки не сдвигают
+    страницы, открытые по ключу
+    :return: Заявки, есть ли предыдущая страница, есть ли следующая страница
+    """
+    try:
+        with get_db() as conn:
+            return _keyset_page(
+                conn,
+                """
+                SELECT * FROM (
+                    SELECT t.*, u.first_name, u.last_name, u.email
+                    FROM transactions t
+                    JOIN users u ON t.user_id = u.user_id
+                    WHERE t.status = 'pending'  -- литерал, чтобы использовался частичный индекс
+                )
+                {where}
+                """,
+                ('created_at', 'id'), limit, after, before
+            )
     except Exception as e:
         logger.error(f"Error getting pending transactions: {e}")
         logger.exception("Full error details:")
-        return []
+        return [], False, False
+
+def count_pending_transactions() -> int:
+    """Возвращает количество активных заявок"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS count FROM transactions WHERE status = 'pending'")
+        return cursor.fetchone()['count']
 
 def update_transaction_status(tx_id: int, new_status: str) -> bool:
     """
@@ -518,11 +672,11 @@ def update_transaction_status(tx_id: int, new_status: str) -> bool:
         logger.exception("Full error details:")
         return False
 
-def update_user_balance(user_id: int, new_balance: float) -> bool:
+def update_user_balance(user_id: int, new_balance: int) -> bool:
     """
     Обновляет баланс пользователя
     :param user_id: ID пользователя
-    :param new_balance: Новый баланс
+    :param new_balance: Новый баланс в копейках
     :return: True если обновление успешно, False в противном случае
     """
     try:
@@ -532,11 +686,109 @@ def update_user_balance(user_id: int, new_balance: float) -> bool:
                 "UPDATE users SET balance = ? WHERE user_id = ?",
                 (new_balance, user_id)
             )
-            conn.commit()
+            with _commit_lock:
+                conn.commit()
+                user_cache.update(user_id, balance=new_balance)
             affected = cursor.rowcount
             logger.debug(f"Updated balance for user {user_id} to {new_balance}, affected rows: {affected}")
             return affected > 0
     except Exception as e:
+        user_cache.invalidate(user_id)
         logger.error(f"Error updating user balance: {e}")
         logger.exception("Full error details:")
-        return False
\ No newline at end of file
+        return False
+
+def settle_transaction(tx_id: int, approve: bool) -> Optional[Dict]:
+    """
+    Подтверждает или отклоняет одну заявку на пополнение/вывод (см. settle_transactions)
+    :param tx_id: ID транзакции
+    :param approve: True для подтверждения, False для отклонения
+    :return: Результат обработки заявки или None, если заявка не найдена или уже обработана
+    :raises sqlite3.Error: Если изменения не удалось записать
+    """
+    results = settle_transactions([tx_id], approve)
+    return results[0] if results else None
+
+def settle_transactions(tx_ids: List[int], approve: bool) -> List[Dict]:
+    """
+    Подтверждает или отклоняет заявки на пополнение/вывод в одной транзакции.
+    Статусы и изменения балансов применяются через executemany; баланс меняется
+    относительно текущего значения (balance = balance ± amount), поэтому параллельные
+    подтверждения и сделки не теряют изменения.
+    :param tx_ids: ID транзакций
+    :param approve: True для подтверждения, False для отклонения
+    :return: Список обработанных заявок: данные заявки (id, user_id, type, amount, unique_id, status)
+             и пользователя (balance — баланс после обработки всего пакета, first_name, last_name).
+             Заявки, которые не найдены или уже обработаны, в список не попадают.
+             Вывод, на который не хватает средств, остается в статусе 'pending'.
+    :raises sqlite3.Error: Если изменения не удалось записать (транзакция откатывается)
+    """
+    if not tx_ids:
+        return []
+
+    new_status = 'completed' if approve else 'rejected'
+
+    with get_db() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+
+            placeholders = ', '.join('?' * len(tx_ids))
+            rows = conn.execute(f"""
+                SELECT t.id, t.user_id, t.type, t.amount, t.unique_id,
+                       u.balance, u.first_name, u.last_name
+                FROM transactions t
+                JOIN users u ON t.user_id = u.user_id
+                WHERE t.id IN ({placeholders}) AND t.status = 'pending'
+                ORDER BY t.created_at, t.id
+            """, list(tx_ids)).fetchall()
+
+            balances = {}
+            deltas = {}
+            results = []
+            for row in rows:
+                result = dict(row)
+                user_id = row['user_id']
+                balance = balances.setdefault(user_id, row['balance'])
+
+                if approve:
+                    delta = row['amount'] if row['type'] == 'deposit' else -row['amount']
+                    if delta < 0 and balance + delta < 0:
+                        # Вывод списывается, только если средств достаточно
+                        logger.warning(f"Cannot apply transaction {row['id']}: insufficient balance for user {user_id}")
+                        result['status'] = 'pending'
+                        results.append(result)
+                        continue
+                    balances[user_id] = balance + delta
+                    deltas[user_id] = deltas.get(user_id, 0) + delta
+
+                result['status'] = new_status
+                results.append(result)
+
+            conn.executemany(
+                "UPDATE transactions SET status = ? WHERE id = ? AND status = 'pending'",
+                [(new_status, result['id']) for result in results if result['status'] != 'pending']
+            )
+            if deltas:
+                conn.executemany(
+                    "UPDATE users SET balance = balance + ? WHERE user_id = ?",
+                    [(delta, user_id) for user_id, delta in deltas.items()]
+                )
+            with _commit_lock:
+                conn.commit()
+                for user_id in deltas:
+                    user_cache.update(user_id, balance=balances[user_id])
+
+            for result in results:
+                result['balance'] = balances[result['user_id']]
+
+            logger.info(f"Settled {len(results)} of {len(tx_ids)} transactions as {new_status}")
+            return results
+
+        except Exception as e:
+            conn.rollback()
+            # После ошибки неизвестно, какие балансы в кэше совпадают с базой
+            user_cache.clear()
+            logger.error(f"Error settling transactions {tx_ids}: {e}")
+            logger.exception("Full error details:")
+            # Ошибка базы не должна выглядеть как «заявки не найдены»
+            raise
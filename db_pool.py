@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+import time
+import logging
+from queue import LifoQueue, Empty, Full
+from typing import Dict, Optional
+from query_stats import InstrumentedConnection
+from config import (
+    DATABASE_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection(InstrumentedConnection):
+    """Соединение, выдаваемое пулом (запросы учитываются в query_stats)"""
+    pool_overflow = False
+
+
+class ConnectionPool:
+    """
+    Пул постоянно открытых соединений SQLite.
+    Соединения создаются лениво (не больше max_size), настраиваются один раз при открытии
+    и возвращаются в пул после использования вместо закрытия.
+    """
+
+    def __init__(self, database: str, max_size: int = 8, timeout: float = 5.0,
+                 busy_timeout_ms: int = 5000, cache_size_kb: int = 16384, mmap_size: int = 0):
+        """
+        :param database: Путь к файлу базы данных
+        :param max_size: Максимальное число соединений в пуле
+        :param timeout: Сколько секунд ждать освобождения соединения
+        :param busy_timeout_ms: Значение PRAGMA busy_timeout
+        :param cache_size_kb: Размер кэша страниц в килобайтах
+        :param mmap_size: Значение PRAGMA mmap_size в байтах
+        """
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+
+        self._idle = LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # Метрики
+        self._acquired = 0
+        self._waited = 0
+        self._overflow = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def connect(self) -> PooledConnection:
+        """Открывает новое соединение и применяет настройки производительности"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            factory=PooledConnection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """
+        Выдает соединение из пула.
+        Если свободных соединений нет и лимит исчерпан, ждет до timeout секунд,
+        после чего открывает временное соединение сверх лимита.
+        """
+        start = time.perf_counter()
+        conn = None
+        waited = False
+
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                if self._created < self.max_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except Empty:
+                    logger.warning(
+                        f"Connection pool exhausted ({self.max_size}) for {self.timeout}s, "
+                        f"opening overflow connection"
+                    )
+                    conn = self.connect()
+                    conn.pool_overflow = True
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._acquired += 1
+            if waited:
+                self._waited += 1
+            if conn.pool_overflow:
+                self._overflow += 1
+            self._wait_total += elapsed
+            if elapsed > self._wait_max:
+                self._wait_max = elapsed
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Возвращает соединение в пул, откатывая незавершенную транзакцию"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.error(f"Error resetting pooled connection, discarding it: {e}")
+            self._discard(conn)
+            return
+
+        if self._closed or conn.pool_overflow:
+            self._discard(conn)
+            return
+
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            self._discard(conn)
+
+    def _discard(self, conn: PooledConnection):
+        if not conn.pool_overflow:
+            with self._lock:
+                self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """Закрывает все свободные соединения пула"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        """Возвращает метрики пула"""
+        with self._lock:
+            acquired = self._acquired
+            return {
+                'size': self._created,
+                'idle': self._idle.qsize(),
+                'max_size': self.max_size,
+                'acquired': acquired,
+                'waited': self._waited,
+                'overflow': self._overflow,
+                'wait_total_ms': self._wait_total * 1000,
+                'wait_avg_ms': (self._wait_total / acquired * 1000) if acquired else 0.0,
+                'wait_max_ms': self._wait_max * 1000,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Возвращает общий пул соединений, создавая его при первом обращении"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_NAME,
+                    max_size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+                    cache_size_kb=DB_CACHE_SIZE_KB,
+                    mmap_size=DB_MMAP_SIZE
+                )
+    return _pool
+
+
+def close_pool():
+    """Закрывает общий пул соединений"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
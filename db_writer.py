@@ -0,0 +1,238 @@
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import Callable, List, Optional
+import sqlite3
+
+from config import WRITER_MAX_BATCH, WRITER_FLUSH_INTERVAL, WRITER_QUEUE_SIZE
+from db_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteOp:
+    __slots__ = ('func', 'future')
+
+    def __init__(self, func: Callable[[sqlite3.Connection], object], future: Future):
+        self.func = func
+        self.future = future
+
+
+class _FlushMarker:
+    __slots__ = ('future',)
+
+    def __init__(self, future: Future):
+        self.future = future
+
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Фоновый поток записи с групповой фиксацией (group commit).
+    Операции из всех потоков ставятся в ограниченную очередь и выполняются пачками
+    в одной транзакции: пачка закрывается через flush_interval секунд после первой
+    операции или при достижении max_batch операций.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = 500,
+                 flush_interval: float = 0.005, max_queue: int = 10000):
+        """
+        :param connect: Функция, открывающая выделенное соединение для записи
+        :param max_batch: Максимальное количество операций в одной транзакции
+        :param flush_interval: Сколько секунд собирать пачку после первой операции
+        :param max_queue: Максимальная длина очереди (при заполнении submit блокируется)
+        """
+        self._connect = connect
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+        # Метрики
+        self.batches = 0
+        self.operations = 0
+
+    def start(self):
+        with self._lock:
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, func: Callable[[sqlite3.Connection], object]) -> Future:
+        """
+        Ставит операцию записи в очередь
+        :param func: Функция, выполняющая запись через переданное соединение; ее результат
+                     становится результатом Future (например, ID вставленной строки)
+        :return: Future, завершающийся после фиксации транзакции
+        """
+        future = Future()
+        # Под блокировкой, чтобы операция не попала в очередь после _STOP
+        # или после того, как аварийно завершившийся поток очистил очередь
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Batch writer is stopped")
+            self._start_locked()
+            self._queue.put(_WriteOp(func, future))
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Дожидается фиксации всех операций, поставленных в очередь до вызова
+        :return: True, если все операции записаны за отведенное время
+        """
+        if self._thread is None:
+            return True
+        future = Future()
+        self._queue.put(_FlushMarker(future))
+        try:
+            future.result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def stop(self, timeout: Optional[float] = None):
+        """Записывает все оставшиеся операции и останавливает поток"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _run(self):
+        conn = None
+        try:
+            conn = self._connect()
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while item is not _STOP and len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except Empty:
+                        break
+                    batch.append(item)
+
+                try:
+                    self._write_batch(conn, batch)
+                except Exception as e:
+                    logger.error(f"Unexpected error in batch writer: {e}")
+                    logger.exception("Full error details:")
+                    for item in batch:
+                        if isinstance(item, (_WriteOp, _FlushMarker)) and not item.future.done():
+                            item.future.set_exception(e)
+
+                if batch[-1] is _STOP:
+                    return
+        except BaseException as e:
+            logger.error(f"Batch writer thread failed: {e}")
+            logger.exception("Full error details:")
+            self._fail_pending(e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _drain(self, error: BaseException):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                return
+            if isinstance(item, (_WriteOp, _FlushMarker)) and not item.future.done():
+                item.future.set_exception(RuntimeError(f"Batch writer failed: {error}"))
+
+    def _fail_pending(self, error: BaseException):
+        """
+        Завершает ошибкой операции, оставшиеся в очереди после аварийной остановки потока.
+        Следующий submit запустит новый поток
+        """
+        # Сначала очередь освобождается без блокировки: submit может ждать места в очереди, удерживая ее
+        self._drain(error)
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            self._drain(error)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List):
+        # Операции, отмененные ожидающей стороной (см. database.wait_for_write), пропускаются;
+        # после перевода Future в состояние running отменить операцию уже нельзя
+        ops = [item for item in batch
+               if isinstance(item, _WriteOp) and item.future.set_running_or_notify_cancel()]
+
+        if ops:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                results = [op.func(conn) for op in ops]
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Batch of {len(ops)} writes failed ({e}), retrying one by one")
+                self._write_one_by_one(conn, ops)
+            else:
+                for op, result in zip(ops, results):
+                    op.future.set_result(result)
+
+            self.batches += 1
+            self.operations += len(ops)
+
+        for item in batch:
+            if isinstance(item, _FlushMarker):
+                item.future.set_result(True)
+
+    def _write_one_by_one(self, conn: sqlite3.Connection, ops: List[_WriteOp]):
+        """Повторяет операции по одной, чтобы ошибка одной записи не отменяла остальные"""
+        for op in ops:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                result = op.func(conn)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                op.future.set_exception(e)
+            else:
+                op.future.set_result(result)
+
+
+_writer: Optional[BatchWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BatchWriter:
+    """Возвращает общий поток записи, создавая его при первом обращении"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BatchWriter(
+                    get_pool().connect,
+                    max_batch=WRITER_MAX_BATCH,
+                    flush_interval=WRITER_FLUSH_INTERVAL,
+                    max_queue=WRITER_QUEUE_SIZE
+                )
+                atexit.register(stop_writer)
+    return _writer
+
+
+def stop_writer(timeout: Optional[float] = 10):
+    """Записывает оставшиеся в очереди операции и останавливает поток записи"""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop(timeout)
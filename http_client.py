@@ -0,0 +1,207 @@
+import atexit
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    HTTP_RETRIES, HTTP_BACKOFF, HTTP_BACKOFF_MAX, HTTP_STATS_SAMPLES
+)
+from query_stats import _Timings
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class _EndpointStats(_Timings):
+    __slots__ = ('errors', 'retries')
+
+    def __init__(self):
+        super().__init__()
+        self.errors = 0
+        self.retries = 0
+
+    def to_dict(self) -> Dict:
+        result = super().to_dict()
+        result['errors'] = self.errors
+        result['retries'] = self.retries
+        return result
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для внешних API.
+
+    Соединения переиспользуются через пул requests.Session (keep-alive), поэтому
+    повторные запросы к одному хосту не повторяют TCP/TLS-рукопожатие. У каждого
+    запроса есть таймауты на соединение и чтение. Сетевые ошибки и ответы 429/5xx
+    повторяются не более retries раз с экспоненциальной паузой со случайным
+    разбросом (full jitter), чтобы повторы нескольких потоков не совпадали.
+    По каждому endpoint собирается количество запросов, ошибок, повторов и p50/p99 времени.
+    """
+
+    def __init__(self, pool_size: int, connect_timeout: float, read_timeout: float,
+                 retries: int, backoff: float, backoff_max: float, max_samples: int = 1024):
+        """
+        :param pool_size: Максимум соединений с одним хостом
+        :param connect_timeout: Таймаут установки соединения в секундах
+        :param read_timeout: Таймаут ожидания ответа в секундах
+        :param retries: Максимум повторов запроса
+        :param backoff: Базовая пауза перед повтором в секундах (удваивается с каждой попыткой)
+        :param backoff_max: Максимальная пауза перед повтором в секундах
+        :param max_samples: Размер выборки длительностей на один endpoint
+        """
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.max_samples = max_samples
+
+        self._session = requests.Session()
+        # Повторы выполняются в request(), чтобы учитывать их в статистике, поэтому у адаптера они отключены
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, _EndpointStats] = {}
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Пауза перед повтором: Retry-After из ответа или случайная величина в [0, backoff * 2^attempt]"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(max(float(retry_after), 0.0), self.backoff_max)
+                except ValueError:
+                    pass
+                try:
+                    # Retry-After может быть HTTP-датой
+                    retry_at = email.utils.parsedate_to_datetime(retry_after).timestamp()
+                    return min(max(retry_at - time.time(), 0.0), self.backoff_max)
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _record(self, endpoint: str, elapsed: float, error: bool, retries: int):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = _EndpointStats()
+            stats.add(elapsed, self.max_samples)
+            stats.retries += retries
+            if error:
+                stats.errors += 1
+
+    def request(self, method: str, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        Выполняет запрос с повторами
+        :param method: HTTP-метод
+        :param url: Адрес
+        :param endpoint: Имя для статистики (по умолчанию путь адреса); для адресов
+                         с идентификаторами стоит передавать шаблон, например '/coins/{id}'
+        :param kwargs: Аргументы requests (params, headers, timeout, ...)
+        :return: Ответ, проверенный raise_for_status
+        :raises requests.RequestException: Если запрос не удался после всех повторов
+        """
+        endpoint = endpoint or urlsplit(url).path or url
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self._session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    self._record(endpoint, time.perf_counter() - start, False, attempt)
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries:
+                    self._record(endpoint, time.perf_counter() - start, True, attempt)
+                    raise
+                logger.debug(f"HTTP {method} {endpoint} failed ({e}), retrying")
+            except requests.RequestException:
+                self._record(endpoint, time.perf_counter() - start, True, attempt)
+                raise
+
+            delay = self._retry_delay(attempt, response)
+            if response is not None:
+                logger.debug(f"HTTP {method} {endpoint} returned {response.status_code}, retrying in {delay:.2f}s")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, url: str, endpoint: Optional[str] = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def get_json(self, url: str, endpoint: Optional[str] = None, **kwargs) -> Any:
+        """Выполняет GET и возвращает разобранный JSON"""
+        return self.get(url, endpoint=endpoint, **kwargs).json()
+
+    def close(self):
+        self._session.close()
+
+    def reset_stats(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Возвращает статистику по endpoint
+        :return: {endpoint: {'count', 'errors', 'retries', 'avg_ms', 'p50_ms', 'p99_ms', ...}}
+        """
+        with self._lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in self._endpoints.items()}
+
+    def report(self) -> str:
+        """Возвращает текстовый отчет по endpoint, отсортированный по суммарному времени"""
+        data = sorted(self.snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        lines = [f"{'count':>8} {'errors':>7} {'retries':>7} {'p50_ms':>8} {'p99_ms':>8} {'max_ms':>8}  endpoint"]
+        for endpoint, s in data:
+            lines.append(
+                f"{s['count']:>8} {s['errors']:>7} {s['retries']:>7} {s['p50_ms']:>8.1f} "
+                f"{s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}  {endpoint}"
+            )
+        return '\n'.join(lines)
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Возвращает общий HTTP-клиент; соединения открываются при первом запросе"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(
+                    pool_size=HTTP_POOL_SIZE,
+                    connect_timeout=HTTP_CONNECT_TIMEOUT,
+                    read_timeout=HTTP_READ_TIMEOUT,
+                    retries=HTTP_RETRIES,
+                    backoff=HTTP_BACKOFF,
+                    backoff_max=HTTP_BACKOFF_MAX,
+                    max_samples=HTTP_STATS_SAMPLES
+                )
+                atexit.register(close_http_client)
+    return _client
+
+
+def close_http_client():
+    """Закрывает соединения общего клиента"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
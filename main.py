@@ -8,6 +8,7 @@ from commands import (
 )
 from config import TOKEN
 from logger import logger
+from price_feed import price_feed
 from user_handlers import process_crypto_purchase_callback
 
 def error_handler(update, context):
@@ -42,10 +43,17 @@ async def main():
     # Add error handler
     application.add_error_handler(error_handler)
 
+    # Prices are polled in the background; commands read the latest snapshot
+    price_feed.start()
+
     logger.info("Starting bot polling...")
 
     # Start polling
-    await application.run_polling(drop_pending_updates=True)
+    try:
+        await application.run_polling(drop_pending_updates=True)
+    finally:
+        price_feed.stop(timeout=5)
+        logger.info(f"Price feed stats: {price_feed.stats()}")
 
 if __name__ == '__main__':
     try:
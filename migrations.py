@@ -0,0 +1,414 @@
+import hashlib
+import logging
+import sqlite3
+from typing import Callable, Dict, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-выражение или функция, получающая соединение
+MigrationStep = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+class MigrationChecksumMismatch(RuntimeError):
+    """Примененная миграция была изменена после применения"""
+
+
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column(table: str, column: str, definition: str) -> Callable[[sqlite3.Connection], None]:
+    """Создает шаг миграции, добавляющий столбец, только если его еще нет"""
+    def step(conn: sqlite3.Connection):
+        if not _column_exists(conn, table, column):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.__name__ = f"add_column_{table}_{column}"
+    return step
+
+
+def _backfill_transaction_unique_ids(conn: sqlite3.Connection):
+    """Присваивает unique_id транзакциям, созданным до появления столбца"""
+    from database import generate_unique_id
+    rows = conn.execute("SELECT id FROM transactions WHERE unique_id IS NULL").fetchall()
+    conn.executemany(
+        "UPDATE transactions SET unique_id = ? WHERE id = ?",
+        [(generate_unique_id(), row[0]) for row in rows]
+    )
+    if rows:
+        logger.info(f"Assigned unique_id to {len(rows)} transactions")
+
+
+def _backfill_price_rollups(conn: sqlite3.Connection):
+    """Строит агрегаты OHLC по уже накопленной истории цен"""
+    from price_rollups import rebuild_rollups
+    rebuild_rollups(conn)
+
+
+def _rebuild_table(table: str, create_sql: str, conversions: Dict[str, str]) -> Callable[[sqlite3.Connection], None]:
+    """
+    Создает шаг миграции, пересоздающий таблицу по новому DDL (SQLite не умеет менять тип столбца).
+    Данные копируются по совпадающим столбцам, индексы таблицы создаются заново.
+    :param table: Имя таблицы
+    :param create_sql: DDL новой таблицы с плейсхолдером {name} вместо имени
+    :param conversions: SQL-выражения преобразования значений по имени столбца
+    """
+    def step(conn: sqlite3.Connection):
+        old_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        index_sql = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        )]
+
+        new_table = f"{table}_new"
+        conn.execute(create_sql.format(name=new_table))
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({new_table})") if row[1] in old_columns]
+        conn.execute(
+            f"INSERT INTO {new_table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(conversions.get(c, c) for c in columns)} FROM {table}"
+        )
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for sql in index_sql:
+            conn.execute(sql)
+    step.__name__ = f"rebuild_table_{table}"
+    return step
+
+
+# Перевод REAL-рублей в копейки и REAL-количеств монет в единицы 1e-8 (см. money.py)
+_TO_KOPECKS = "CAST(ROUND({0} * 100) AS INTEGER)"
+_TO_UNITS = "CAST(ROUND({0} * 100000000) AS INTEGER)"
+
+
+# Упорядоченный список миграций: (версия, описание, шаги).
+# Номер последней примененной версии хранится в PRAGMA user_version.
+# Уже выпущенные миграции не изменяются — новые добавляются в конец.
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS crypto_price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            crypto_id INTEGER,
+            rate REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            middle_name TEXT,
+            birth_date TEXT,
+            email TEXT,
+            phone TEXT,
+            balance REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS cryptocurrencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            symbol TEXT UNIQUE,
+            rate REAL,
+            total_supply REAL,
+            available_supply REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS portfolios (
+            user_id INTEGER,
+            crypto_id INTEGER,
+            amount REAL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            type TEXT,
+            amount REAL,
+            status TEXT,
+            unique_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+    ]),
+
+    # Бывшие update_db.py и update_transactions.py
+    (2, "transactions.unique_id", [
+        _add_column("transactions", "unique_id", "TEXT"),
+        _backfill_transaction_unique_ids,
+    ]),
+    (3, "cryptocurrencies.logo_path, cryptocurrencies.updated_at", [
+        _add_column("cryptocurrencies", "logo_path", "TEXT"),
+        _add_column("cryptocurrencies", "updated_at", "TIMESTAMP"),
+        "UPDATE cryptocurrencies SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL",
+    ]),
+
+    (4, "indexes for hot query paths", [
+        # Портфель: одна запись на пару (пользователь, криптовалюта).
+        # Перед созданием уникального индекса объединяем возможные дубликаты.
+        '''
+        UPDATE portfolios
+        SET amount = (
+            SELECT SUM(p2.amount) FROM portfolios p2
+            WHERE p2.user_id = portfolios.user_id AND p2.crypto_id = portfolios.crypto_id
+        )
+        WHERE rowid IN (
+            SELECT MIN(rowid) FROM portfolios
+            GROUP BY user_id, crypto_id
+            HAVING COUNT(*) > 1
+        )
+        ''',
+        '''
+        DELETE FROM portfolios
+        WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM portfolios GROUP BY user_id, crypto_id
+        )
+        ''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_portfolios_user_crypto ON portfolios (user_id, crypto_id)",
+        "CREATE INDEX IF NOT EXISTS idx_portfolios_crypto ON portfolios (crypto_id)",
+
+        # Заявки: частичный индекс по активным заявкам (список и счетчик в админ-меню)
+        "CREATE INDEX IF NOT EXISTS idx_transactions_pending ON transactions (created_at) WHERE status = 'pending'",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_status_created ON transactions (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at)",
+
+        # История цен: выборка по криптовалюте и диапазону времени
+        "CREATE INDEX IF NOT EXISTS idx_price_history_crypto_ts ON crypto_price_history (crypto_id, timestamp)",
+
+        # Пользователи: сортировка по дате регистрации и поиск по email
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)",
+    ]),
+
+    # Суммы в копейках, количества монет в единицах 1e-8, курсы в копейках за монету
+    (5, "integer money columns", [
+        _rebuild_table("users", '''
+        CREATE TABLE {name} (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            middle_name TEXT,
+            birth_date TEXT,
+            email TEXT,
+            phone TEXT,
+            balance INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''', {'balance': "COALESCE(" + _TO_KOPECKS.format("balance") + ", 0)"}),
+        _rebuild_table("cryptocurrencies", '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            symbol TEXT UNIQUE,
+            rate INTEGER,
+            total_supply INTEGER,
+            available_supply INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            logo_path TEXT
+        )
+        ''', {
+            'rate': _TO_KOPECKS.format("rate"),
+            'total_supply': _TO_UNITS.format("total_supply"),
+            'available_supply': _TO_UNITS.format("available_supply"),
+        }),
+        _rebuild_table("portfolios", '''
+        CREATE TABLE {name} (
+            user_id INTEGER,
+            crypto_id INTEGER,
+            amount INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
+        )
+        ''', {'amount': _TO_UNITS.format("amount")}),
+        _rebuild_table("transactions", '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            type TEXT,
+            amount INTEGER,
+            status TEXT,
+            unique_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''', {'amount': _TO_KOPECKS.format("amount")}),
+        _rebuild_table("crypto_price_history", '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            crypto_id INTEGER,
+            rate INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (crypto_id) REFERENCES cryptocurrencies (id)
+        )
+        ''', {'rate': _TO_KOPECKS.format("rate")}),
+    ]),
+
+    # Агрегаты OHLC по интервалам (resolution — длина интервала в секундах,
+    # bucket_start — начало интервала в unix-времени), см. price_rollups.py
+    (6, "crypto_price_ohlc rollups", [
+        '''
+        CREATE TABLE IF NOT EXISTS crypto_price_ohlc (
+            crypto_id INTEGER NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            open INTEGER NOT NULL,
+            high INTEGER NOT NULL,
+            low INTEGER NOT NULL,
+            close INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (crypto_id, resolution, bucket_start)
+        ) WITHOUT ROWID
+        ''',
+        _backfill_price_rollups,
+    ]),
+
+    # Время в целых секундах unix-времени: сравнение чисел вместо разбора строк datetime.
+    # Текстовые timestamp/created_at сохраняются для отображения.
+    (7, "epoch timestamps", [
+        _add_column("crypto_price_history", "ts", "INTEGER"),
+        "UPDATE crypto_price_history SET ts = CAST(strftime('%s', timestamp) AS INTEGER) WHERE ts IS NULL",
+        "DROP INDEX IF EXISTS idx_price_history_crypto_ts",
+        "CREATE INDEX IF NOT EXISTS idx_price_history_crypto_epoch ON crypto_price_history (crypto_id, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_price_history_epoch ON crypto_price_history (ts)",
+        # Вставки, не указавшие ts явно, получают его из timestamp
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_price_history_ts AFTER INSERT ON crypto_price_history
+        WHEN NEW.ts IS NULL
+        BEGIN
+            UPDATE crypto_price_history SET ts = CAST(strftime('%s', NEW.timestamp) AS INTEGER) WHERE id = NEW.id;
+        END
+        ''',
+
+        _add_column("transactions", "created_ts", "INTEGER"),
+        "UPDATE transactions SET created_ts = CAST(strftime('%s', created_at) AS INTEGER) WHERE created_ts IS NULL",
+        "DROP INDEX IF EXISTS idx_transactions_created",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_created_ts ON transactions (created_ts)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_created_ts AFTER INSERT ON transactions
+        WHEN NEW.created_ts IS NULL
+        BEGIN
+            UPDATE transactions SET created_ts = CAST(strftime('%s', NEW.created_at) AS INTEGER) WHERE id = NEW.id;
+        END
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migration_checksum(steps: List[MigrationStep]) -> str:
+    """Отпечаток миграции: хэш SQL-выражений и имен шагов-функций"""
+    digest = hashlib.sha256()
+    for step in steps:
+        text = step if isinstance(step, str) else step.__name__
+        digest.update(" ".join(text.split()).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Возвращает версию схемы из заголовка файла базы данных"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def verify_checksums(conn: sqlite3.Connection) -> List[int]:
+    """
+    Сверяет отпечатки примененных миграций из schema_migrations с текущим кодом миграций.
+    Миграции без сохраненного отпечатка (примененные до появления отпечатков) не проверяются.
+    :param conn: Соединение с базой данных
+    :return: Версии миграций, код которых изменился после применения
+    """
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+    ).fetchone():
+        return []
+    stored = dict(conn.execute(
+        "SELECT version, checksum FROM schema_migrations WHERE checksum IS NOT NULL"
+    ).fetchall())
+    mismatched = []
+    for version, name, steps in MIGRATIONS:
+        if version in stored and stored[version] != migration_checksum(steps):
+            logger.error(f"Migration {version} ({name}) was changed after it had been applied: "
+                         f"stored checksum {stored[version]}, current {migration_checksum(steps)}")
+            mismatched.append(version)
+    return mismatched
+
+
+def _check_applied(conn: sqlite3.Connection):
+    mismatched = verify_checksums(conn)
+    if mismatched:
+        raise MigrationChecksumMismatch(
+            f"Applied migrations {', '.join(map(str, mismatched))} do not match the code; "
+            f"add a new migration instead of editing an applied one"
+        )
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Применяет недостающие миграции.
+    Если схема актуальна, выполняются чтение PRAGMA user_version и сверка отпечатков
+    примененных миграций без какого-либо DDL.
+    Все недостающие миграции применяются в одной транзакции.
+    :param conn: Соединение с базой данных
+    :return: Количество примененных миграций
+    :raises MigrationChecksumMismatch: Если код уже примененной миграции изменился
+    """
+    if get_schema_version(conn) >= LATEST_VERSION:
+        _check_applied(conn)
+        return 0
+
+    # Для новой базы сразу включаем incremental auto_vacuum (для непустой базы команда ничего не меняет)
+    if not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+
+        # Перечитываем версию под блокировкой: другой процесс мог уже обновить схему
+        current_version = get_schema_version(conn)
+        pending = [m for m in MIGRATIONS if m[0] > current_version]
+        _check_applied(conn)
+
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            checksum TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        for version, name, steps in pending:
+            logger.info(f"Applying migration {version}: {name}")
+            for step in steps:
+                if isinstance(step, str):
+                    conn.execute(step)
+                else:
+                    step(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO schema_migrations (version, name, checksum) VALUES (?, ?, ?)",
+                (version, name, migration_checksum(steps))
+            )
+
+        if pending:
+            conn.execute(f"PRAGMA user_version = {int(pending[-1][0])}")
+        conn.commit()
+        logger.info(f"Database schema is at version {get_schema_version(conn)}")
+        return len(pending)
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error applying migrations: {e}")
+        logger.exception("Full error details:")
+        raise
@@ -5,6 +5,7 @@ from decimal import Decimal
 import re
 from email_validator import validate_email, EmailNotValidError
 import phonenumbers
+from money import from_kopecks, sell_proceeds
 
 @dataclass
 class User:
@@ -15,7 +16,7 @@ class User:
     birth_date: str
     email: str
     phone: str
-    balance: float = 0.0
+    balance: int = 0  # в копейках
     created_at: datetime = datetime.now()
 
     def __post_init__(self):
@@ -55,9 +56,9 @@ class Cryptocurrency:
     id: Optional[int]
     name: str
     symbol: str
-    rate: float
-    total_supply: float
-    available_supply: float
+    rate: int  # в копейках за монету
+    total_supply: int  # в единицах 1e-8
+    available_supply: int  # в единицах 1e-8
 
     def __post_init__(self):
         self.validate()
@@ -80,18 +81,18 @@ class Cryptocurrency:
             raise ValueError("Available supply cannot exceed total supply")
 
     @property
-    def market_cap(self) -> float:
-        """Расчет рыночной капитализации"""
-        return self.rate * self.total_supply
+    def market_cap(self) -> int:
+        """Расчет рыночной капитализации в копейках"""
+        return sell_proceeds(self.total_supply, self.rate)
 
     def __str__(self) -> str:
-        return f"{self.name} ({self.symbol}) - {self.rate}₽"
+        return f"{self.name} ({self.symbol}) - {from_kopecks(self.rate)}₽"
 
 @dataclass
 class Portfolio:
     user_id: int
     crypto_id: int
-    amount: float
+    amount: int  # в единицах 1e-8
 
     def __post_init__(self):
         self.validate()
@@ -102,27 +103,20 @@ class Portfolio:
             raise ValueError("Amount cannot be negative")
 
     @property
-    def value(self) -> float:
-        """Расчет стоимости позиции в портфеле"""
-        from database import get_db
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'SELECT rate FROM cryptocurrencies WHERE id = ?',
-                (self.crypto_id,)
-            )
-            result = cursor.fetchone()
-            if not result:
-                raise ValueError("Cryptocurrency not found")
-            rate = result['rate']
-            return self.amount * rate
+    def value(self) -> int:
+        """Расчет стоимости позиции в портфеле в копейках"""
+        from database import get_crypto_by_id
+        crypto = get_crypto_by_id(self.crypto_id)
+        if not crypto:
+            raise ValueError("Cryptocurrency not found")
+        return sell_proceeds(self.amount, crypto['rate'])
 
 @dataclass
 class Transaction:
     id: Optional[int]
     user_id: int
     type: str  # 'deposit' или 'withdraw'
-    amount: float
+    amount: int  # в копейках
     status: str  # 'pending', 'completed', 'rejected'
     created_at: datetime = datetime.now()
 
@@ -143,7 +137,7 @@ class Transaction:
             raise ValueError(f"Invalid status. Must be one of: {valid_statuses}")
 
     def __str__(self) -> str:
-        return f"{self.type.capitalize()}: {self.amount}₽ ({self.status})"
+        return f"{self.type.capitalize()}: {from_kopecks(self.amount)}₽ ({self.status})"
 
     @property
     def is_pending(self) -> bool:
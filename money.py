@@ -0,0 +1,96 @@
+"""
+Денежные суммы и количества монет в целых числах (фиксированная точка).
+
+Рубли хранятся в копейках, количества криптовалюты — в единицах 1e-8 монеты.
+Курс криптовалюты хранится в копейках за одну монету.
+Столбцы SQLite INTEGER 64-битные, поэтому количество одной криптовалюты
+ограничено ~92 млрд монет.
+Все вычисления выполняются в целых числах; Decimal используется только
+при разборе пользовательского ввода.
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Union
+
+KOPECKS_PER_RUBLE = 100
+UNITS_PER_COIN = 10 ** 8
+
+_KOPECK = Decimal(1) / KOPECKS_PER_RUBLE
+_UNIT = Decimal(1) / UNITS_PER_COIN
+
+Number = Union[int, float, str, Decimal]
+
+
+def _to_decimal(value: Number) -> Decimal:
+    if isinstance(value, str):
+        value = value.strip().replace(' ', '').replace(',', '.')
+    try:
+        # str() для float, чтобы 0.1 превращалось в Decimal('0.1'), а не в двоичное приближение
+        result = Decimal(str(value)) if isinstance(value, float) else Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"Invalid number: {value!r}")
+    if not result.is_finite():
+        raise ValueError(f"Invalid number: {value!r}")
+    return result
+
+
+def to_kopecks(rubles: Number) -> int:
+    """
+    Переводит сумму в рублях в копейки
+    :param rubles: Сумма в рублях (число или строка вида '100,50')
+    :return: Сумма в копейках
+    """
+    return int(_to_decimal(rubles).quantize(_KOPECK, rounding=ROUND_HALF_UP) * KOPECKS_PER_RUBLE)
+
+
+def to_units(coins: Number) -> int:
+    """
+    Переводит количество монет в единицы 1e-8
+    :param coins: Количество монет (число или строка)
+    :return: Количество в единицах
+    """
+    return int(_to_decimal(coins).quantize(_UNIT, rounding=ROUND_HALF_UP) * UNITS_PER_COIN)
+
+
+def from_kopecks(kopecks: int) -> Decimal:
+    """Переводит копейки в рубли без потери точности"""
+    return Decimal(kopecks) / KOPECKS_PER_RUBLE
+
+
+def from_units(units: int) -> Decimal:
+    """Переводит единицы в количество монет без потери точности"""
+    return Decimal(units) / UNITS_PER_COIN
+
+
+def buy_cost(units: int, rate: int) -> int:
+    """
+    Стоимость покупки в копейках (округляется вверх)
+    :param units: Количество в единицах
+    :param rate: Курс в копейках за монету
+    """
+    return -(-units * rate // UNITS_PER_COIN)
+
+
+def sell_proceeds(units: int, rate: int) -> int:
+    """
+    Выручка от продажи в копейках (округляется вниз)
+    :param units: Количество в единицах
+    :param rate: Курс в копейках за монету
+    """
+    return units * rate // UNITS_PER_COIN
+
+
+def max_affordable_units(balance: int, rate: int) -> int:
+    """
+    Максимальное количество единиц, которое можно купить на баланс
+    :param balance: Баланс в копейках
+    :param rate: Курс в копейках за монету
+    """
+    if rate <= 0 or balance <= 0:
+        return 0
+    return balance * UNITS_PER_COIN // rate
+
+
+def share(value: int, percent: int) -> int:
+    """Доля от целого значения в процентах (округляется вниз)"""
+    return value * percent // 100
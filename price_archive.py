@@ -0,0 +1,276 @@
+"""
+Архив истории цен в столбцовом формате для графиков и аналитики.
+
+Для каждой криптовалюты хранятся файлы, которые только дополняются в конец:
+    {crypto_id}.ts    — время цены, unix-время в секундах (int64)
+    {crypto_id}.rate  — курс в рублях (float64)
+    {crypto_id}.id    — id строки crypto_price_history (int64, -1 — неизвестен)
+Файлы читаются через numpy.memmap, поэтому выборка за период — это срез
+отображенного в память массива без копирования и без обращения к SQLite.
+Сырые цены выгружаются в архив перед их удалением из базы (см. price_retention.py).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    PRICE_ARCHIVE_DIR, PRICE_ARCHIVE_EXPORT_LAG, PRICE_ARCHIVE_EXPORT_CHUNK, PRICE_CHART_MAX_POINTS
+)
+from database import get_db
+from money import KOPECKS_PER_RUBLE
+
+logger = logging.getLogger(__name__)
+
+TS_DTYPE = np.dtype('<i8')
+RATE_DTYPE = np.dtype('<f8')
+ID_DTYPE = np.dtype('<i8')
+
+# id строки, выгруженной до появления файла .id
+_UNKNOWN_ID = -1
+
+_EMPTY_TS = np.empty(0, dtype=TS_DTYPE)
+_EMPTY_RATES = np.empty(0, dtype=RATE_DTYPE)
+
+# Выгрузка в архив выполняется в одном потоке; отображения файлов кэшируются
+# и пересоздаются, когда архив дополняется
+_write_lock = threading.Lock()
+_maps_lock = threading.Lock()
+_maps: Dict[Tuple[str, int], Tuple[int, np.ndarray, np.ndarray]] = {}
+
+
+def _paths(crypto_id: int, directory: str) -> Tuple[str, str]:
+    base = os.path.join(directory, str(int(crypto_id)))
+    return base + '.ts', base + '.rate'
+
+
+def _id_path(crypto_id: int, directory: str) -> str:
+    return os.path.join(directory, str(int(crypto_id))) + '.id'
+
+
+def _file_length(path: str, dtype: np.dtype) -> int:
+    try:
+        return os.path.getsize(path) // dtype.itemsize
+    except OSError:
+        return 0
+
+
+def archive_length(crypto_id: int, directory: str = PRICE_ARCHIVE_DIR) -> int:
+    """
+    Количество цен в архиве криптовалюты. Если запись в один из файлов была прервана,
+    учитываются только цены, полностью записанные в оба файла
+    """
+    ts_path, rate_path = _paths(crypto_id, directory)
+    return min(_file_length(ts_path, TS_DTYPE), _file_length(rate_path, RATE_DTYPE))
+
+
+def _load(crypto_id: int, directory: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Возвращает отображенные в память массивы времени и курсов криптовалюты"""
+    length = archive_length(crypto_id, directory)
+    if length == 0:
+        return _EMPTY_TS, _EMPTY_RATES
+
+    key = (directory, int(crypto_id))
+    with _maps_lock:
+        cached = _maps.get(key)
+        if cached is not None and cached[0] == length:
+            return cached[1], cached[2]
+        ts_path, rate_path = _paths(crypto_id, directory)
+        ts = np.memmap(ts_path, dtype=TS_DTYPE, mode='r', shape=(length,))
+        rates = np.memmap(rate_path, dtype=RATE_DTYPE, mode='r', shape=(length,))
+        _maps[key] = (length, ts, rates)
+        return ts, rates
+
+
+def archived_crypto_ids(directory: str = PRICE_ARCHIVE_DIR) -> List[int]:
+    """Список криптовалют, для которых есть архив"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(int(name[:-3]) for name in names if name.endswith('.ts') and name[:-3].isdigit())
+
+
+def last_archived_ts(crypto_id: int, directory: str = PRICE_ARCHIVE_DIR) -> Optional[int]:
+    """Время последней цены в архиве или None, если архив пуст"""
+    ts, _ = _load(crypto_id, directory)
+    return int(ts[-1]) if len(ts) else None
+
+
+def last_archived_id(crypto_id: int, directory: str = PRICE_ARCHIVE_DIR) -> Optional[int]:
+    """
+    id строки crypto_price_history, выгруженной в архив последней,
+    или None, если архив пуст или id этой строки не сохранен
+    """
+    length = archive_length(crypto_id, directory)
+    path = _id_path(crypto_id, directory)
+    if length == 0 or _file_length(path, ID_DTYPE) < length:
+        return None
+    with open(path, 'rb') as f:
+        f.seek((length - 1) * ID_DTYPE.itemsize)
+        row_id = int(np.frombuffer(f.read(ID_DTYPE.itemsize), dtype=ID_DTYPE)[0])
+    return None if row_id == _UNKNOWN_ID else row_id
+
+
+def _export_position(crypto_id: int, directory: str) -> Tuple[int, int]:
+    """
+    Позиция (ts, id) последней выгруженной строки: в архив попадают строки
+    с ts > последнего ts либо с тем же ts и большим id. Для архива без id
+    строки с последним ts считаются выгруженными целиком
+    """
+    last = last_archived_ts(crypto_id, directory)
+    if last is None:
+        return -1, _UNKNOWN_ID
+    last_id = last_archived_id(crypto_id, directory)
+    return last, np.iinfo(ID_DTYPE).max if last_id is None else last_id
+
+
+def append_prices(crypto_id: int, ts: np.ndarray, rates: np.ndarray,
+                  directory: str = PRICE_ARCHIVE_DIR, ids: Optional[np.ndarray] = None) -> int:
+    """
+    Дописывает цены в конец архива
+    :param ts: Время цен (unix-время), по возрастанию и не раньше последней цены архива
+    :param rates: Курсы в рублях
+    :param ids: id строк crypto_price_history (None — неизвестны)
+    :return: Количество дописанных цен
+    """
+    ts = np.ascontiguousarray(ts, dtype=TS_DTYPE)
+    rates = np.ascontiguousarray(rates, dtype=RATE_DTYPE)
+    if ids is None:
+        ids = np.full(len(ts), _UNKNOWN_ID, dtype=ID_DTYPE)
+    ids = np.ascontiguousarray(ids, dtype=ID_DTYPE)
+    if not len(ts) == len(rates) == len(ids):
+        raise ValueError("ts, rates and ids must have the same length")
+    if not len(ts):
+        return 0
+    if np.any(ts[1:] < ts[:-1]):
+        raise ValueError("ts must be sorted")
+
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        ts_path, rate_path = _paths(crypto_id, directory)
+        length = archive_length(crypto_id, directory)
+        last = last_archived_ts(crypto_id, directory)
+        if last is not None and ts[0] < last:
+            raise ValueError(f"ts must not precede the last archived price ({last})")
+
+        id_path = _id_path(crypto_id, directory)
+        # Архив, выгруженный до появления файла .id, дополняется неизвестными id
+        known_ids = min(_file_length(id_path, ID_DTYPE), length)
+        ids = np.concatenate((np.full(length - known_ids, _UNKNOWN_ID, dtype=ID_DTYPE), ids))
+
+        # Время записывается последним: цена видна в архиве, только когда записаны все ее поля
+        for path, dtype, values, keep in ((rate_path, RATE_DTYPE, rates, length),
+                                          (id_path, ID_DTYPE, ids, known_ids),
+                                          (ts_path, TS_DTYPE, ts, length)):
+            with open(path, 'ab') as f:
+                # Отбрасываем хвост, оставшийся от прерванной записи
+                f.truncate(keep * dtype.itemsize)
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+    return len(ts)
+
+
+def export_price_history(conn: Optional[sqlite3.Connection] = None, until: Optional[int] = None,
+                         directory: str = PRICE_ARCHIVE_DIR) -> Optional[int]:
+    """
+    Выгружает в архив сырые цены из crypto_price_history, которых в нем еще нет
+    :param conn: Соединение с базой (по умолчанию берется из пула)
+    :param until: Выгружать цены строго раньше этого момента (unix-время);
+                  по умолчанию — текущее время минус PRICE_ARCHIVE_EXPORT_LAG,
+                  чтобы цены, еще находящиеся в очереди записи, не были пропущены
+    :return: Количество выгруженных цен или None при ошибке
+    """
+    if conn is None:
+        with get_db() as conn:
+            return export_price_history(conn, until, directory)
+
+    until = int(time.time()) - PRICE_ARCHIVE_EXPORT_LAG if until is None else until
+    exported = 0
+    try:
+        crypto_ids = [row[0] for row in conn.execute("SELECT DISTINCT crypto_id FROM crypto_price_history")]
+        for crypto_id in crypto_ids:
+            # Строка, записанная позже в ту же секунду, что и последняя выгруженная, отличается от нее id
+            last, last_id = _export_position(crypto_id, directory)
+            cursor = conn.execute('''
+                SELECT ts, rate, id FROM crypto_price_history
+                WHERE crypto_id = ? AND ts >= ? AND (ts > ? OR id > ?) AND ts < ? AND rate IS NOT NULL
+                ORDER BY ts, id
+            ''', (crypto_id, last, last, last_id, until))
+            while True:
+                rows = cursor.fetchmany(PRICE_ARCHIVE_EXPORT_CHUNK)
+                if not rows:
+                    break
+                chunk = np.array(rows, dtype=TS_DTYPE)
+                exported += append_prices(crypto_id, chunk[:, 0], chunk[:, 1] / KOPECKS_PER_RUBLE,
+                                          directory, ids=chunk[:, 2])
+    except Exception as e:
+        logger.error(f"Error exporting price history to archive: {e}")
+        logger.exception("Full error details:")
+        return None
+
+    if exported:
+        logger.info(f"Exported {exported} price rows to archive up to {until}")
+    return exported
+
+
+def get_price_range(crypto_id: int, start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+                    directory: str = PRICE_ARCHIVE_DIR) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Цены из архива за период [start_ts, end_ts]. Возвращаются срезы отображенных
+    в память массивов (без копирования); изменять их нельзя
+    :return: Массив времени (unix-время) и массив курсов в рублях
+    """
+    ts, rates = _load(crypto_id, directory)
+    left = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, side='left'))
+    right = len(ts) if end_ts is None else int(np.searchsorted(ts, end_ts, side='right'))
+    return ts[left:right], rates[left:right]
+
+
+def downsample(ts: np.ndarray, rates: np.ndarray,
+               max_points: int = PRICE_CHART_MAX_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Прореживает ряд до max_points точек, оставляя последнюю цену каждого интервала
+    и всегда сохраняя последнюю точку ряда
+    """
+    count = len(ts)
+    if count <= max_points:
+        return ts, rates
+    step = -(-count // max_points)
+    index = np.arange(count - 1, -1, -step)[::-1]
+    return ts[index], rates[index]
+
+
+def get_chart_series(crypto_id: int, days: int = 30, max_points: int = PRICE_CHART_MAX_POINTS,
+                     directory: str = PRICE_ARCHIVE_DIR) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Ряд цен для графика за последние days дней: архив дополняется сырыми ценами,
+    которые еще не выгружены
+    :return: Массив дат numpy.datetime64[s] и массив курсов в рублях или None,
+             если архива для криптовалюты нет
+    """
+    start = int(time.time()) - days * 86400
+    ts, rates = get_price_range(crypto_id, start, directory=directory)
+    if last_archived_ts(crypto_id, directory) is None:
+        return None
+    last, last_id = _export_position(crypto_id, directory)
+
+    with get_db() as conn:
+        rows = conn.execute('''
+            SELECT ts, rate FROM crypto_price_history
+            WHERE crypto_id = ? AND ts >= ? AND (ts > ? OR id > ?) AND ts >= ? AND rate IS NOT NULL
+            ORDER BY ts, id
+        ''', (crypto_id, last, last, last_id, start)).fetchall()
+    if rows:
+        tail = np.array(rows, dtype=TS_DTYPE)
+        ts = np.concatenate((ts, tail[:, 0]))
+        rates = np.concatenate((rates, tail[:, 1] / KOPECKS_PER_RUBLE))
+
+    ts, rates = downsample(ts, rates, max_points)
+    return ts.astype('datetime64[s]'), rates
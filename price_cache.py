@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """Запрос к API, который выполняется сейчас; остальные потоки ждут его результата"""
+    __slots__ = ('event', 'value')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Optional[float] = None
+
+
+class PriceCache:
+    """
+    Кэш курсов из внешнего API (TTL) с объединением одновременных запросов.
+
+    Курс моложе ttl возвращается из кэша. Если курса нет, его загружает один поток,
+    а остальные потоки, запросившие тот же курс, ждут этот запрос (single-flight),
+    поэтому пик одинаковых запросов дает одно обращение к API.
+    Курс старше ttl, но моложе ttl + stale_ttl, возвращается сразу, а обновление
+    запускается в фоне (stale-while-revalidate). Если API недоступно, в кэше остается
+    последний полученный курс. Ключи — тикеры поддерживаемых криптовалют, поэтому
+    размер кэша не ограничивается.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Dict[str, float]], ttl: float, stale_ttl: float = 0.0):
+        """
+        :param fetch: Функция, загружающая курсы по списку ключей одним запросом
+        :param ttl: Время, в течение которого курс считается свежим, в секундах
+        :param stale_ttl: Сколько секунд после ttl отдавать старый курс, обновляя его в фоне (0 — не отдавать)
+        """
+        self._fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        # ключ -> (курс, время получения)
+        self._entries: Dict[str, Tuple[float, float]] = {}
+        self._flights: Dict[str, _Flight] = {}
+
+        # Метрики
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[float]:
+        """Возвращает курс (None — API не вернуло курс)"""
+        return self.get_many((key,)).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        """
+        Возвращает курсы для набора ключей; отсутствующие в кэше загружаются одним запросом
+        :return: {ключ: курс} только для ключей, курс которых известен
+        """
+        result = {}
+        fetch, refresh, waiting = [], [], []
+        now = time.monotonic()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                age = None if entry is None else now - entry[1]
+                if age is not None and age < self.ttl:
+                    self.hits += 1
+                    result[key] = entry[0]
+                    continue
+                flight = self._flights.get(key)
+                if age is not None and age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    result[key] = entry[0]
+                    if flight is None:
+                        self._flights[key] = _Flight()
+                        refresh.append(key)
+                elif flight is not None:
+                    self.coalesced += 1
+                    waiting.append((key, flight))
+                else:
+                    self.misses += 1
+                    self._flights[key] = _Flight()
+                    fetch.append(key)
+
+        if refresh:
+            threading.Thread(target=self._load, args=(refresh,), name='price-refresh', daemon=True).start()
+        if fetch:
+            result.update(self._load(fetch))
+        for key, flight in waiting:
+            flight.event.wait()
+            if flight.value is not None:
+                result[key] = flight.value
+        return result
+
+    def _load(self, keys: List[str]) -> Dict[str, float]:
+        """Загружает курсы, сохраняет их в кэш и будит ожидающие потоки"""
+        values = {}
+        try:
+            self.fetches += 1
+            values = {key: value for key, value in (self._fetch(keys) or {}).items() if value is not None}
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error fetching prices for {', '.join(keys)}: {e}")
+        finally:
+            fetched_at = time.monotonic()
+            with self._lock:
+                for key in keys:
+                    value = values.get(key)
+                    if value is not None:
+                        self._entries[key] = (value, fetched_at)
+                    flight = self._flights.pop(key, None)
+                    if flight is not None:
+                        flight.value = value
+                        flight.event.set()
+        return {key: values[key] for key in keys if key in values}
+
+    def invalidate(self, key: Optional[str] = None):
+        """Удаляет курс из кэша (без ключа — все курсы)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses,
+                'coalesced': self.coalesced, 'fetches': self.fetches, 'errors': self.errors}
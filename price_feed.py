@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, NamedTuple, Optional
+
+from config import SUPPORTED_CRYPTOS, PRICE_FEED_INTERVAL, PRICE_FEED_MAX_AGE
+from crypto_api import fetch_multiple_crypto_prices
+
+logger = logging.getLogger(__name__)
+
+
+class PricePoint(NamedTuple):
+    """Курс криптовалюты и время его получения (Unix time)"""
+    price: float
+    updated_at: float
+
+
+class PriceSnapshot:
+    """Неизменяемый снимок курсов {тикер: PricePoint}"""
+    __slots__ = ('prices', 'taken_at')
+
+    def __init__(self, prices: Mapping[str, PricePoint], taken_at: float):
+        self.prices = MappingProxyType(dict(prices))
+        self.taken_at = taken_at
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        """
+        Возвращает курс по тикеру
+        :param max_age: Максимальный возраст курса в секундах (None — любой)
+        :return: Курс или None, если его нет или он старше max_age
+        """
+        point = self.prices.get(symbol)
+        if point is None or (max_age is not None and time.time() - point.updated_at > max_age):
+            return None
+        return point.price
+
+
+class PriceFeed:
+    """
+    Фоновый опрос курсов всех поддерживаемых криптовалют.
+
+    Поток раз в interval секунд запрашивает курсы одним запросом и публикует новый
+    неизменяемый снимок заменой ссылки. Читатели берут текущий снимок без блокировок
+    и обращений к сети. Курс, который не пришел в ответе, остается в снимке
+    со старым временем получения, поэтому его возраст виден читателям.
+    """
+
+    def __init__(self, fetch: Callable[[], Dict[str, float]], symbols: Mapping[str, str],
+                 interval: float, max_age: float):
+        """
+        :param fetch: Функция, возвращающая курсы {ID CoinGecko: курс}; ошибки запроса
+                      должны выбрасываться, чтобы попасть в last_error
+        :param symbols: Соответствие ID CoinGecko тикерам
+        :param interval: Период опроса в секундах
+        :param max_age: Курс старше этого срока (секунды) не используется читателями
+        """
+        self._fetch = fetch
+        self.symbols = dict(symbols)
+        self.interval = interval
+        self.max_age = max_age
+        self._snapshot = PriceSnapshot({}, 0.0)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.polls = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_poll_seconds: Optional[float] = None
+        self.total_poll_seconds = 0.0
+
+    @property
+    def snapshot(self) -> PriceSnapshot:
+        return self._snapshot
+
+    def get(self, symbol: str) -> Optional[float]:
+        """Курс по тикеру из текущего снимка (None — нет курса не старше max_age)"""
+        return self._snapshot.get(symbol, self.max_age)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='price-feed', daemon=True)
+            self._thread.start()
+        logger.info(f"Price feed started: {len(self.symbols)} symbols every {self.interval}s")
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._lock:
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def poll(self) -> bool:
+        """
+        Запрашивает курсы и публикует новый снимок
+        :return: True, если получен хотя бы один курс
+        """
+        start = time.perf_counter()
+        try:
+            prices = self._fetch() or {}
+        except Exception as e:
+            prices = {}
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = None
+        elapsed = time.perf_counter() - start
+        now = time.time()
+
+        points = dict(self._snapshot.prices)
+        received = 0
+        for coin_id, price in prices.items():
+            symbol = self.symbols.get(coin_id)
+            if symbol is not None and price and price > 0:
+                points[symbol] = PricePoint(float(price), now)
+                received += 1
+        if received:
+            self._snapshot = PriceSnapshot(points, now)
+
+        self.polls += 1
+        self.last_poll_seconds = elapsed
+        self.total_poll_seconds += elapsed
+        if not received:
+            self.errors += 1
+            self.last_error = error or 'no prices in response'
+            self.last_error_at = now
+            logger.warning(f"Price feed poll failed: {self.last_error}")
+            return False
+        self.last_success_at = now
+        if received < len(self.symbols):
+            logger.warning(f"Price feed received {received} of {len(self.symbols)} prices")
+        return True
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error in price feed: {e}")
+                logger.exception("Full error details:")
+            # Опрос с постоянным периодом, независимо от длительности запроса
+            next_poll = max(next_poll + self.interval, time.monotonic())
+            self._stop.wait(next_poll - time.monotonic())
+
+    def stats(self) -> Dict:
+        """Метрики опроса и возраст курсов в секундах"""
+        snapshot = self._snapshot
+        now = time.time()
+        return {
+            'polls': self.polls,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_error_at': self.last_error_at,
+            'last_success_at': self.last_success_at,
+            'last_poll_ms': None if self.last_poll_seconds is None else self.last_poll_seconds * 1000,
+            'avg_poll_ms': self.total_poll_seconds / self.polls * 1000 if self.polls else None,
+            'age': {symbol: now - point.updated_at for symbol, point in snapshot.prices.items()},
+        }
+
+
+price_feed = PriceFeed(fetch_multiple_crypto_prices, SUPPORTED_CRYPTOS, PRICE_FEED_INTERVAL, PRICE_FEED_MAX_AGE)
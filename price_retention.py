@@ -0,0 +1,171 @@
+import logging
+import sqlite3
+import time
+from typing import Dict, Optional
+
+from config import (
+    PRICE_RAW_RETENTION_DAYS, PRICE_RETENTION_BATCH, PRICE_RETENTION_PAUSE,
+    PRICE_VACUUM_PAGES, PRICE_ROLLUP_RESOLUTIONS
+)
+from database import get_db
+from price_rollups import apply_tick, bucket_start
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum: 0 — NONE, 1 — FULL, 2 — INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+# Предупреждение о выключенном incremental auto_vacuum выводится один раз
+_vacuum_warned = False
+
+
+def retention_cutoff(now: Optional[int] = None, days: int = PRICE_RAW_RETENTION_DAYS) -> int:
+    """
+    Граница хранения сырых цен (unix-время). Выравнивается по самому крупному интервалу агрегатов,
+    чтобы удалялись только полностью завершенные интервалы и повторный пересчет агрегатов
+    по оставшимся ценам не затирал уже накопленные данные.
+    """
+    now = int(time.time()) if now is None else now
+    return bucket_start(now - days * 86400, max(PRICE_ROLLUP_RESOLUTIONS))
+
+
+def _cover_with_rollups(conn: sqlite3.Connection, ids) -> int:
+    """
+    Проверяет, что удаляемые цены учтены в агрегатах, и добавляет в агрегаты неучтенные
+    (например, вставленные в обход add_price_history)
+    :return: Количество цен, добавленных в агрегаты
+    """
+    placeholders = ', '.join('?' * len(ids))
+    missing = ' OR '.join(
+        f"NOT EXISTS (SELECT 1 FROM crypto_price_ohlc o WHERE o.crypto_id = h.crypto_id "
+        f"AND o.resolution = {int(res)} AND o.bucket_start = h.ts / {int(res)} * {int(res)})"
+        for res in PRICE_ROLLUP_RESOLUTIONS
+    )
+    rows = conn.execute(f'''
+        SELECT crypto_id, rate, ts
+        FROM crypto_price_history h
+        WHERE id IN ({placeholders}) AND ({missing})
+        ORDER BY ts, id
+    ''', list(ids)).fetchall()
+    for crypto_id, rate, ts in rows:
+        apply_tick(conn, crypto_id, rate, ts)
+    return len(rows)
+
+
+def prune_price_history(cutoff: Optional[int] = None, batch_size: int = PRICE_RETENTION_BATCH,
+                        pause: float = PRICE_RETENTION_PAUSE) -> int:
+    """
+    Удаляет сырые цены старше границы хранения небольшими порциями,
+    каждая — в отдельной короткой транзакции, чтобы не блокировать запись надолго
+    :param cutoff: Граница (unix-время), по умолчанию retention_cutoff()
+    :param batch_size: Количество строк в одной порции
+    :param pause: Пауза между порциями в секундах
+    :return: Количество удаленных строк
+    """
+    cutoff = retention_cutoff() if cutoff is None else cutoff
+    deleted = 0
+
+    while True:
+        with get_db() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                ids = [row[0] for row in conn.execute(
+                    "SELECT id FROM crypto_price_history WHERE ts < ? ORDER BY ts LIMIT ?",
+                    (cutoff, batch_size)
+                )]
+                if ids:
+                    covered = _cover_with_rollups(conn, ids)
+                    if covered:
+                        logger.warning(f"Added {covered} uncovered price rows to rollups before pruning")
+                    conn.execute(
+                        f"DELETE FROM crypto_price_history WHERE id IN ({', '.join('?' * len(ids))})",
+                        ids
+                    )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error pruning price history: {e}")
+                logger.exception("Full error details:")
+                break
+
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    if deleted:
+        logger.info(f"Pruned {deleted} raw price rows older than {cutoff}")
+    return deleted
+
+
+def is_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """Включен ли в базе режим auto_vacuum = INCREMENTAL"""
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == _AUTO_VACUUM_INCREMENTAL
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """
+    Переводит базу в режим auto_vacuum = INCREMENTAL.
+    Для существующей базы требуется однократный полный VACUUM, который переписывает
+    весь файл, поэтому функция вызывается только при остановленном боте (см. update_db.py).
+    :return: True, если режим пришлось менять
+    """
+    if is_incremental_vacuum(conn):
+        return False
+    logger.info("Converting database to auto_vacuum=INCREMENTAL (one-time VACUUM)")
+    start = time.perf_counter()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    logger.info(f"Database converted in {time.perf_counter() - start:.1f}s")
+    return True
+
+
+def incremental_vacuum(pages: int = PRICE_VACUUM_PAGES) -> Dict:
+    """
+    Возвращает операционной системе до pages свободных страниц базы
+    :return: Количество свободных страниц до и после
+    """
+    global _vacuum_warned
+    with get_db() as conn:
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not is_incremental_vacuum(conn):
+            # Полный VACUUM во время работы бота заблокировал бы запись, поэтому режим меняется только офлайн
+            if not _vacuum_warned:
+                logger.warning("auto_vacuum is not INCREMENTAL, free pages are not released; "
+                               "stop the bot and run update_db.py to convert the database")
+                _vacuum_warned = True
+            return {'free_pages_before': free_before, 'free_pages_after': free_before}
+        # PRAGMA incremental_vacuum освобождает по странице на шаг, поэтому результат нужно дочитать
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return {'free_pages_before': free_before, 'free_pages_after': free_after}
+
+
+def run_retention() -> Dict:
+    """
+    Выгружает новые сырые цены в архив, удаляет устаревшие и освобождает место в файле базы.
+    Если выгрузить цены в архив не удалось, удаление пропускается, чтобы не потерять их
+    """
+    from price_archive import export_price_history
+
+    start = time.perf_counter()
+    archived = export_price_history()
+    if archived is None:
+        logger.warning("Price archive export failed, skipping pruning")
+        deleted = 0
+    else:
+        deleted = prune_price_history()
+    vacuum = incremental_vacuum()
+    result = dict(archived=archived, deleted=deleted, elapsed=time.perf_counter() - start, **vacuum)
+    logger.info(f"Price retention finished: {result}")
+    return result
+
+
+def retention_job(context):
+    """Задача JobQueue: периодическая очистка истории цен"""
+    try:
+        run_retention()
+    except Exception as e:
+        logger.error(f"Error in price retention job: {e}")
+        logger.exception("Full error details:")
@@ -0,0 +1,97 @@
+import logging
+import sqlite3
+from typing import Dict, Iterable, Tuple
+
+from config import PRICE_ROLLUP_RESOLUTIONS, PRICE_HISTORY_MIN_POINTS
+
+logger = logging.getLogger(__name__)
+
+# Агрегаты OHLC хранятся в crypto_price_ohlc (см. миграцию 6): по одной записи
+# на криптовалюту, длину интервала (resolution, секунды) и начало интервала (bucket_start)
+_UPSERT_TICK = '''
+INSERT INTO crypto_price_ohlc (crypto_id, resolution, bucket_start, open, high, low, close, count)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT (crypto_id, resolution, bucket_start) DO UPDATE SET
+    high = MAX(high, excluded.high),
+    low = MIN(low, excluded.low),
+    close = excluded.close,
+    count = count + 1
+'''
+
+
+def bucket_start(ts: int, resolution: int) -> int:
+    """Начало интервала длиной resolution секунд, в который попадает момент ts"""
+    return ts - ts % resolution
+
+
+def apply_tick(conn: sqlite3.Connection, crypto_id: int, rate: int, ts: int,
+               resolutions: Iterable[int] = PRICE_ROLLUP_RESOLUTIONS):
+    """
+    Учитывает новую цену во всех агрегатах. Вызывается в той же транзакции, что и вставка цены;
+    цены должны поступать в хронологическом порядке (close — последняя цена интервала)
+    :param rate: Курс в копейках за монету
+    :param ts: Время цены (unix-время в секундах)
+    """
+    conn.executemany(_UPSERT_TICK, [
+        (crypto_id, resolution, bucket_start(ts, resolution), rate, rate, rate, rate)
+        for resolution in resolutions
+    ])
+
+
+def rebuild_rollups(conn: sqlite3.Connection, resolutions: Iterable[int] = PRICE_ROLLUP_RESOLUTIONS) -> int:
+    """
+    Пересчитывает агрегаты по всем сохраненным ценам
+    :return: Количество записанных интервалов
+    """
+    resolutions = list(resolutions)
+    buckets: Dict[Tuple[int, int, int], list] = {}
+    first_ts: Dict[int, int] = {}
+    rows = conn.execute('''
+        SELECT crypto_id, rate, CAST(strftime('%s', timestamp) AS INTEGER) AS ts
+        FROM crypto_price_history
+        WHERE rate IS NOT NULL AND timestamp IS NOT NULL
+        ORDER BY crypto_id, timestamp, id
+    ''')
+    for crypto_id, rate, ts in rows:
+        first_ts.setdefault(crypto_id, ts)
+        for resolution in resolutions:
+            key = (crypto_id, resolution, bucket_start(ts, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [rate, rate, rate, rate, 1]
+            else:
+                if rate > bucket[1]:
+                    bucket[1] = rate
+                if rate < bucket[2]:
+                    bucket[2] = rate
+                bucket[3] = rate
+                bucket[4] += 1
+
+    # Старые сырые цены удаляются (см. price_retention.py), поэтому пересчитываются только интервалы,
+    # начиная с первого полного интервала, для которого цены еще сохранились
+    coarsest = max(resolutions)
+    placeholders = ', '.join('?' * len(resolutions))
+    conn.executemany(
+        f"DELETE FROM crypto_price_ohlc WHERE crypto_id = ? AND bucket_start >= ? AND resolution IN ({placeholders})",
+        [(crypto_id, bucket_start(ts, coarsest), *resolutions) for crypto_id, ts in first_ts.items()]
+    )
+    conn.executemany(
+        "INSERT INTO crypto_price_ohlc (crypto_id, resolution, bucket_start, open, high, low, close, count) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [key + tuple(values) for key, values in buckets.items()]
+    )
+    logger.info(f"Rebuilt {len(buckets)} price rollup buckets")
+    return len(buckets)
+
+
+def choose_resolution(seconds: int, min_points: int = PRICE_HISTORY_MIN_POINTS,
+                      resolutions: Iterable[int] = PRICE_ROLLUP_RESOLUTIONS) -> int:
+    """
+    Выбирает самый крупный интервал, при котором за период получается не меньше min_points точек
+    :param seconds: Длина запрашиваемого периода в секундах
+    """
+    resolutions = sorted(resolutions)
+    for resolution in reversed(resolutions):
+        if seconds // resolution >= min_points:
+            return resolution
+    return resolutions[0]
@@ -0,0 +1,238 @@
+import random
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from config import DB_QUERY_STATS, DB_QUERY_STATS_SAMPLES
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """
+    Приводит SQL к виду, общему для всех вызовов одного запроса:
+    литералы заменяются на ?, списки IN (?, ?, ...) сворачиваются, пробелы схлопываются
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('(...)', sql)
+
+
+class _Timings:
+    """Количество, сумма и выборка длительностей (reservoir sampling) для перцентилей"""
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: List[float] = []
+
+    def add(self, elapsed: float, max_samples: int):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if len(self.samples) < max_samples:
+            self.samples.append(elapsed)
+        else:
+            index = random.randrange(self.count)
+            if index < max_samples:
+                self.samples[index] = elapsed
+
+    def to_dict(self) -> Dict:
+        samples = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'avg_ms': (self.total / self.count * 1000) if self.count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+            'max_ms': self.max * 1000,
+        }
+
+
+class _StatementStats(_Timings):
+    __slots__ = ('rows', 'fetch_total')
+
+    def __init__(self):
+        super().__init__()
+        self.rows = 0
+        self.fetch_total = 0.0
+
+    def to_dict(self) -> Dict:
+        result = super().to_dict()
+        result['rows'] = self.rows
+        result['fetch_ms'] = self.fetch_total * 1000
+        return result
+
+
+class QueryStats:
+    """
+    Статистика выполнения SQL: по каждому нормализованному запросу — количество вызовов,
+    суммарное время, p50/p99 времени execute и число возвращенных строк;
+    отдельно — время получения соединения из пула и время COMMIT.
+    """
+
+    def __init__(self, enabled: bool = True, max_samples: int = 1024):
+        """
+        :param enabled: Собирать ли статистику
+        :param max_samples: Размер выборки длительностей на один запрос
+        """
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._statements: Dict[str, _StatementStats] = {}
+        self._acquire = _Timings()
+        self._commit = _Timings()
+
+    def record_statement(self, sql: str, elapsed: float) -> str:
+        """Учитывает выполнение запроса и возвращает его нормализованный вид"""
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats()
+            stats.add(elapsed, self.max_samples)
+        return key
+
+    def record_fetch(self, key: str, rows: int, elapsed: float):
+        """Учитывает строки, полученные fetch*, и время их получения"""
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is not None:
+                stats.rows += rows
+                stats.total += elapsed
+                stats.fetch_total += elapsed
+
+    def record_acquire(self, elapsed: float):
+        with self._lock:
+            self._acquire.add(elapsed, self.max_samples)
+
+    def record_commit(self, elapsed: float):
+        with self._lock:
+            self._commit.add(elapsed, self.max_samples)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._acquire = _Timings()
+            self._commit = _Timings()
+
+    def snapshot(self) -> Dict:
+        """
+        Возвращает статистику в виде словаря
+        :return: {'statements': [...], 'acquire': {...}, 'commit': {...}};
+                 запросы отсортированы по суммарному времени
+        """
+        with self._lock:
+            statements = [dict(sql=key, **stats.to_dict()) for key, stats in self._statements.items()]
+            acquire = self._acquire.to_dict()
+            commit = self._commit.to_dict()
+        statements.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {'statements': statements, 'acquire': acquire, 'commit': commit}
+
+    def report(self, limit: int = 20) -> str:
+        """Возвращает текстовый отчет по самым затратным запросам"""
+        data = self.snapshot()
+        lines = []
+        for name in ('acquire', 'commit'):
+            t = data[name]
+            lines.append(
+                f"{name}: count={t['count']} total={t['total_ms']:.1f}ms "
+                f"p50={t['p50_ms']:.3f}ms p99={t['p99_ms']:.3f}ms max={t['max_ms']:.3f}ms"
+            )
+        lines.append(f"{'count':>8} {'total_ms':>10} {'p50_ms':>8} {'p99_ms':>8} {'rows':>8}  sql")
+        for s in data['statements'][:limit]:
+            sql = s['sql'] if len(s['sql']) <= 120 else s['sql'][:117] + '...'
+            lines.append(
+                f"{s['count']:>8} {s['total_ms']:>10.1f} {s['p50_ms']:>8.3f} "
+                f"{s['p99_ms']:>8.3f} {s['rows']:>8}  {sql}"
+            )
+        return '\n'.join(lines)
+
+
+query_stats = QueryStats(enabled=DB_QUERY_STATS, max_samples=DB_QUERY_STATS_SAMPLES)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий время execute и считающий строки, полученные через fetch*"""
+    _stats_key: Optional[str] = None
+
+    def execute(self, sql, parameters=()):
+        if not query_stats.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._stats_key = query_stats.record_statement(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not query_stats.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._stats_key = query_stats.record_statement(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        if self._stats_key is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        query_stats.record_fetch(self._stats_key, 0 if row is None else 1, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, size=None):
+        if self._stats_key is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        query_stats.record_fetch(self._stats_key, len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        if self._stats_key is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        query_stats.record_fetch(self._stats_key, len(rows), time.perf_counter() - start)
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, все запросы и COMMIT которого учитываются в query_stats"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not query_stats.enabled:
+            return super().commit()
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            query_stats.record_commit(time.perf_counter() - start)
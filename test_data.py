@@ -1,4 +1,5 @@
 from database import add_crypto, init_db
+from money import to_kopecks, to_units
 
 def add_test_cryptocurrencies():
     # Инициализируем базу данных
@@ -8,13 +9,13 @@ def add_test_cryptocurrencies():
     test_cryptos = [
         ("Bitcoin", "BTCd", 3500000.0, 21000000.0),
         ("Ethereum", "ETHd", 190000.0, 120000000.0),
-        ("Dogecoin", "DGEd", 7.5, 132670764264.0)
+        ("Dogecoin", "DGEd", 7.5, 90000000000.0)  # не больше ~92 млрд монет (см. money.py)
     ]
     
     # Добавляем каждую криптовалюту
     for name, symbol, rate, supply in test_cryptos:
         try:
-            add_crypto(name, symbol, rate, supply)
+            add_crypto(name, symbol, to_kopecks(rate), to_units(supply))
             print(f"Added {name} ({symbol})")
         except Exception as e:
             print(f"Error adding {name}: {e}")
@@ -1,6 +1,7 @@
 
 import logging
 from database import get_db
+from money import to_kopecks
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -22,7 +23,7 @@ def update_existing_users_balance():
             # Update each user's balance
             for user in users:
                 current_balance = user['balance']
-                new_balance = current_balance + 500
+                new_balance = current_balance + to_kopecks(500)
                 
                 cursor.execute(
                     "UPDATE users SET balance = ? WHERE user_id = ?",
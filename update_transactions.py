@@ -2,41 +2,24 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from database import get_db, generate_unique_id
+from database import get_db
+from migrations import migrate
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def update_existing_transactions():
-    """Обновляет существующие транзакции, добавляя им уникальные ID"""
+    """
+    Обновляет существующие транзакции, добавляя им уникальные ID.
+    Заполнение unique_id выполняется миграцией схемы, поэтому скрипт просто запускает миграции.
+    """
     logger.info("Начинаем обновление транзакций...")
 
     try:
         with get_db() as conn:
-            cursor = conn.cursor()
-
-            # Проверяем транзакции без unique_id
-            cursor.execute("SELECT id FROM transactions WHERE unique_id IS NULL")
-            transactions = cursor.fetchall()
-
-            logger.info(f"Найдено {len(transactions)} транзакций без unique_id")
-
-            # Обновляем каждую транзакцию
-            updated_count = 0
-            for tx in transactions:
-                try:
-                    unique_id = generate_unique_id()
-                    cursor.execute(
-                        "UPDATE transactions SET unique_id = ? WHERE id = ?",
-                        (unique_id, tx[0]) # Corrected index access here
-                    )
-                    updated_count += 1
-                except Exception as e:
-                    logger.error(f"Ошибка при обновлении транзакции {tx[0]}: {e}")
-
-            conn.commit()
-            logger.info(f"Обновлено {updated_count} транзакций")
-            return updated_count
+            applied = migrate(conn)
+            logger.info(f"Применено миграций: {applied}")
+            return applied
 
     except Exception as e:
         logger.error(f"Ошибка при обновлении транзакций: {e}")
@@ -44,4 +27,4 @@ def update_existing_transactions():
 
 if __name__ == "__main__":
     count = update_existing_transactions()
-    print(f"Обновлено {count} транзакций")
\ No newline at end of file
+    print(f"Применено миграций: {count}")
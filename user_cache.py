@@ -0,0 +1,88 @@
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Отметка «пользователь не зарегистрирован» в кэше
+_MISSING = object()
+
+
+class UserCache:
+    """
+    Кэш записей пользователей (LRU + TTL) с запоминанием отсутствующих пользователей.
+
+    Изменения пользователя в базе сопровождаются вызовом update (известны новые значения,
+    например баланс из RETURNING) или invalidate. Оба вызова увеличивают счетчик поколений;
+    запись, прочитанная из базы до изменения, в кэш не сохраняется.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        """
+        :param maxsize: Максимальное количество пользователей в кэше
+        :param ttl: Время жизни записи пользователя в секундах
+        :param negative_ttl: Время жизни отметки «не зарегистрирован» в секундах
+        """
+        self._lock = threading.Lock()
+        self._users = TTLCache(maxsize, ttl)
+        self._missing = TTLCache(maxsize, negative_ttl)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, loader: Callable[[int], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Возвращает копию записи пользователя, при промахе загружает ее через loader
+        :param loader: Функция, читающая пользователя из базы (None — не зарегистрирован)
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None and user_id in self._missing:
+                user = _MISSING
+            if user is not None:
+                self.hits += 1
+                return None if user is _MISSING else dict(user)
+            self.misses += 1
+            generation = self._generation
+
+        user = loader(user_id)
+
+        with self._lock:
+            if self._generation == generation:
+                if user is None:
+                    self._missing[user_id] = _MISSING
+                else:
+                    self._users[user_id] = dict(user)
+        return user
+
+    def update(self, user_id: int, **fields):
+        """
+        Обновляет поля закэшированного пользователя (например, баланс после сделки).
+        Вызывается после успешного COMMIT под общей блокировкой с ним,
+        чтобы правки применялись в порядке транзакций
+        """
+        with self._lock:
+            self._generation += 1
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users[user_id] = {**user, **fields}
+
+    def invalidate(self, user_id: int):
+        """Удаляет пользователя из кэша, включая отметку «не зарегистрирован»"""
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+            self._missing.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+            self._missing.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'users': len(self._users), 'missing': len(self._missing)}
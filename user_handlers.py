@@ -1,20 +1,28 @@
 from admin_handlers import ADMIN_EMAIL  # Remove ADMIN_BUTTONS import
 import logging
 import os
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
+from telegram.error import TelegramError
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     CallbackContext, ConversationHandler, CallbackQueryHandler, 
     MessageHandler, Filters, CommandHandler
 )
 from database import (
-    add_user, get_user, add_transaction, get_db, get_all_cryptos, 
-    get_crypto_by_id, buy_crypto, sell_crypto, get_price_history
+    add_user, get_user, add_transaction, queue_transaction, wait_for_write, get_db, get_all_cryptos, 
+    get_crypto_by_id, get_available_cryptos, buy_crypto, sell_crypto, get_price_history,
+    get_price_history_version
 )
 # Импортируем из модуля utils.py, а не из пакета utils
-from utils import validate_email_address, validate_phone_number, validate_date, format_money, is_admin, format_crypto_amount
-from typing import Dict
+from utils import (
+    validate_email_address, validate_phone_number, validate_date, format_money, is_admin,
+    format_crypto_amount, price_history_arrays
+)
+from chart_cache import chart_cache
+from cpu_pool import get_cpu_pool
+from config import PRICE_CHART_DAYS
+from money import to_kopecks, to_units, buy_cost, sell_proceeds, max_affordable_units, share
+from typing import Dict, Optional
 
 # Add this after the imports
 USER_BUTTONS = [
@@ -116,7 +124,7 @@ def phone(update: Update, context: CallbackContext):
     # Сохраняем пользователя и добавляем бонус 250 рублей
     user_data = {
         'user_id': update.effective_user.id,
-        'balance': 250,  # Добавляем бонус при регистрации
+        'balance': to_kopecks(250),  # Добавляем бонус при регистрации
         **context.user_data
     }
     add_user(user_data)
@@ -167,20 +175,20 @@ def deposit(update: Update, context: CallbackContext):
         )
         return
 
-    amount = float(args[0])
-    if amount < 100:
+    amount = to_kopecks(args[0])
+    if amount < to_kopecks(100):
         update.message.reply_text("Минимальная сумма пополнения: 100 ₽")
         return
 
     # Создаем заявку на пополнение
-    transaction_id = add_transaction(user['user_id'], 'deposit', amount)
-    
-    # Получаем уникальный ID транзакции
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT unique_id FROM transactions WHERE id = ?", (transaction_id,))
-        unique_id = cursor.fetchone()['unique_id']
-        last_six = str(unique_id)[-6:] if unique_id else 'XXXXXX'
+    try:
+        transaction = wait_for_write(queue_transaction(user['user_id'], 'deposit', amount))
+    except Exception as e:
+        logger.error(f"Error creating deposit for user {user['user_id']}: {e}")
+        update.message.reply_text("Не удалось создать заявку. Попробуйте позже.")
+        return
+    unique_id = transaction['unique_id']
+    last_six = str(unique_id)[-6:] if unique_id else 'XXXXXX'
 
     update.message.reply_text(
         f"🏦 Заявка на пополнение создана\n\n"
@@ -205,8 +213,8 @@ def withdraw(update: Update, context: CallbackContext):
         )
         return
 
-    amount = float(args[0])
-    if amount < 100:
+    amount = to_kopecks(args[0])
+    if amount < to_kopecks(100):
         update.message.reply_text("Минимальная сумма вывода: 100 ₽")
         return
 
@@ -215,7 +223,12 @@ def withdraw(update: Update, context: CallbackContext):
         return
 
     # Создаем заявку на вывод
-    add_transaction(user['user_id'], 'withdraw', amount)
+    try:
+        add_transaction(user['user_id'], 'withdraw', amount)
+    except Exception as e:
+        logger.error(f"Error creating withdrawal for user {user['user_id']}: {e}")
+        update.message.reply_text("Не удалось создать заявку. Попробуйте позже.")
+        return
 
     update.message.reply_text(
         f"Создана заявка на вывод на сумму {format_money(amount)}.\n"
@@ -291,14 +304,14 @@ def show_deposit_info(update: Update, context: CallbackContext):
     update.message.reply_text(
         "Для пополнения баланса используйте команду:\n"
         "/deposit <сумма>\n"
-        f"Минимальная сумма: {format_money(100)}"
+        f"Минимальная сумма: {format_money(to_kopecks(100))}"
     )
 
 def show_withdraw_info(update: Update, context: CallbackContext):
     update.message.reply_text(
         "Для вывода средств используйте команду:\n"
         "/withdraw <сумма>\n"
-        f"Минимальная сумма: {format_money(100)}"
+        f"Минимальная сумма: {format_money(to_kopecks(100))}"
     )
 
 def buy_crypto_handler(update: Update, context: CallbackContext):
@@ -335,7 +348,7 @@ def buy_crypto_handler(update: Update, context: CallbackContext):
     message += f"Ваш баланс: {format_money(user['balance'])}₽\n\n"
 
     # Вычисляем максимальное количество, которое может купить пользователь
-    max_affordable = user['balance'] / crypto['rate']
+    max_affordable = max_affordable_units(user['balance'], crypto['rate'])
     max_available = crypto['available_supply']
     max_possible = min(max_affordable, max_available)
 
@@ -352,11 +365,11 @@ def buy_crypto_handler(update: Update, context: CallbackContext):
     keyboard_row = []
 
     for percent in percentages:
-        amount = max_possible * (percent / 100)
+        amount = share(max_possible, percent)
         if amount > 0:
             keyboard_row.append(InlineKeyboardButton(
                 f"{percent}% ({format_crypto_amount(amount)})",
-                callback_data=f"buyamt_{crypto_id}_{amount:.8f}"
+                callback_data=f"buyamt_{crypto_id}_{amount}"
             ))
 
         # Добавляем по 3 кнопки в строку
@@ -410,7 +423,7 @@ def process_crypto_purchase(update: Update, context: CallbackContext):
 
     try:
         # Парсим ввод пользователя
-        amount = float(update.message.text.strip().replace(',', '.'))
+        amount = to_units(update.message.text)
         if amount <= 0:
             update.message.reply_text("Количество должно быть положительным числом.")
             return
@@ -433,7 +446,7 @@ def process_crypto_purchase(update: Update, context: CallbackContext):
         return
 
     # Проверяем, достаточно ли у пользователя средств
-    total_cost = amount * crypto_rate
+    total_cost = buy_cost(amount, crypto_rate)
     if total_cost > user['balance']:
         update.message.reply_text(
             f"Недостаточно средств. Необходимо: {format_money(total_cost)}₽, "
@@ -442,12 +455,13 @@ def process_crypto_purchase(update: Update, context: CallbackContext):
         return
 
     # Попытка совершить покупку
-    if buy_crypto(user['user_id'], crypto_id, amount):
+    new_balance = buy_crypto(user['user_id'], crypto_id, amount)
+    if new_balance is not None:
         update.message.reply_text(
             f"✅ Успешная покупка!\n\n"
             f"Вы приобрели {format_crypto_amount(amount)} {crypto_symbol} "
             f"на сумму {format_money(total_cost)}₽\n\n"
-            f"Ваш баланс: {format_money(user['balance'] - total_cost)}₽"
+            f"Ваш баланс: {format_money(new_balance)}₽"
         )
     else:
         update.message.reply_text(
@@ -507,13 +521,10 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
             logger.info(f"Пользователь {user['user_id']} выбрал криптовалюту ID: {crypto_id}")
 
             # Получаем информацию о криптовалюте
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name, symbol, rate, available_supply FROM cryptocurrencies WHERE id = ?", (crypto_id,))
-                crypto = cursor.fetchone()
-                if not crypto:
-                    query.message.reply_text("Криптовалюта не найдена.")
-                    return
+            crypto = get_crypto_by_id(crypto_id)
+            if not crypto:
+                query.message.reply_text("Криптовалюта не найдена.")
+                return
 
             # Запоминаем данные для покупки
             context.user_data['buying_crypto_id'] = crypto_id
@@ -527,7 +538,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
             message += f"Ваш баланс: {format_money(user['balance'])}₽\n\n"
 
             # Вычисляем максимальное количество, которое может купить пользователь
-            max_affordable = user['balance'] / crypto['rate']
+            max_affordable = max_affordable_units(user['balance'], crypto['rate'])
             max_available = crypto['available_supply']
             max_possible = min(max_affordable, max_available)
 
@@ -544,11 +555,11 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
             keyboard_row = []
 
             for percent in percentages:
-                amount = max_possible * (percent / 100)
+                amount = share(max_possible, percent)
                 if amount > 0:
                     keyboard_row.append(InlineKeyboardButton(
                         f"{percent}% ({format_crypto_amount(amount)})",
-                        callback_data=f"buyamt_{crypto_id}_{amount:.8f}"
+                        callback_data=f"buyamt_{crypto_id}_{amount}"
                     ))
 
                 # Добавляем по 3 кнопки в строку
@@ -569,7 +580,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
             # Получаем данные о покупке
             _, crypto_id, amount_str = query.data.split('_')
             crypto_id = int(crypto_id)
-            amount = float(amount_str)
+            amount = int(amount_str)
 
             # Проверяем, что у нас есть необходимые данные в контексте
             if 'buying_crypto_id' not in context.user_data or context.user_data['buying_crypto_id'] != crypto_id:
@@ -590,7 +601,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
                 return
 
             # Проверяем, достаточно ли у пользователя средств
-            total_cost = amount * crypto_rate
+            total_cost = buy_cost(amount, crypto_rate)
             if total_cost > user['balance']:
                 query.message.reply_text(
                     f"Недостаточно средств. Необходимо: {format_money(total_cost)}₽, "
@@ -608,7 +619,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
 
             keyboard = [
                 [
-                    InlineKeyboardButton("✅ Подтвердить", callback_data=f"buyconfirm_{crypto_id}_{amount:.8f}"),
+                    InlineKeyboardButton("✅ Подтвердить", callback_data=f"buyconfirm_{crypto_id}_{amount}"),
                     InlineKeyboardButton("❌ Отмена", callback_data="buycancel")
                 ]
             ]
@@ -622,7 +633,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
             # Получаем данные о покупке
             _, crypto_id, amount_str = query.data.split('_')
             crypto_id = int(crypto_id)
-            amount = float(amount_str)
+            amount = int(amount_str)
 
             # Получаем пользователя
             user = get_user(query.from_user.id)
@@ -645,7 +656,7 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
                 crypto_rate = context.user_data.get('buying_crypto_rate', 0)
 
             # Вычисляем стоимость
-            total_cost = amount * crypto_rate
+            total_cost = buy_cost(amount, crypto_rate)
 
             # Проверяем, достаточно ли у пользователя средств
             if total_cost > user['balance']:
@@ -657,16 +668,15 @@ def process_crypto_purchase_callback(update: Update, context: CallbackContext):
 
             # Попытка совершить покупку
             logger.info(f"Пользователь {user['user_id']} пытается купить {amount} {crypto_symbol} за {total_cost}₽")
-            if buy_crypto(user['user_id'], crypto_id, amount):
-                # Получаем обновленный баланс пользователя
-                updated_user = get_user(user['user_id'])
-                logger.info(f"Покупка успешно совершена. Новый баланс: {updated_user['balance']}₽")
+            new_balance = buy_crypto(user['user_id'], crypto_id, amount)
+            if new_balance is not None:
+                logger.info(f"Покупка успешно совершена. Новый баланс: {new_balance}₽")
 
                 query.message.reply_text(
                     f"✅ Успешная покупка!\n\n"
                     f"Вы приобрели {format_crypto_amount(amount)} {crypto_symbol} "
                     f"на сумму {format_money(total_cost)}₽\n\n"
-                    f"Ваш текущий баланс: {format_money(updated_user['balance'])}₽"
+                    f"Ваш текущий баланс: {format_money(new_balance)}₽"
                 )
 
                 # Отправляем сообщение с предложением посмотреть портфель
@@ -763,11 +773,11 @@ def sell_crypto_handler(update: Update, context: CallbackContext):
         keyboard_row = []
 
         for percent in percentages:
-            amount = portfolio['amount'] * (percent / 100)
+            amount = share(portfolio['amount'], percent)
             if amount > 0:
                 keyboard_row.append(InlineKeyboardButton(
                     f"{percent}% ({format_crypto_amount(amount)})",
-                    callback_data=f"sellamt_{crypto_id}_{amount:.8f}"
+                    callback_data=f"sellamt_{crypto_id}_{amount}"
                 ))
 
             if len(keyboard_row) == 3 or percent == percentages[-1]:
@@ -882,7 +892,7 @@ def process_crypto_sell_callback(update: Update, context: CallbackContext):
         )
         context.user_data.clear()
 
-def show_sell_menu(update: Update, context: CallbackContext, crypto: Dict, available_amount: float):
+def show_sell_menu(update: Update, context: CallbackContext, crypto: Dict, available_amount: int):
     """Показывает меню продажи криптовалюты"""
     query = update.callback_query
 
@@ -898,11 +908,11 @@ def show_sell_menu(update: Update, context: CallbackContext, crypto: Dict, avail
     keyboard_row = []
 
     for percent in percentages:
-        amount = available_amount * (percent / 100)
+        amount = share(available_amount, percent)
         if amount > 0:
             keyboard_row.append(InlineKeyboardButton(
                 f"{percent}% ({format_crypto_amount(amount)})",
-                callback_data=f"sellamt_{crypto['id']}_{amount:.8f}"
+                callback_data=f"sellamt_{crypto['id']}_{amount}"
             ))
 
         if len(keyboard_row) == 3 or percent == percentages[-1]:
@@ -923,7 +933,7 @@ def handle_sell_amount_selection(update: Update, context: CallbackContext):
     try:
         _, crypto_id, amount_str = query.data.split('_')
         crypto_id = int(crypto_id)
-        amount = float(amount_str)
+        amount = int(amount_str)
 
         if 'selling_crypto_id' not in context.user_data:
             logger.error(f"Missing selling context for user {query.from_user.id}")
@@ -940,7 +950,7 @@ def handle_sell_amount_selection(update: Update, context: CallbackContext):
             return
 
         # Calculate sale value
-        sale_value = amount * context.user_data['selling_crypto_rate']
+        sale_value = sell_proceeds(amount, context.user_data['selling_crypto_rate'])
 
         # Show confirmation message
         message = f"⚠️ Подтверждение продажи\n\n"
@@ -951,7 +961,7 @@ def handle_sell_amount_selection(update: Update, context: CallbackContext):
         message += "Подтвердите продажу:"
 
         keyboard = [[
-            InlineKeyboardButton("✅ Подтвердить", callback_data=f"sellconfirm_{crypto_id}_{amount:.8f}"),
+            InlineKeyboardButton("✅ Подтвердить", callback_data=f"sellconfirm_{crypto_id}_{amount}"),
             InlineKeyboardButton("❌ Отмена", callback_data="sellcancel")
         ]]
 
@@ -972,7 +982,7 @@ def handle_sell_confirmation(update: Update, context: CallbackContext):
     try:
         _, crypto_id, amount_str = query.data.split('_')
         crypto_id = int(crypto_id)
-        amount = float(amount_str)
+        amount = int(amount_str)
 
         user = get_user(query.from_user.id)
         if not user:
@@ -982,16 +992,15 @@ def handle_sell_confirmation(update: Update, context: CallbackContext):
 
         logger.info(f"Processing sale confirmation: {amount} of crypto {crypto_id} for user {user['user_id']}")
 
-        if sell_crypto(user['user_id'], crypto_id, amount):
-            # Get updated user balance
-            updated_user = get_user(user['user_id'])
-            sale_value = amount * context.user_data['selling_crypto_rate']
+        new_balance = sell_crypto(user['user_id'], crypto_id, amount)
+        if new_balance is not None:
+            sale_value = sell_proceeds(amount, context.user_data['selling_crypto_rate'])
 
             query.message.reply_text(
                 f"✅ Успешная продажа!\n\n"
                 f"Продано: {format_crypto_amount(amount)} {context.user_data['selling_crypto_symbol']}\n"
                 f"Получено: {format_money(sale_value)}₽\n\n"
-                f"Ваш текущий баланс: {format_money(updated_user['balance'])}₽"
+                f"Ваш текущий баланс: {format_money(new_balance)}₽"
             )
 
             # Offer to view updated portfolio
@@ -1055,7 +1064,7 @@ def show_portfolio(update: Update, context: CallbackContext):
         keyboard = []
 
         for item in portfolio:
-            value = item['amount'] * item['rate']
+            value = sell_proceeds(item['amount'], item['rate'])
             total_value += value
 
             # Добавляем информацию о криптовалюте
@@ -1101,6 +1110,47 @@ def show_portfolio(update: Update, context: CallbackContext):
             "Пожалуйста, попробуйте позже."
         )
 
+def build_graph_caption(crypto: Dict) -> str:
+    """Формирует подпись к графику цены: изменение курса за период графика"""
+    price_history = get_price_history(crypto['id'], days=PRICE_CHART_DAYS)
+
+    if not price_history:
+        logger.warning(f"Нет данных для расчета изменения цены {crypto['symbol']}")
+        return f"📊 График {crypto['name']} ({crypto['symbol']})"
+
+    first_price = price_history[0]['open']
+    last_price = price_history[-1]['rate']
+
+    # Вычисляем изменение в процентах
+    price_change_pct = ((last_price - first_price) / first_price) * 100
+    logger.info(f"Изменение цены {crypto['symbol']}: {price_change_pct:+.2f}%")
+
+    # Определяем эмодзи в зависимости от изменения цены
+    if price_change_pct > 0:
+        emoji = "🟢"
+    elif price_change_pct < 0:
+        emoji = "🔴"
+    else:
+        emoji = "⚪"
+
+    return (
+        f"📊 {crypto['name']} ({crypto['symbol']})\n\n"
+        f"{emoji} Изменение: {price_change_pct:+.2f}%\n"
+        f"Начальная цена: {format_money(first_price)}\n"
+        f"Текущая цена: {format_money(last_price)}\n\n"
+        f"Данные за последние {PRICE_CHART_DAYS} дней"
+    )
+
+def prerender_price_charts(crypto_id: int):
+    """Отрисовывает график криптовалюты для текущей версии истории цен и сохраняет его в кэш"""
+    crypto = get_crypto_by_id(crypto_id)
+    if not crypto:
+        return
+    cache_key = (crypto_id, PRICE_CHART_DAYS, get_price_history_version(crypto_id))
+    png = generate_price_graph(crypto_id, crypto['name'], crypto['symbol'])
+    if png:
+        chart_cache.put(cache_key, png, build_graph_caption(crypto))
+
 def show_graph(update: Update, context: CallbackContext):
     """Показывает график изменения цены криптовалюты"""
     query = update.callback_query
@@ -1118,125 +1168,78 @@ def show_graph(update: Update, context: CallbackContext):
             query.message.reply_text("Криптовалюта не найдена.")
             return
 
-        logger.info(f"Генерация графика для {crypto['name']} ({crypto['symbol']})")
-        # Генерируем график
-        chart_base64 = generate_price_graph(crypto_id, crypto['name'], crypto['symbol'])
-
-        if not chart_base64:
-            logger.warning(f"Не удалось сгенерировать график для {crypto['symbol']}")
-            query.message.reply_text("Не удалось сгенерировать график. Возможно, недостаточно данных.")
-            return
-
-        # Получаем историю цен для вычисления изменений
-        price_history = get_price_history(crypto_id, days=30)
+        # График не перерисовывается, пока не появится новая цена
+        cache_key = (crypto_id, PRICE_CHART_DAYS, get_price_history_version(crypto_id))
+        entry = chart_cache.get(cache_key)
 
-        if price_history:
-            first_price = price_history[0]['rate']
-            last_price = price_history[-1]['rate']
-            logger.info(f"Цена {crypto['symbol']}: начальная={first_price}, текущая={last_price}")
-
-            # Вычисляем изменение в процентах
-            price_change_pct = ((last_price - first_price) / first_price) * 100
-            logger.info(f"Изменение цены {crypto['symbol']}: {price_change_pct:+.2f}%")
+        if entry is not None and entry.file_id:
+            try:
+                query.message.reply_photo(photo=entry.file_id, caption=entry.caption)
+                return
+            except TelegramError as e:
+                logger.warning(f"Cached chart file_id rejected for {crypto['symbol']}: {e}")
+                chart_cache.discard(cache_key)
+                entry = None
+
+        png = entry.png if entry is not None else None
+        if png is None:
+            logger.info(f"Генерация графика для {crypto['name']} ({crypto['symbol']})")
+            png = generate_price_graph(crypto_id, crypto['name'], crypto['symbol'])
+
+            if not png:
+                logger.warning(f"Не удалось сгенерировать график для {crypto['symbol']}")
+                query.message.reply_text("Не удалось сгенерировать график. Возможно, недостаточно данных.")
+                return
 
-            # Определяем эмодзи в зависимости от изменения цены
-            if price_change_pct > 0:
-                emoji = "🟢"
-            elif price_change_pct < 0:
-                emoji = "🔴"
-            else:
-                emoji = "⚪"
-
-            # Формируем подпись к графику
-            caption = (
-                f"📊 {crypto['name']} ({crypto['symbol']})\n\n"
-                f"{emoji} Изменение: {price_change_pct:+.2f}%\n"
-                f"Начальная цена: {format_money(first_price)}\n"
-                f"Текущая цена: {format_money(last_price)}\n\n"
-                f"Данные за последние 30 дней"
-            )
-        else:
-            caption = f"📊 График {crypto['name']} ({crypto['symbol']})"
-            logger.warning(f"Нет данных для расчета изменения цены {crypto['symbol']}")
+            entry = chart_cache.put(cache_key, png, build_graph_caption(crypto))
 
-        # Отправляем изображение
+        # Отправляем изображение и запоминаем file_id для повторных отправок
         import io
-        import base64
-        image_data = base64.b64decode(chart_base64)
         logger.info(f"Отправка графика пользователю для {crypto['symbol']}")
-        query.message.reply_photo(
-            photo=io.BytesIO(image_data),
-            caption=caption
+        sent = query.message.reply_photo(
+            photo=io.BytesIO(png),
+            caption=entry.caption
         )
+        if sent and sent.photo:
+            chart_cache.set_file_id(cache_key, sent.photo[-1].file_id)
 
     except Exception as e:
         logger.error(f"Ошибка при отображении графика: {str(e)}")
         logger.exception("Полная информация об ошибке:")
         query.message.reply_text("Произошла ошибка при отображении графика.")
 
-def generate_price_graph(crypto_id: int, crypto_name: str, crypto_symbol: str) -> str:
+def generate_price_graph(crypto_id: int, crypto_name: str, crypto_symbol: str) -> Optional[bytes]:
     """
-    Генерирует график изменения цены криптовалюты и возвращает его в формате base64
-    :return: base64 строка с графиком
+    Генерирует график изменения цены криптовалюты
+    :return: PNG с графиком
     """
     try:
         logger.info(f"Начало генерации графика для {crypto_symbol}")
-        # Получаем историю цен за последние 30 дней
-        price_history = get_price_history(crypto_id, days=30)
-
-        if not price_history:
-            logger.warning(f"No price history found for crypto {crypto_id}")
-            return None
+        # numpy загружается при первом графике (или заранее, см. warmup.py)
+        from price_archive import get_chart_series
 
-        # Подготавливаем данные для графика
-        dates = []
-        prices = []
-        for record in price_history:
-            try:
-                # SQLite возвращает строку в формате ISO
-                date = datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S')
-                price = float(record['rate'])
-                dates.append(date)
-                prices.append(price)
-                logger.debug(f"Processed data point: date={date}, price={price}")
-            except (ValueError, KeyError) as e:
-                logger.error(f"Error parsing record {record}: {e}")
-                continue
-
-        if not dates or not prices:
-            logger.error("No valid data points for graph")
-            return None
-
-        logger.info(f"Построение графика из {len(dates)} точек данных")
+        # Берем историю цен за период графика из архива, а если его нет — из агрегатов в базе
+        series = get_chart_series(crypto_id, days=PRICE_CHART_DAYS)
+        if series is not None and len(series[0]):
+            dates, prices = series
+        else:
+            price_history = get_price_history(crypto_id, days=PRICE_CHART_DAYS)
 
-        # Создаем график
-        plt.figure(figsize=(10, 6))
-        plt.plot(dates, prices, marker='o', linestyle='-', linewidth=2, markersize=4)
+            if not price_history:
+                logger.warning(f"No price history found for crypto {crypto_id}")
+                return None
 
-        # Настраиваем внешний вид
-        plt.title(f'Динамика курса {crypto_name} ({crypto_symbol})')
-        plt.xlabel('Дата')
-        plt.ylabel('Курс (₽)')
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.xticks(rotation=45)
+            # Подготавливаем данные для графика (даты — numpy.datetime64 из unix-времени)
+            dates, prices = price_history_arrays(price_history)
 
-        # Форматируем оси
-        from matplotlib.dates import DateFormatter
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d.%m'))
-        plt.tight_layout()
+        logger.info(f"Построение графика из {len(dates)} точек данных")
 
-        # Сохраняем график в base64
-        import io
-        import base64
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-        plt.close()
-        buf.seek(0)
+        # График рисуется в отдельном процессе, чтобы не задерживать обработку других сообщений;
+        # charts (и matplotlib) импортируется только в процессе пула
+        png = get_cpu_pool().run('charts:price_chart', dates, prices, f'Динамика курса {crypto_name} ({crypto_symbol})')
 
-        # Конвертируем в base64
-        graph_base64 = base64.b64encode(buf.getvalue()).decode()
-        logger.info("График успешно сгенерирован и конвертирован в base64")
-        return graph_base64
+        logger.info("График успешно сгенерирован")
+        return png
 
     except Exception as e:
         logger.error(f"Ошибка при генерации графика: {e}")
@@ -1266,17 +1269,7 @@ def show_available_cryptos(update: Update, context: CallbackContext):
 
         logger.info(f"Получаем список криптовалют для пользователя {user['user_id']}")
 
-        with get_db() as conn:
-            cursor = conn.cursor()
-            sql_query = """
-                SELECT id, name, symbol, rate, available_supply 
-                FROM cryptocurrencies 
-                WHERE available_supply > 0
-                ORDER BY name
-            """
-            logger.debug(f"Выполняем SQL запрос: {sql_query}")
-            cursor.execute(sql_query)
-            cryptos = cursor.fetchall()
+        cryptos = get_available_cryptos()
 
         if not cryptos:
             logger.warning("Криптовалюты не найдены в базе данных")
@@ -10,42 +10,22 @@ import matplotlib.dates as mdates
 from matplotlib.figure import Figure
 import phonenumbers
 from email_validator import validate_email, EmailNotValidError
-from config import ADMIN_EMAIL, ADMIN_IDS, MIN_AMOUNT
+from config import ADMIN_EMAIL, MIN_AMOUNT
+from money import KOPECKS_PER_RUBLE, UNITS_PER_COIN
+from admin_registry import admin_registry
 
 def is_admin(user: Union[int, dict]) -> bool:
     """
-    Проверяет, является ли пользователь администратором
+    Проверяет, является ли пользователь администратором (без обращений к базе, см. admin_registry.py)
     :param user: ID пользователя (int) или словарь с данными пользователя
     :return: True если пользователь админ, False в противном случае
     """
     try:
-        # Если передан ID пользователя
-        if isinstance(user, (int, str)):
-            # Проверяем сначала по списку админских ID
-            if int(user) in ADMIN_IDS:
-                logging.info(f"User {user} is admin (by ID)")
-                return True
-
-            # Если нет в списке ID, проверяем email
-            from database import get_user
-            user_data = get_user(int(user))
-            if user_data and user_data.get('email') == ADMIN_EMAIL:
-                logging.info(f"User {user} is admin (by email)")
-                return True
-
-        # Если передан словарь с данными пользователя
-        elif isinstance(user, dict):
-            # Проверяем ID
-            if user.get('user_id') in ADMIN_IDS:
-                logging.info(f"User {user.get('user_id')} is admin (by ID)")
-                return True
-
-            # Проверяем email
-            if user.get('email') == ADMIN_EMAIL:
-                logging.info(f"User {user.get('user_id')} is admin (by email)")
-                return True
-
-        return False
+        if isinstance(user, dict):
+            return admin_registry.is_admin(user.get('user_id')) or (
+                bool(ADMIN_EMAIL) and user.get('email') == ADMIN_EMAIL
+            )
+        return admin_registry.is_admin(int(user))
 
     except Exception as e:
         logging.error(f"Error in is_admin check: {str(e)}")
@@ -75,16 +55,29 @@ def validate_date(date_str: str) -> bool:
     except ValueError:
         return False
 
-def format_money(amount: float) -> str:
-    """Форматирует денежную сумму"""
-    return f"{amount:,.2f} ₽"
+def format_money(amount: int) -> str:
+    """Форматирует денежную сумму, заданную в копейках"""
+    sign = '-' if amount < 0 else ''
+    rubles, kopecks = divmod(abs(int(amount)), KOPECKS_PER_RUBLE)
+    return f"{sign}{rubles:,}.{kopecks:02d} ₽"
+
+def format_crypto_amount(amount: int) -> str:
+    """Форматирует количество криптовалюты, заданное в единицах 1e-8"""
+    sign = '-' if amount < 0 else ''
+    coins, units = divmod(abs(int(amount)), UNITS_PER_COIN)
+    return f"{sign}{coins}.{units:08d}"
 
-def format_crypto_amount(amount: float) -> str:
-    """Форматирует сумму криптовалюты"""
-    if amount >= 1:
-        return f"{amount:.8f}"
-    else:
-        return f"{amount:.12f}"
+def price_history_arrays(price_history: List[Dict]):
+    """
+    Преобразует историю цен в массивы для графика без построчного разбора дат
+    :param price_history: Записи с ключами ts (unix-время) и rate (копейки)
+    :return: Массив дат numpy.datetime64[s] и массив цен в рублях
+    """
+    import numpy as np
+    count = len(price_history)
+    dates = np.fromiter((entry['ts'] for entry in price_history), dtype=np.int64, count=count).astype('datetime64[s]')
+    prices = np.fromiter((entry['rate'] for entry in price_history), dtype=np.float64, count=count) / KOPECKS_PER_RUBLE
+    return dates, prices
 
 def generate_price_chart(price_history: List[Dict], crypto_symbol: str) -> Optional[str]:
     """
@@ -101,10 +94,7 @@ def generate_price_chart(price_history: List[Dict], crypto_symbol: str) -> Optio
         os.makedirs('static/charts', exist_ok=True)
 
         # Подготавливаем данные
-        dates = [datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')) 
-                if 'Z' in entry['timestamp'] else datetime.fromisoformat(entry['timestamp']) 
-                for entry in price_history]
-        prices = [entry['rate'] for entry in price_history]
+        dates, prices = price_history_arrays(price_history)
 
         # Определяем изменение цены (в процентах)
         if len(prices) >= 2:
@@ -0,0 +1,58 @@
+"""
+Фоновая загрузка тяжелых модулей.
+
+numpy, архив цен, проверка email и телефонов нужны не для первого ответа бота,
+поэтому при запуске они не импортируются. После старта опроса Telegram
+warm_up() загружает их в отдельном потоке, чтобы первый пользователь,
+открывший график или регистрацию, не ждал импорта.
+matplotlib и charts здесь не загружаются: графики рисуются только в процессах
+пула (см. cpu_pool.py), которые импортируют charts при запуске.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Модули, загрузка которых отложена до первого использования
+HEAVY_MODULES = (
+    'numpy',
+    'price_archive',
+    'phonenumbers',
+    'email_validator',
+)
+
+
+def import_modules(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, Optional[float]]:
+    """
+    Импортирует модули по очереди
+    :return: Время импорта каждого модуля в секундах (None — модуль не загрузился)
+    """
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Warm-up import of {name} failed: {e}")
+            timings[name] = None
+    return timings
+
+
+def warm_up(modules: Iterable[str] = HEAVY_MODULES) -> threading.Thread:
+    """Запускает фоновую загрузку модулей и возвращает поток"""
+    modules = tuple(modules)
+
+    def run():
+        start = time.perf_counter()
+        timings = import_modules(modules)
+        details = ', '.join(f"{name}={elapsed:.2f}s" for name, elapsed in timings.items() if elapsed is not None)
+        logger.info(f"Warm-up imports finished in {time.perf_counter() - start:.2f}s ({details})")
+
+    thread = threading.Thread(target=run, name='import-warmup', daemon=True)
+    thread.start()
+    return thread